@@ -7,6 +7,7 @@ import os
 from apps.handlers.follow_handler import handle_follow
 from apps.handlers.message_handler import handle_message
 from apps.handlers.postback_handler import handle_postback
+from apps.handlers.export_handler import handle_export
 
 from linebot.v3.messaging import Configuration
 from linebot.v3.webhooks import (
@@ -39,6 +40,11 @@ def callback():
 
     return 'OK'
 
+# === Transaction Export Endpoint ===
+@app.route("/export", methods=['GET'])
+def export_transactions():
+    return handle_export(request)
+
 # === Register Event Handlers ===
 line_handler.add(FollowEvent)(handle_follow)
 line_handler.add(PostbackEvent)(handle_postback)
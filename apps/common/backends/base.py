@@ -0,0 +1,80 @@
+"""
+Storage backend contract.
+
+apps.common.database re-exports one backend module, chosen by the DB_BACKEND
+environment variable:
+
+    postgres (default)  apps/common/backends/postgres.py  needs POSTGRES_URL
+    sqlite              apps/common/backends/sqlite.py    embedded file (SQLITE_PATH), WAL mode
+
+Every backend defines all names in STORAGE_API with the same signatures and return
+shapes (amounts as Decimal, timestamps as timezone-aware datetimes), so handlers and
+services never need to know which one is active. Backend-specific maintenance tools
+(migrations, rollups, partitions, query plan checks) import their backend directly.
+"""
+
+# Output columns accepted by get_user_transactions / iter_user_transactions
+TRANSACTION_COLUMN_NAMES = ("id", "type", "category", "item", "amount", "date", "message")
+DEFAULT_TRANSACTION_COLUMNS = ("type", "category", "item", "amount", "date", "message")
+
+# Column order of iter_transactions_for_export rows (and of CSV / Parquet exports)
+EXPORT_COLUMNS = ("id", "line_user_id", "created_at", "type", "category", "item", "amount", "message")
+
+STORAGE_API = (
+    # users
+    "ensure_user_exists",
+    "get_user_uuid",
+    "get_user_language",
+    "set_user_language",
+    "delete_user",
+    "invalidate_user_cache",
+    "user_cache_stats",
+    # categories
+    "ensure_default_categories",
+    "add_user_category",
+    "get_user_category_id",
+    "get_user_category_map",
+    # writes
+    "insert_transactions",
+    "bulk_insert_transactions",
+    "delete_record_by_id",
+    "delete_record",
+    "recategorize_transactions",
+    "update_transaction_categories",
+    "update_transaction_category",
+    # reads
+    "get_last_records",
+    "get_user_transactions",
+    "iter_user_transactions",
+    "iter_transactions_for_export",
+    "get_export_watermark",
+    "get_user_period_summary",
+    "get_user_category_sums_for_chart",
+    "find_transactions_by_keyword",
+    # hooks
+    "on_categories_changed",
+    # shared constants
+    "DEFAULT_TRANSACTION_COLUMNS",
+    "EXPORT_COLUMNS",
+)
+
+
+# Called after existing transactions change category: listener(line_user_id), or listener(None)
+# when the writer doesn't know the user (update_transaction_category). Caches derived from the
+# stored categories (apps/services/user_knn.py) register here, so every recategorization path
+# keeps them in step with the database.
+_category_listeners: list = []
+
+
+def on_categories_changed(listener):
+    _category_listeners.append(listener)
+
+
+def notify_categories_changed(user_id):
+    for listener in list(_category_listeners):
+        listener(user_id)
+
+
+def missing_api(module) -> list[str]:
+    """Names of STORAGE_API a backend module fails to provide."""
+    return [name for name in STORAGE_API if not hasattr(module, name)]
@@ -0,0 +1,957 @@
+import io
+import csv
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import List, Dict
+from apps.common.i18n import t
+from apps.common.db_pool import ConnectionPool
+from apps.common.db_replica import ReplicaRouter, REPLICA_ERRORS, REPLICA_MAX_LAG, REPLICA_LAG_CHECK_INTERVAL
+from apps.common.ttl_cache import LRUTTLCache
+from apps.common.search_tokens import document_tokens, query_tokens, to_tsquery_text
+from apps.common.backends.base import (STORAGE_API, DEFAULT_TRANSACTION_COLUMNS, EXPORT_COLUMNS,
+                                       on_categories_changed, notify_categories_changed)
+from config import DEFAULT_CATEGORIES
+
+# PostgreSQL storage backend (see apps/common/backends/base.py)
+__all__ = [*STORAGE_API, "POSTGRES_URL", "TRANSACTION_COLUMNS",
+           "connection", "get_pool", "pool_stats", "replica_stats"]
+
+POSTGRES_URL = os.getenv("POSTGRES_URL")
+
+if not POSTGRES_URL:
+    raise ValueError("POSTGRES_URL is not set in the environment variables.")
+
+# Connection pool is created lazily on first use (keeps cold starts cheap)
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(POSTGRES_URL)
+    return _pool
+
+# Check out a pooled connection (autocommit) for the duration of the block
+@contextmanager
+def connection():
+    with get_pool().connection() as conn:
+        yield conn
+
+@contextmanager
+def _cursor():
+    with connection() as conn:
+        with conn.cursor() as cur:
+            yield cur
+
+# Pool usage and wait-time metrics
+def pool_stats() -> dict:
+    return get_pool().stats() if _pool is not None else {}
+
+# Optional streaming replica for reporting reads (listings, summaries, charts, AI context).
+# Reads fall back to the primary while the replica lags more than POSTGRES_REPLICA_MAX_LAG
+# or is unreachable, and whenever it hasn't yet replayed the primary's WAL position read just
+# before the query, so a write committed on any instance is visible to the next read.
+POSTGRES_REPLICA_URL = os.getenv("POSTGRES_REPLICA_URL")
+_replica = ReplicaRouter(POSTGRES_REPLICA_URL) if POSTGRES_REPLICA_URL else None
+
+# LINE user ids with a recent write on this process: skip the replica without asking it
+_recent_writers = LRUTTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("POSTGRES_READ_YOUR_WRITES", str(REPLICA_MAX_LAG + REPLICA_LAG_CHECK_INTERVAL))),
+)
+
+def _note_write(user_id):
+    if _replica is not None:
+        _recent_writers.set(user_id, True)
+
+def _use_replica(user_id) -> bool:
+    if _replica is None:
+        return False
+    # Inside a caller's primary transaction (or right after this user wrote) only the primary is consistent
+    return not (_pool is not None and _pool.holds_connection()) \
+        and not _recent_writers.get(user_id) \
+        and _replica.available()
+
+# Primary WAL position now: everything committed so far, on any instance, is at or before it
+def _primary_lsn() -> str:
+    with _cursor() as cur:
+        cur.execute("SELECT pg_current_wal_lsn()::text")
+        return cur.fetchone()[0]
+
+class _ReplicaBehind(Exception):
+    """The replica hasn't replayed the primary position read before the query."""
+
+# Cursor for a read-only reporting query of one user: the replica when safe, otherwise the primary
+@contextmanager
+def _read_cursor(user_id):
+    if _use_replica(user_id):
+        lsn = _primary_lsn()
+        entered = False
+        try:
+            with _replica.pool.connection() as conn, conn.cursor() as cur:
+                if not _replica.replayed(cur, lsn):
+                    raise _ReplicaBehind
+                entered = True
+                _replica.record_read(True)
+                yield cur
+            return
+        except _ReplicaBehind:
+            pass
+        except REPLICA_ERRORS as e:
+            _replica.mark_failed(e)
+            if entered:
+                raise
+    if _replica is not None:
+        _replica.record_read(False)
+    with _cursor() as cur:
+        yield cur
+
+# Replica routing counters and lag; empty when no replica is configured
+def replica_stats() -> dict:
+    return _replica.stats() if _replica is not None else {}
+
+# LINE user id -> {"id", "preferred_lang", "display_name"}; shared across requests in this process
+_user_cache = LRUTTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "300")),
+)
+
+# Load (and cache) the identity row of a LINE user; returns None if the user does not exist
+def _get_user_row(user_id):
+    row = _user_cache.get(user_id)
+    if row is not None:
+        return row
+    with _cursor() as cur:
+        cur.execute(
+            "SELECT id, preferred_lang, display_name FROM users WHERE line_user_id = %s",
+            (user_id,)
+        )
+        result = cur.fetchone()
+    if not result:
+        return None  # Not cached, so a user created elsewhere is picked up on the next call
+    row = {"id": result[0], "preferred_lang": result[1], "display_name": result[2]}
+    _user_cache.set(user_id, row)
+    return row
+
+def invalidate_user_cache(user_id=None):
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.invalidate(user_id)
+
+# Hit/miss counters of the user identity cache
+def user_cache_stats() -> dict:
+    return _user_cache.stats()
+
+# Ensure the user exists in the database (idempotent upsert, safe against concurrent follow events)
+def ensure_user_exists(user_id, display_name=None):
+    if _get_user_row(user_id) is not None:
+        return
+    with _cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO users (line_user_id, display_name, preferred_lang)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (line_user_id) DO UPDATE
+              SET display_name = COALESCE(EXCLUDED.display_name, users.display_name)
+            RETURNING id, preferred_lang, display_name
+            """,
+            (user_id, display_name, "zh-TW")
+        )
+        result = cur.fetchone()
+    # Replace any stale entry with the row just written
+    _user_cache.set(user_id, {"id": result[0], "preferred_lang": result[1], "display_name": result[2]})
+
+# Create the 7 default system categories for the given user if they do not exist.
+# Runs as one set-based statement: ids are drawn from the identity sequence up front so
+# each new root row can reference itself as parent, and legacy rows missing parent_id are repaired.
+def ensure_default_categories(user_id: str):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return
+
+    names = [cat["name"] for cat in DEFAULT_CATEGORIES]
+    _note_write(user_id)
+    with _cursor() as cur:
+        cur.execute("""
+            WITH repaired AS (
+                UPDATE categories
+                SET parent_id = id
+                WHERE user_id = %(uid)s
+                  AND name = ANY(%(names)s)
+                  AND parent_id IS NULL
+            ),
+            missing AS (
+                SELECT nextval(pg_get_serial_sequence('public.categories', 'id')) AS id, d.name, d.ord
+                FROM unnest(%(names)s::text[]) WITH ORDINALITY AS d(name, ord)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM categories c
+                    WHERE c.user_id = %(uid)s AND c.name = d.name
+                )
+                ORDER BY d.ord  -- keep ids ascending in DEFAULT_CATEGORIES order (charts sort by id)
+            )
+            INSERT INTO categories (id, user_id, name, parent_id, is_system_default)
+            OVERRIDING SYSTEM VALUE
+            SELECT id, %(uid)s, name, id, TRUE
+            FROM missing
+            ORDER BY ord
+            ON CONFLICT (user_id, name) DO NOTHING
+        """, {"uid": user_uuid, "names": names})
+
+# Add or update a user-defined subcategory under a specified root category.
+def add_user_category(user_id: str, keyword: str, category: str):
+
+    ensure_user_exists(user_id)
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return
+
+    keyword = (keyword or "").strip()
+    category = (category or "").strip().lower()
+    if not keyword or not category:
+        return
+
+    _note_write(user_id)
+    with _cursor() as cur:
+        cur.execute(
+            """
+            SELECT id
+            FROM categories
+            WHERE name = %s
+              AND (is_system_default = TRUE OR user_id = %s)
+            ORDER BY is_system_default DESC
+            LIMIT 1
+            """,
+            (category, user_uuid)
+        )
+        row = cur.fetchone()
+        if not row:
+            raise ValueError(f"Root category '{category}' not found")
+        root_id = row[0]
+
+        cur.execute(
+            """
+            SELECT id
+            FROM categories
+            WHERE user_id = %s
+              AND LOWER(name) = LOWER(%s)
+            LIMIT 1
+            """,
+            (user_uuid, keyword)
+        )
+        exists = cur.fetchone()
+
+        # 3) 沒有才插入
+        if not exists:
+            cur.execute(
+                """
+                INSERT INTO categories (user_id, name, parent_id, is_system_default, created_at)
+                VALUES (%s, %s, %s, FALSE, NOW())
+                """,
+                (user_uuid, keyword, root_id)
+            )
+
+# Retrieve the internal UUID of the user from LINE user ID
+def get_user_uuid(user_id):
+    row = _get_user_row(user_id)
+    return row["id"] if row else None
+
+# Retrieve the preferred language of the user
+def get_user_language(user_id):
+    row = _get_user_row(user_id)
+    return row["preferred_lang"] if row else None
+
+# Update the preferred language of the user
+def set_user_language(user_id, lang_code):
+    with _cursor() as cur:
+        cur.execute(
+            "UPDATE users SET preferred_lang = %s WHERE line_user_id = %s",
+            (lang_code, user_id)
+        )
+    invalidate_user_cache(user_id)
+
+# Delete a user with all of their categories and records (ON DELETE CASCADE)
+def delete_user(user_id) -> bool:
+    _note_write(user_id)
+    with _cursor() as cur:
+        cur.execute("DELETE FROM users WHERE line_user_id = %s", (user_id,))
+        deleted = cur.rowcount > 0
+    invalidate_user_cache(user_id)
+    return deleted
+
+# Insert a new transaction (income or expense)
+def insert_transactions(user_id, category_id, item, amount, message, display_name=None, record_type='expense'):
+    ensure_user_exists(user_id, display_name)
+    user_uuid = get_user_uuid(user_id)
+    if user_uuid:
+        _note_write(user_id)
+        with _cursor() as cur:
+            cur.execute("""
+                INSERT INTO transactions (user_id, category_id, item, amount, message, type, created_at, search_tokens)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, array_to_tsvector(%s::text[]))
+            """, (user_uuid, category_id, item, amount, message, record_type, datetime.now(timezone.utc),
+                  document_tokens(item, message)))
+
+def _pg_text_array(values) -> str:
+    """Postgres text[] literal, for COPY input."""
+    return "{" + ",".join('"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values) + "}"
+
+# Bulk-load transactions for one user: COPY into a temp staging table, then a single
+# INSERT ... SELECT that skips rows already stored (same created_at, item, amount, type)
+# and duplicates inside the batch. `rows` are dicts with created_at, item, amount, type,
+# category_id and message. Returns (inserted, skipped_duplicates).
+def bulk_insert_transactions(user_id, rows, display_name=None) -> tuple[int, int]:
+    if not rows:
+        return 0, 0
+    ensure_user_exists(user_id, display_name)
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return 0, len(rows)
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for r in rows:
+        writer.writerow([
+            r["created_at"].isoformat(), r["item"], r["amount"], r.get("type") or "expense",
+            "" if r.get("category_id") is None else r["category_id"], r.get("message") or "",
+            _pg_text_array(document_tokens(r["item"], r.get("message"))),
+        ])
+    buf.seek(0)
+
+    _note_write(user_id)
+    with connection() as conn:
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cur:
+                # Serialize imports of the same user so concurrent runs can't both miss a duplicate
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (user_uuid,))
+                # Historical rows may predate the monthly partitions created so far
+                cur.execute("SELECT ensure_transaction_partitions(%s, %s)", (
+                    min(r["created_at"] for r in rows), max(r["created_at"] for r in rows),
+                ))
+                cur.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS import_stage (
+                      created_at timestamptz, item text, amount numeric(12,2),
+                      type text, category_id bigint, message text, search_tokens text[]
+                    ) ON COMMIT DELETE ROWS
+                """)
+                cur.copy_expert(
+                    "COPY import_stage (created_at, item, amount, type, category_id, message, search_tokens) "
+                    "FROM STDIN WITH (FORMAT csv)",
+                    buf,
+                )
+                cur.execute("""
+                    INSERT INTO transactions (user_id, category_id, item, amount, message, type, created_at, search_tokens)
+                    SELECT %(uid)s, s.category_id, s.item, s.amount, NULLIF(s.message, ''), s.type, s.created_at,
+                           array_to_tsvector(COALESCE(s.search_tokens, '{}'))
+                    FROM (
+                        SELECT DISTINCT ON (created_at, item, amount, type) *
+                        FROM import_stage
+                        ORDER BY created_at, item, amount, type
+                    ) AS s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM transactions AS t
+                        WHERE t.user_id = %(uid)s
+                          AND t.created_at = s.created_at
+                          AND t.item = s.item
+                          AND t.amount = s.amount
+                          AND t.type IS NOT DISTINCT FROM s.type
+                    )
+                """, {"uid": user_uuid})
+                inserted = cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+    return inserted, len(rows) - inserted
+
+# Retrieve the most recent transaction records.
+# Pass `before=(created_at, id)` of the last row shown to fetch the next (older) page.
+def get_last_records(user_id, limit=5, before=None):
+    user_uuid = get_user_uuid(user_id)  # Convert LINE user ID to internal database ID
+    if not user_uuid:
+        return []
+
+    keyset_sql = ""
+    params = [user_uuid]
+    if before is not None:
+        keyset_sql = "AND (t.created_at, t.id) < (%s, %s)"
+        params.extend(before)
+    params.append(limit)
+
+    with _read_cursor(user_id) as cur:
+        cur.execute(f"""
+             SELECT 
+                t.id,
+                COALESCE(c.name, '') AS category_name,
+                t.item,
+                t.amount,
+                t.created_at            
+            FROM transactions AS t
+            LEFT JOIN categories AS c
+              ON c.id = t.category_id
+            WHERE t.user_id = %s
+              {keyset_sql}
+            ORDER BY t.created_at DESC, t.id DESC
+            LIMIT %s
+        """, params)
+        rows = cur.fetchall() or []
+        return [
+            {
+                "id": row[0],
+                "category_name": row[1],
+                "item": row[2],
+                "amount": row[3],
+                "created_at": row[4]
+            }
+            for row in rows
+        ]
+
+# Delete a transaction by its id (only if it belongs to the user).
+# With the record's created_at the delete is pruned to its monthly partition; without it
+# (postbacks rendered before they carried the timestamp) every partition's index is probed.
+# Returns the deleted record, or None when nothing matched.
+def delete_record_by_id(user_id, transaction_id, created_at=None):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return None
+
+    where, params = "id = %s AND user_id = %s", [transaction_id, user_uuid]
+    if created_at is not None:
+        where += " AND created_at = %s"
+        params.append(created_at)
+
+    _note_write(user_id)
+    with _cursor() as cur:
+        cur.execute(f"""
+            DELETE FROM transactions
+            WHERE {where}
+            RETURNING id, item, amount
+        """, params)
+        row = cur.fetchone()
+        return {"id": row[0], "item": row[1], "amount": row[2]} if row else None
+
+# Delete a specific transaction by index (latest = 1).
+# Kept for postback buttons rendered before records carried their ids; prefer delete_record_by_id.
+def delete_record(user_id, index):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return False
+
+    _note_write(user_id)
+    with _cursor() as cur:
+        cur.execute("""
+            DELETE FROM transactions
+            WHERE id = (
+                SELECT id FROM transactions
+                WHERE user_id = %s
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1 OFFSET %s
+            )
+        """, (user_uuid, index - 1))  # Index starts from 1
+        return cur.rowcount > 0
+    
+def get_user_category_id(user_id, category_name):
+    """Retrieve category ID for a user by category name."""
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return None
+
+    with _cursor() as cur:
+        cur.execute(
+            """
+            SELECT id
+            FROM categories
+            WHERE user_id = %s
+              AND LOWER(name) = LOWER(%s)
+            LIMIT 1
+            """,
+            (user_uuid, category_name)
+        )
+        row = cur.fetchone()
+        return row[0] if row else None
+
+
+# Output columns of transaction listings -> SQL expression
+TRANSACTION_COLUMNS = {
+    "id": "t.id",
+    "type": "t.type",
+    "category": "COALESCE(c.name, '')",
+    "item": "t.item",
+    "amount": "t.amount",
+    "date": "t.created_at",
+    "message": "t.message",
+}
+
+def _transactions_query(user_uuid, start_time=None, end_time=None, days=None, columns=DEFAULT_TRANSACTION_COLUMNS):
+    unknown = set(columns) - TRANSACTION_COLUMNS.keys()
+    if unknown:
+        raise ValueError(f"Unknown transaction column(s): {', '.join(sorted(unknown))}")
+
+    select_sql = ",\n            ".join(f"{TRANSACTION_COLUMNS[col]} AS \"{col}\"" for col in columns)
+    join_sql = "LEFT JOIN categories AS c ON c.id = t.category_id" if "category" in columns else ""
+    query = f"""
+        SELECT
+            {select_sql}
+        FROM transactions AS t
+        {join_sql}
+        WHERE t.user_id = %s
+    """
+    params = [user_uuid]
+
+    # Prioritize the 'days' parameter if provided
+    if days is not None:
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        query += " AND t.created_at >= %s"
+        params.append(since)
+    else:
+        if start_time:
+            query += " AND t.created_at >= %s"
+            params.append(start_time)
+        if end_time:
+            query += " AND t.created_at <= %s"
+            params.append(end_time)
+
+    query += " ORDER BY t.created_at DESC, t.id DESC"
+    return query, params
+
+# All categories of a user as {lower(name): id}, for resolving many names at once
+def get_user_category_map(user_id) -> dict[str, int]:
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return {}
+
+    with _cursor() as cur:
+        cur.execute("SELECT id, name FROM categories WHERE user_id = %s ORDER BY id", (user_uuid,))
+        mapping: dict[str, int] = {}
+        for cid, name in cur.fetchall():
+            mapping.setdefault(name.lower(), cid)
+        return mapping
+
+# Retrieve transactions within a specific time range or past N days
+def get_user_transactions(user_id, start_time=None, end_time=None, days=None, columns=DEFAULT_TRANSACTION_COLUMNS):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return []
+
+    query, params = _transactions_query(user_uuid, start_time, end_time, days, columns)
+    with _read_cursor(user_id) as cur:
+        cur.execute(query, params)
+        return [dict(zip(columns, r)) for r in cur.fetchall()]
+
+# Stream transactions (newest first) through a server-side cursor, `fetch_size` rows per round trip.
+# Memory stays constant regardless of history size; the generator holds its own pooled
+# connection until it is exhausted or closed.
+def iter_user_transactions(user_id, start_time=None, end_time=None, days=None,
+                           columns=DEFAULT_TRANSACTION_COLUMNS, fetch_size=500):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return
+
+    query, params = _transactions_query(user_uuid, start_time, end_time, days, columns)
+    yield from _stream_rows(query, params, columns, fetch_size, read_user=user_id)
+
+# Highest transaction id so far: the resume point for the next incremental export.
+# Ids come from an identity column, so unlike created_at (backdated by imports) they only grow.
+def get_export_watermark() -> int:
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM transactions")
+            return cur.fetchone()[0]
+
+# Stream transactions joined with category names for export, in id (insertion) order.
+# `user_id=None` exports every user; `after_id` / `through_id` bound the ids exported
+# (pass the previous run's watermark as after_id for incremental exports).
+def iter_transactions_for_export(user_id=None, after_id=None, through_id=None, fetch_size=2000):
+    filters, params = [], []
+    if user_id is not None:
+        user_uuid = get_user_uuid(user_id)
+        if not user_uuid:
+            return
+        filters.append("t.user_id = %s")
+        params.append(user_uuid)
+    if after_id is not None:
+        filters.append("t.id > %s")
+        params.append(after_id)
+    if through_id is not None:
+        filters.append("t.id <= %s")
+        params.append(through_id)
+
+    query = f"""
+        SELECT t.id, u.line_user_id, t.created_at, t.type, COALESCE(c.name, ''), t.item, t.amount, t.message
+        FROM transactions AS t
+        JOIN users AS u ON u.id = t.user_id
+        LEFT JOIN categories AS c ON c.id = t.category_id
+        {"WHERE " + " AND ".join(filters) if filters else ""}
+        ORDER BY t.id
+    """
+    yield from _stream_rows(query, params, EXPORT_COLUMNS, fetch_size)
+
+def _stream_rows(query, params, columns, fetch_size, read_user=None):
+    # `read_user` marks a reporting read of that user, which may be served by the replica;
+    # a replica failure before the first row falls back to the primary
+    if read_user is not None and _use_replica(read_user):
+        lsn = _primary_lsn()
+        started = False
+        try:
+            for row in _stream_from(_replica.pool, query, params, columns, fetch_size, min_lsn=lsn):
+                started = True
+                yield row
+            return
+        except _ReplicaBehind:
+            pass
+        except REPLICA_ERRORS as e:
+            _replica.mark_failed(e)
+            if started:
+                raise
+    if read_user is not None and _replica is not None:
+        _replica.record_read(False)
+    yield from _stream_from(get_pool(), query, params, columns, fetch_size)
+
+def _stream_from(pool, query, params, columns, fetch_size, min_lsn=None):
+    # Exclusive checkout: the connection sits in an open transaction between yields,
+    # so it must not be shared with other helpers running on this thread.
+    # `min_lsn` (replica only): raise _ReplicaBehind unless it has replayed that far
+    with pool.connection(exclusive=True) as conn:
+        conn.autocommit = False  # named cursors only live inside a transaction
+        try:
+            if min_lsn is not None:
+                with conn.cursor() as cur:
+                    if not _replica.replayed(cur, min_lsn):
+                        raise _ReplicaBehind
+                _replica.record_read(True)
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+                cur.execute(query, params)
+                while True:
+                    rows = cur.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    for r in rows:
+                        yield dict(zip(columns, r))
+            conn.commit()
+        finally:
+            if not conn.closed:
+                conn.rollback()
+                conn.autocommit = True
+
+# --- Rollup-aware range aggregation ---
+# transaction_daily_rollups holds exact per-(user, UTC day, category, type) sums, maintained by
+# triggers (database/migrations/004_daily_rollups.sql). A range is answered from the rollups for
+# every whole day it covers and from raw transactions only for the partial days at its edges.
+
+def _as_utc(dt: datetime) -> datetime:
+    # Naive datetimes are treated as UTC, as the pool pins every session to UTC
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+def _resolve_range(start_time=None, end_time=None, days=None):
+    if days is not None:
+        return datetime.now(timezone.utc) - timedelta(days=days), None
+    return start_time, end_time
+
+def _range_sums_sql(user_uuid, start_time=None, end_time=None) -> tuple[str, list]:
+    """
+    SQL yielding (category_id, type, total, tx_count) rows whose sums equal the raw transactions of
+    the user in [start_time, end_time]. category_id/type use the rollup encoding (0 / '' for NULL).
+    """
+    rollup_filters = ["r.user_id = %s"]
+    rollup_params: list = [user_uuid]
+    raw_filters = ["t.user_id = %s"]
+    raw_params: list = [user_uuid]
+    edge_filters = []
+    edge_params: list = []
+
+    if start_time is not None:
+        start_utc = _as_utc(start_time)
+        first_full_day = start_utc.date()
+        if start_utc != datetime(first_full_day.year, first_full_day.month, first_full_day.day, tzinfo=timezone.utc):
+            first_full_day += timedelta(days=1)
+        rollup_filters.append("r.day >= %s")
+        rollup_params.append(first_full_day)
+        raw_filters.append("t.created_at >= %s")
+        raw_params.append(start_time)
+        edge_filters.append("t.created_at < %s")
+        edge_params.append(datetime(first_full_day.year, first_full_day.month, first_full_day.day, tzinfo=timezone.utc))
+
+    if end_time is not None:
+        end_day = _as_utc(end_time).date()  # first day NOT fully covered
+        rollup_filters.append("r.day < %s")
+        rollup_params.append(end_day)
+        raw_filters.append("t.created_at <= %s")
+        raw_params.append(end_time)
+        edge_filters.append("t.created_at >= %s")
+        edge_params.append(datetime(end_day.year, end_day.month, end_day.day, tzinfo=timezone.utc))
+
+    raw_filters.append("(" + " OR ".join(edge_filters) + ")" if edge_filters else "FALSE")
+
+    sql = f"""
+        SELECT r.category_id, r.type, r.total, r.tx_count
+        FROM transaction_daily_rollups AS r
+        WHERE {" AND ".join(rollup_filters)}
+        UNION ALL
+        SELECT COALESCE(t.category_id, 0), COALESCE(t.type, ''), t.amount, 1
+        FROM transactions AS t
+        WHERE {" AND ".join(raw_filters)}
+    """
+    return sql, rollup_params + raw_params + edge_params
+
+# One-query period summary: income/expense totals, per-category totals and only the first
+# `detail_limit` detail rows (newest first). Cost no longer grows with the number of rows in range.
+def get_user_period_summary(user_id, start_time=None, end_time=None, days=None, detail_limit=80) -> dict:
+    summary = {"income": Decimal(0), "expense": Decimal(0), "count": 0, "categories": [], "records": []}
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return summary
+
+    start_time, end_time = _resolve_range(start_time, end_time, days)
+    sums_sql, sums_params = _range_sums_sql(user_uuid, start_time, end_time)
+
+    detail_filters = ["t.user_id = %s"]
+    detail_params: list = [user_uuid]
+    if start_time is not None:
+        detail_filters.append("t.created_at >= %s")
+        detail_params.append(start_time)
+    if end_time is not None:
+        detail_filters.append("t.created_at <= %s")
+        detail_params.append(end_time)
+
+    with _read_cursor(user_id) as cur:
+        cur.execute(f"""
+            WITH by_cat AS (
+                SELECT s.category_id, s.type, SUM(s.total) AS total, SUM(s.tx_count) AS tx_count
+                FROM ({sums_sql}) AS s
+                GROUP BY s.category_id, s.type
+            ),
+            details AS (
+                SELECT t.type, COALESCE(c.name, '') AS category, t.item, t.amount, t.created_at, t.message, t.id
+                FROM transactions AS t
+                LEFT JOIN categories AS c
+                  ON c.id = t.category_id
+                WHERE {" AND ".join(detail_filters)}
+                ORDER BY t.created_at DESC, t.id DESC
+                LIMIT %s
+            )
+            SELECT
+                (SELECT COALESCE(SUM(total) FILTER (WHERE type = 'income'), 0) FROM by_cat),
+                (SELECT COALESCE(SUM(total) FILTER (WHERE type <> 'income'), 0) FROM by_cat),
+                (SELECT COALESCE(SUM(tx_count), 0) FROM by_cat),
+                (SELECT json_agg(json_build_object(
+                            'category_id', NULLIF(b.category_id, 0),
+                            'category', c.name,
+                            'type', NULLIF(b.type, ''),
+                            'total', b.total::text,
+                            'count', b.tx_count
+                        ) ORDER BY b.total DESC)
+                 FROM by_cat AS b
+                 LEFT JOIN categories AS c ON c.id = b.category_id),
+                (SELECT json_agg(json_build_object(
+                            'type', d.type,
+                            'category', d.category,
+                            'item', d.item,
+                            'amount', d.amount::text,
+                            'date', d.created_at,
+                            'message', d.message
+                        ) ORDER BY d.created_at DESC, d.id DESC)
+                 FROM details AS d)
+        """, sums_params + detail_params + [detail_limit])
+        row = cur.fetchone()
+
+    summary["income"], summary["expense"], summary["count"] = row[0], row[1], int(row[2])
+    summary["categories"] = [
+        {**c, "total": Decimal(c["total"])} for c in (row[3] or [])
+    ]
+    summary["records"] = [
+        {**r, "amount": Decimal(r["amount"]), "date": datetime.fromisoformat(r["date"])} for r in (row[4] or [])
+    ]
+    return summary
+
+def get_user_category_sums_for_chart(
+    user_id: str,
+    start_time: datetime | None = None,
+    end_time: datetime | None = None,
+    days: int | None = None,
+) -> List[Dict]:
+    """
+    Return aggregated expense totals by category (include zero), ordered by category_id.
+    NOTE: This version EXCLUDES 'Uncategorized' (NULL/0) bucket.
+    """
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return []
+
+    start_time, end_time = _resolve_range(start_time, end_time, days)
+    sums_sql, sums_params = _range_sums_sql(user_uuid, start_time, end_time)
+
+    query = f"""
+        WITH user_cats AS (
+            SELECT id, name
+            FROM categories
+            WHERE (is_system_default = TRUE AND user_id = %s)
+        ),
+        sums AS ({sums_sql})
+        SELECT
+            uc.id AS category_id,
+            uc.name AS category_name,
+            COALESCE(SUM(s.total), 0) AS total_amount
+        FROM user_cats uc
+        LEFT JOIN sums s
+          ON s.category_id = uc.id
+         AND s.type = 'expense'
+        GROUP BY uc.id, uc.name
+        ORDER BY uc.id;
+    """
+
+    with _read_cursor(user_id) as cur:
+        cur.execute(query, [user_uuid] + sums_params)
+        rows = cur.fetchall()
+
+    return [
+        {
+            "category_id": r[0],
+            "category": r[1],
+            "total": float(r[2]) if r[2] is not None else 0.0,
+        }
+        for r in rows
+    ]
+
+
+# Search the user's records by keyword (item + message), best matches first.
+# Uses the jieba-segmented search_tokens GIN index (rows from before migration 006 need the backfill).
+def find_transactions_by_keyword(user_id: str, keyword: str, limit: int = 20, offset: int = 0):
+    """Search past records matching the keyword"""
+    user_uuid = get_user_uuid(user_id)
+    tokens = query_tokens(keyword)
+    if not user_uuid or not tokens:
+        return []
+
+    with _cursor() as cur:
+        cur.execute("""
+            WITH q AS (SELECT %(query)s::tsquery AS query)
+            SELECT t.id, t.item, t.amount, t.message, t.created_at,
+                   COALESCE(ts_rank(t.search_tokens, q.query), 0) AS rank
+            FROM transactions AS t, q
+            WHERE t.user_id = %(uid)s
+              AND t.search_tokens @@ q.query
+            ORDER BY rank DESC, t.created_at DESC, t.id DESC
+            LIMIT %(limit)s OFFSET %(offset)s
+        """, {
+            "query": to_tsquery_text(tokens),
+            "uid": user_uuid,
+            "limit": limit,
+            "offset": offset,
+        })
+        return [
+            {"id": r[0], "item": r[1], "amount": r[2], "message": r[3], "created_at": r[4], "rank": r[5]}
+            for r in cur.fetchall()
+        ]
+
+# Move a user's records to another category with one set-based UPDATE.
+# Rows are selected by keyword (same matching as find_transactions_by_keyword), explicit ids,
+# and/or their current category; rollups follow through the transactions_rollup_update trigger.
+def recategorize_transactions(user_id: str, category_name: str, keyword: str | None = None,
+                              transaction_ids=None, from_category: str | None = None) -> dict:
+    """
+    Returns {"category_id", "matched", "updated"}: rows selected, and rows whose category actually changed.
+    Raises ValueError if the target category doesn't exist or no filter is given.
+    """
+    tokens = query_tokens(keyword) if keyword else []
+    if keyword and not tokens:
+        return {"category_id": None, "matched": 0, "updated": 0}
+    if not tokens and transaction_ids is None and not from_category:
+        raise ValueError("recategorize_transactions needs a keyword, transaction ids or a source category")
+
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return {"category_id": None, "matched": 0, "updated": 0}
+
+    conditions = ["t.user_id = %(uid)s"]
+    params = {"uid": user_uuid, "category": category_name}
+    if tokens:
+        conditions.append("t.search_tokens @@ %(query)s::tsquery")
+        params["query"] = to_tsquery_text(tokens)
+    if transaction_ids is not None:
+        conditions.append("t.id = ANY(%(ids)s::bigint[])")
+        params["ids"] = [int(i) for i in transaction_ids]
+    if from_category:
+        conditions.append("""t.category_id IN (
+            SELECT id FROM categories WHERE user_id = %(uid)s AND LOWER(name) = LOWER(%(from_category)s))""")
+        params["from_category"] = from_category
+    where = " AND ".join(conditions)
+
+    # One statement, so the lookup, row locks and update share a single transaction
+    _note_write(user_id)
+    with _cursor() as cur:
+        cur.execute(f"""
+            WITH target AS (
+                SELECT id FROM categories
+                WHERE user_id = %(uid)s AND LOWER(name) = LOWER(%(category)s)
+                ORDER BY id
+                LIMIT 1
+            ),
+            matched AS (
+                SELECT t.id, t.created_at, t.category_id FROM transactions AS t
+                WHERE {where}
+                FOR UPDATE
+            ),
+            updated AS (
+                UPDATE transactions AS t
+                SET category_id = target.id
+                FROM matched AS m, target
+                WHERE t.id = m.id
+                  AND t.created_at = m.created_at  -- lets each probe prune to one partition
+                  AND m.category_id IS DISTINCT FROM target.id
+                RETURNING t.id
+            )
+            SELECT (SELECT id FROM target), (SELECT COUNT(*) FROM matched), (SELECT COUNT(*) FROM updated)
+        """, params)
+        category_id, matched, updated = cur.fetchone()
+    if category_id is None:
+        raise ValueError(f"Category '{category_name}' not found")
+    if updated:
+        notify_categories_changed(user_id)
+    return {"category_id": category_id, "matched": matched, "updated": updated}
+
+# Assign categories to specific records ({transaction_id: category_id}) in one UPDATE ... FROM (VALUES ...).
+# Pairs whose record or category belongs to another user are ignored. Returns the number of rows changed.
+def update_transaction_categories(user_id: str, assignments: dict[int, int]) -> int:
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid or not assignments:
+        return 0
+
+    values = ", ".join(["(%s::bigint, %s::bigint)"] * len(assignments))
+    params = [v for pair in assignments.items() for v in map(int, pair)]
+    _note_write(user_id)
+    with _cursor() as cur:
+        cur.execute(f"""
+            UPDATE transactions AS t
+            SET category_id = v.category_id
+            FROM (VALUES {values}) AS v(id, category_id)
+            JOIN categories AS c ON c.id = v.category_id AND c.user_id = %s
+            WHERE t.id = v.id
+              AND t.user_id = %s
+              AND t.category_id IS DISTINCT FROM v.category_id
+        """, (*params, user_uuid, user_uuid))
+        updated = cur.rowcount
+    if updated:
+        notify_categories_changed(user_id)
+    return updated
+
+# Update the category of a specific transaction
+def update_transaction_category(transaction_id: int, category: str):
+    """Update category of a specific transaction"""
+    with _cursor() as cur:
+        cur.execute("""
+            UPDATE transactions
+            SET category_id = %s
+            WHERE id = %s
+        """, (category, transaction_id))
+        updated = cur.rowcount
+    if updated:
+        notify_categories_changed(None)
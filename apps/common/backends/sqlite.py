@@ -0,0 +1,565 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+from typing import List, Dict
+from apps.common.search_tokens import document_tokens, query_tokens
+from apps.common.backends.base import (STORAGE_API, DEFAULT_TRANSACTION_COLUMNS, EXPORT_COLUMNS,
+                                       on_categories_changed, notify_categories_changed)
+from config import DEFAULT_CATEGORIES
+
+# Embedded SQLite storage backend (see apps/common/backends/base.py): one file, WAL mode,
+# no server round trips. Meant for single-node deployments and offline benchmarking.
+__all__ = [*STORAGE_API, "SQLITE_PATH", "TRANSACTION_COLUMNS", "connection"]
+
+# Set SQLITE_PATH to keep the ledger; the default lives in the temp dir, never inside the checkout
+SQLITE_PATH = os.getenv("SQLITE_PATH") or os.path.join(tempfile.gettempdir(), "linebot", "linebot.sqlite3")
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))  # seconds to wait on a locked database
+SCHEMA_FILE = Path(__file__).resolve().parents[3] / "database" / "sqlite_schema.sql"
+
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"  # fixed width, so text order == time order
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready: set[str] = set()
+
+def _connect() -> sqlite3.Connection:
+    if SQLITE_PATH != ":memory:":
+        Path(SQLITE_PATH).parent.mkdir(parents=True, exist_ok=True)
+    # isolation_level=None: autocommit, transactions are opened explicitly
+    conn = sqlite3.connect(SQLITE_PATH, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    with _schema_lock:
+        if SQLITE_PATH not in _schema_ready:
+            conn.executescript(SCHEMA_FILE.read_text(encoding="utf-8"))
+            _schema_ready.add(SQLITE_PATH)
+    return conn
+
+# Per-thread connection, opened on first use and kept for the life of the thread
+@contextmanager
+def connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
+    yield conn
+
+# Write transaction (BEGIN IMMEDIATE); nested calls join the caller's transaction
+@contextmanager
+def _transaction():
+    with connection() as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+# Read several statements from one WAL snapshot
+@contextmanager
+def _snapshot():
+    with connection() as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.commit()
+
+def _as_utc(dt: datetime) -> datetime:
+    # Naive datetimes are treated as UTC, same as the Postgres backend; never pass a local datetime.now()
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+def _ts(dt: datetime) -> str:
+    return _as_utc(dt).strftime(_TS_FORMAT)
+
+def _dt(text):
+    return datetime.strptime(text, _TS_FORMAT).replace(tzinfo=timezone.utc) if text else None
+
+def _cents(amount) -> int:
+    return int((Decimal(str(amount)) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+def _money(cents):
+    return None if cents is None else Decimal(cents).scaleb(-2)
+
+def _resolve_range(start_time=None, end_time=None, days=None):
+    if days is not None:
+        return datetime.now(timezone.utc) - timedelta(days=days), None
+    return start_time, end_time
+
+def _range_filters(user_uuid, start_time=None, end_time=None) -> tuple[list[str], list]:
+    filters, params = ["t.user_id = ?"], [user_uuid]
+    if start_time is not None:
+        filters.append("t.created_at >= ?")
+        params.append(_ts(start_time))
+    if end_time is not None:
+        filters.append("t.created_at <= ?")
+        params.append(_ts(end_time))
+    return filters, params
+
+def _fts_query(tokens: list[str]) -> str:
+    """AND of prefix matches in FTS5 query syntax (each token quoted)."""
+    return " AND ".join('"' + tok.replace('"', '""') + '"*' for tok in tokens)
+
+# --- users ---
+
+def get_user_uuid(user_id):
+    with connection() as conn:
+        row = conn.execute("SELECT id FROM users WHERE line_user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else None
+
+def ensure_user_exists(user_id, display_name=None):
+    if get_user_uuid(user_id) is not None:
+        return
+    with connection() as conn:
+        conn.execute("""
+            INSERT INTO users (line_user_id, display_name, preferred_lang)
+            VALUES (?, ?, 'zh-TW')
+            ON CONFLICT (line_user_id) DO UPDATE
+              SET display_name = COALESCE(excluded.display_name, users.display_name)
+        """, (user_id, display_name))
+
+def get_user_language(user_id):
+    with connection() as conn:
+        row = conn.execute("SELECT preferred_lang FROM users WHERE line_user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else None
+
+def set_user_language(user_id, lang_code):
+    with connection() as conn:
+        conn.execute("UPDATE users SET preferred_lang = ? WHERE line_user_id = ?", (lang_code, user_id))
+
+def delete_user(user_id) -> bool:
+    with connection() as conn:
+        return conn.execute("DELETE FROM users WHERE line_user_id = ?", (user_id,)).rowcount > 0
+
+# Lookups are local, so there is no identity cache to manage
+def invalidate_user_cache(user_id=None):
+    pass
+
+def user_cache_stats() -> dict:
+    return {}
+
+# --- categories ---
+
+def ensure_default_categories(user_id: str):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return
+
+    names = [cat["name"] for cat in DEFAULT_CATEGORIES]
+    with _transaction() as conn:
+        # Inserted in DEFAULT_CATEGORIES order, so ids ascend the same way (charts sort by id)
+        conn.executemany(
+            "INSERT OR IGNORE INTO categories (user_id, name, is_system_default) VALUES (?, ?, 1)",
+            [(user_uuid, name) for name in names],
+        )
+        conn.execute(f"""
+            UPDATE categories SET parent_id = id
+            WHERE user_id = ? AND parent_id IS NULL AND name IN ({", ".join("?" * len(names))})
+        """, (user_uuid, *names))
+
+def add_user_category(user_id: str, keyword: str, category: str):
+    ensure_user_exists(user_id)
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return
+
+    keyword = (keyword or "").strip()
+    category = (category or "").strip().lower()
+    if not keyword or not category:
+        return
+
+    with _transaction() as conn:
+        row = conn.execute("""
+            SELECT id FROM categories
+            WHERE name = ? AND (is_system_default = 1 OR user_id = ?)
+            ORDER BY is_system_default DESC
+            LIMIT 1
+        """, (category, user_uuid)).fetchone()
+        if not row:
+            raise ValueError(f"Root category '{category}' not found")
+
+        exists = conn.execute(
+            "SELECT 1 FROM categories WHERE user_id = ? AND lower(name) = lower(?) LIMIT 1",
+            (user_uuid, keyword),
+        ).fetchone()
+        if not exists:
+            conn.execute(
+                "INSERT INTO categories (user_id, name, parent_id, is_system_default) VALUES (?, ?, ?, 0)",
+                (user_uuid, keyword, row[0]),
+            )
+
+def get_user_category_id(user_id, category_name):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return None
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT id FROM categories WHERE user_id = ? AND lower(name) = lower(?) LIMIT 1",
+            (user_uuid, category_name),
+        ).fetchone()
+    return row[0] if row else None
+
+def get_user_category_map(user_id) -> dict[str, int]:
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return {}
+    with connection() as conn:
+        rows = conn.execute("SELECT id, name FROM categories WHERE user_id = ? ORDER BY id", (user_uuid,)).fetchall()
+    mapping: dict[str, int] = {}
+    for cid, name in rows:
+        mapping.setdefault(name.lower(), cid)
+    return mapping
+
+# --- writes ---
+
+def insert_transactions(user_id, category_id, item, amount, message, display_name=None, record_type='expense'):
+    ensure_user_exists(user_id, display_name)
+    user_uuid = get_user_uuid(user_id)
+    if user_uuid:
+        with connection() as conn:
+            conn.execute("""
+                INSERT INTO transactions (user_id, category_id, item, amount_cents, message, type, created_at, search_tokens)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (user_uuid, category_id, item, _cents(amount), message, record_type, _ts(datetime.now(timezone.utc)),
+                  " ".join(document_tokens(item, message))))
+
+# Same contract as the Postgres backend: rows already stored (same created_at, item, amount, type)
+# and duplicates inside the batch are skipped. Returns (inserted, skipped_duplicates).
+def bulk_insert_transactions(user_id, rows, display_name=None) -> tuple[int, int]:
+    if not rows:
+        return 0, 0
+    ensure_user_exists(user_id, display_name)
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return 0, len(rows)
+
+    params = []
+    for r in rows:
+        created_at, cents, record_type = _ts(r["created_at"]), _cents(r["amount"]), r.get("type") or "expense"
+        params.append((
+            user_uuid, r.get("category_id"), r["item"], cents, r.get("message") or None, record_type, created_at,
+            " ".join(document_tokens(r["item"], r.get("message"))),
+            user_uuid, created_at, r["item"], cents, record_type,
+        ))
+
+    with _transaction() as conn:
+        cur = conn.executemany("""
+            INSERT INTO transactions (user_id, category_id, item, amount_cents, message, type, created_at, search_tokens)
+            SELECT ?, ?, ?, ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM transactions
+                WHERE user_id = ? AND created_at = ? AND item = ? AND amount_cents = ? AND type IS ?
+            )
+        """, params)
+        inserted = cur.rowcount
+    return inserted, len(rows) - inserted
+
+def delete_record_by_id(user_id, transaction_id, created_at=None):
+    # created_at only narrows partitions on postgres; ids are unique here
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return None
+    with _transaction() as conn:
+        row = conn.execute(
+            "SELECT id, item, amount_cents FROM transactions WHERE id = ? AND user_id = ?",
+            (transaction_id, user_uuid),
+        ).fetchone()
+        if not row:
+            return None
+        conn.execute("DELETE FROM transactions WHERE id = ?", (row[0],))
+    return {"id": row[0], "item": row[1], "amount": _money(row[2])}
+
+def delete_record(user_id, index):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return False
+    with connection() as conn:
+        cur = conn.execute("""
+            DELETE FROM transactions
+            WHERE id = (
+                SELECT id FROM transactions
+                WHERE user_id = ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1 OFFSET ?
+            )
+        """, (user_uuid, index - 1))  # Index starts from 1
+        return cur.rowcount > 0
+
+def recategorize_transactions(user_id: str, category_name: str, keyword: str | None = None,
+                              transaction_ids=None, from_category: str | None = None) -> dict:
+    tokens = query_tokens(keyword) if keyword else []
+    if keyword and not tokens:
+        return {"category_id": None, "matched": 0, "updated": 0}
+    if not tokens and transaction_ids is None and not from_category:
+        raise ValueError("recategorize_transactions needs a keyword, transaction ids or a source category")
+
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return {"category_id": None, "matched": 0, "updated": 0}
+
+    conditions, params = ["user_id = ?"], [user_uuid]
+    if tokens:
+        conditions.append("id IN (SELECT rowid FROM transaction_search WHERE transaction_search MATCH ?)")
+        params.append(_fts_query(tokens))
+    if transaction_ids is not None:
+        ids = [int(i) for i in transaction_ids]
+        conditions.append(f"id IN ({', '.join('?' * len(ids))})")
+        params.extend(ids)
+    if from_category:
+        conditions.append("category_id IN (SELECT id FROM categories WHERE user_id = ? AND lower(name) = lower(?))")
+        params.extend([user_uuid, from_category])
+    where = " AND ".join(conditions)
+
+    with _transaction() as conn:
+        row = conn.execute(
+            "SELECT id FROM categories WHERE user_id = ? AND lower(name) = lower(?) ORDER BY id LIMIT 1",
+            (user_uuid, category_name),
+        ).fetchone()
+        if not row:
+            raise ValueError(f"Category '{category_name}' not found")
+        category_id = row[0]
+        matched = conn.execute(f"SELECT COUNT(*) FROM transactions WHERE {where}", params).fetchone()[0]
+        updated = conn.execute(
+            f"UPDATE transactions SET category_id = ? WHERE {where} AND category_id IS NOT ?",
+            [category_id, *params, category_id],
+        ).rowcount
+    if updated:
+        notify_categories_changed(user_id)
+    return {"category_id": category_id, "matched": matched, "updated": updated}
+
+def update_transaction_categories(user_id: str, assignments: dict[int, int]) -> int:
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid or not assignments:
+        return 0
+    with _transaction() as conn:
+        cur = conn.executemany("""
+            UPDATE transactions SET category_id = ?
+            WHERE id = ? AND user_id = ? AND category_id IS NOT ?
+              AND EXISTS (SELECT 1 FROM categories WHERE id = ? AND user_id = ?)
+        """, [(int(cid), int(tid), user_uuid, int(cid), int(cid), user_uuid) for tid, cid in assignments.items()])
+        updated = cur.rowcount
+    if updated:
+        notify_categories_changed(user_id)
+    return updated
+
+def update_transaction_category(transaction_id: int, category: str):
+    with connection() as conn:
+        updated = conn.execute("UPDATE transactions SET category_id = ? WHERE id = ?", (category, transaction_id)).rowcount
+    if updated:
+        notify_categories_changed(None)
+
+# --- reads ---
+
+def get_last_records(user_id, limit=5, before=None):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return []
+
+    keyset_sql = ""
+    params = [user_uuid]
+    if before is not None:
+        keyset_sql = "AND (t.created_at, t.id) < (?, ?)"
+        params.extend([_ts(before[0]), before[1]])
+    params.append(limit)
+
+    with connection() as conn:
+        rows = conn.execute(f"""
+            SELECT t.id, COALESCE(c.name, ''), t.item, t.amount_cents, t.created_at
+            FROM transactions AS t
+            LEFT JOIN categories AS c ON c.id = t.category_id
+            WHERE t.user_id = ? {keyset_sql}
+            ORDER BY t.created_at DESC, t.id DESC
+            LIMIT ?
+        """, params).fetchall()
+    return [
+        {"id": r[0], "category_name": r[1], "item": r[2], "amount": _money(r[3]), "created_at": _dt(r[4])}
+        for r in rows
+    ]
+
+# Output columns of transaction listings -> SQL expression (+ conversion of the stored value)
+TRANSACTION_COLUMNS = {
+    "id": "t.id",
+    "type": "t.type",
+    "category": "COALESCE(c.name, '')",
+    "item": "t.item",
+    "amount": "t.amount_cents",
+    "date": "t.created_at",
+    "message": "t.message",
+}
+_CONVERTERS = {"amount": _money, "date": _dt, "created_at": _dt}
+
+def _to_dict(columns, row) -> dict:
+    return {col: _CONVERTERS[col](v) if col in _CONVERTERS else v for col, v in zip(columns, row)}
+
+def _transactions_query(user_uuid, start_time=None, end_time=None, days=None, columns=DEFAULT_TRANSACTION_COLUMNS):
+    unknown = set(columns) - TRANSACTION_COLUMNS.keys()
+    if unknown:
+        raise ValueError(f"Unknown transaction column(s): {', '.join(sorted(unknown))}")
+
+    select_sql = ", ".join(f'{TRANSACTION_COLUMNS[col]} AS "{col}"' for col in columns)
+    join_sql = "LEFT JOIN categories AS c ON c.id = t.category_id" if "category" in columns else ""
+    filters, params = _range_filters(user_uuid, *_resolve_range(start_time, end_time, days))
+    query = f"""
+        SELECT {select_sql}
+        FROM transactions AS t
+        {join_sql}
+        WHERE {" AND ".join(filters)}
+        ORDER BY t.created_at DESC, t.id DESC
+    """
+    return query, params
+
+def get_user_transactions(user_id, start_time=None, end_time=None, days=None, columns=DEFAULT_TRANSACTION_COLUMNS):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return []
+    query, params = _transactions_query(user_uuid, start_time, end_time, days, columns)
+    with connection() as conn:
+        return [_to_dict(columns, r) for r in conn.execute(query, params).fetchall()]
+
+def iter_user_transactions(user_id, start_time=None, end_time=None, days=None,
+                           columns=DEFAULT_TRANSACTION_COLUMNS, fetch_size=500):
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return
+    query, params = _transactions_query(user_uuid, start_time, end_time, days, columns)
+    yield from _stream_rows(query, params, columns, fetch_size)
+
+def get_export_watermark() -> int:
+    with connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+
+def iter_transactions_for_export(user_id=None, after_id=None, through_id=None, fetch_size=2000):
+    filters, params = [], []
+    if user_id is not None:
+        user_uuid = get_user_uuid(user_id)
+        if not user_uuid:
+            return
+        filters.append("t.user_id = ?")
+        params.append(user_uuid)
+    if after_id is not None:
+        filters.append("t.id > ?")
+        params.append(after_id)
+    if through_id is not None:
+        filters.append("t.id <= ?")
+        params.append(through_id)
+
+    query = f"""
+        SELECT t.id, u.line_user_id, t.created_at, t.type, COALESCE(c.name, ''), t.item, t.amount_cents, t.message
+        FROM transactions AS t
+        JOIN users AS u ON u.id = t.user_id
+        LEFT JOIN categories AS c ON c.id = t.category_id
+        {"WHERE " + " AND ".join(filters) if filters else ""}
+        ORDER BY t.id
+    """
+    yield from _stream_rows(query, params, EXPORT_COLUMNS, fetch_size)
+
+def _stream_rows(query, params, columns, fetch_size):
+    # Own connection holding one read snapshot, so writes on this thread can't disturb the cursor
+    conn = _connect()
+    try:
+        conn.execute("BEGIN")
+        cur = conn.execute(query, params)
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            for r in rows:
+                yield _to_dict(columns, r)
+    finally:
+        conn.close()
+
+def get_user_period_summary(user_id, start_time=None, end_time=None, days=None, detail_limit=80) -> dict:
+    summary = {"income": Decimal(0), "expense": Decimal(0), "count": 0, "categories": [], "records": []}
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return summary
+
+    filters, params = _range_filters(user_uuid, *_resolve_range(start_time, end_time, days))
+    where = " AND ".join(filters)
+    with _snapshot() as conn:
+        by_cat = conn.execute(f"""
+            SELECT t.category_id, c.name, t.type, SUM(t.amount_cents) AS total, COUNT(*)
+            FROM transactions AS t
+            LEFT JOIN categories AS c ON c.id = t.category_id
+            WHERE {where}
+            GROUP BY t.category_id, t.type
+            ORDER BY total DESC
+        """, params).fetchall()
+        details = conn.execute(f"""
+            SELECT t.type, COALESCE(c.name, ''), t.item, t.amount_cents, t.created_at, t.message
+            FROM transactions AS t
+            LEFT JOIN categories AS c ON c.id = t.category_id
+            WHERE {where}
+            ORDER BY t.created_at DESC, t.id DESC
+            LIMIT ?
+        """, params + [detail_limit]).fetchall()
+
+    for category_id, name, record_type, total, count in by_cat:
+        summary["income" if record_type == "income" else "expense"] += _money(total)
+        summary["count"] += count
+        summary["categories"].append({
+            "category_id": category_id, "category": name, "type": record_type,
+            "total": _money(total), "count": count,
+        })
+    summary["records"] = [
+        {"type": r[0], "category": r[1], "item": r[2], "amount": _money(r[3]), "date": _dt(r[4]), "message": r[5]}
+        for r in details
+    ]
+    return summary
+
+def get_user_category_sums_for_chart(
+    user_id: str,
+    start_time: datetime | None = None,
+    end_time: datetime | None = None,
+    days: int | None = None,
+) -> List[Dict]:
+    """Expense totals per default category (zero included), ordered by category_id."""
+    user_uuid = get_user_uuid(user_id)
+    if not user_uuid:
+        return []
+
+    filters, params = _range_filters(user_uuid, *_resolve_range(start_time, end_time, days))
+    with connection() as conn:
+        rows = conn.execute(f"""
+            SELECT c.id, c.name, COALESCE(SUM(t.amount_cents), 0)
+            FROM categories AS c
+            LEFT JOIN transactions AS t
+              ON t.category_id = c.id AND t.type = 'expense' AND {" AND ".join(filters)}
+            WHERE c.user_id = ? AND c.is_system_default = 1
+            GROUP BY c.id, c.name
+            ORDER BY c.id
+        """, params + [user_uuid]).fetchall()
+    return [{"category_id": r[0], "category": r[1], "total": float(_money(r[2]))} for r in rows]
+
+def find_transactions_by_keyword(user_id: str, keyword: str, limit: int = 20, offset: int = 0):
+    """Search past records matching the keyword (FTS5 over jieba tokens, best matches first)"""
+    user_uuid = get_user_uuid(user_id)
+    tokens = query_tokens(keyword)
+    if not user_uuid or not tokens:
+        return []
+
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT t.id, t.item, t.amount_cents, t.message, t.created_at, -bm25(transaction_search) AS rank
+            FROM transaction_search
+            JOIN transactions AS t ON t.id = transaction_search.rowid
+            WHERE transaction_search MATCH ? AND t.user_id = ?
+            ORDER BY rank DESC, t.created_at DESC, t.id DESC
+            LIMIT ? OFFSET ?
+        """, (_fts_query(tokens), user_uuid, limit, offset)).fetchall()
+    return [
+        {"id": r[0], "item": r[1], "amount": _money(r[2]), "message": r[3], "created_at": _dt(r[4]), "rank": r[5]}
+        for r in rows
+    ]
@@ -0,0 +1,178 @@
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+log = logging.getLogger("db-pool")
+
+# Pool settings (override via environment variables)
+POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX", "5"))
+POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", "10"))          # seconds to wait for a free connection
+POOL_HEALTH_CHECK_AFTER = float(os.getenv("POSTGRES_POOL_IDLE_CHECK", "30"))  # ping connections idle longer than this
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe PostgreSQL pool with blocking checkout, health checks and
+    transparent reconnect. Checkouts are re-entrant per thread, so nested
+    database helpers reuse the connection their caller already holds.
+    Every session runs with TimeZone UTC, so naive timestamps and day
+    boundaries mean the same thing as in the rollup triggers.
+    """
+
+    def __init__(self, dsn: str, min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE,
+                 timeout: float = POOL_TIMEOUT, health_check_after: float = POOL_HEALTH_CHECK_AFTER,
+                 **connect_kwargs):
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+
+        self._pool = pg_pool.ThreadedConnectionPool(max(0, min(min_size, self.max_size)), self.max_size, dsn, **connect_kwargs)
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._local = threading.local()
+        self._last_used: dict[int, float] = {}
+        self._utc_sessions: set[int] = set()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "reconnects": 0,
+            "discarded": 0,
+            "wait_total_ms": 0.0,
+            "wait_max_ms": 0.0,
+        }
+
+    # --- checkout / return ---
+    @contextmanager
+    def connection(self, exclusive: bool = False):
+        """
+        Check out a connection for the duration of the block. Nested checkouts on the same
+        thread reuse it, unless `exclusive` is set: then a separate connection is taken and
+        not shared with nested helpers (e.g. for long-lived server-side cursors).
+
+        A checkout that needs a new connection while this thread already holds all
+        `max_size` of them could only wait for itself, so it raises PoolTimeout at once.
+        """
+        held = None if exclusive else getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        held_slots = getattr(self._local, "slots", 0)
+        if held_slots >= self.max_size:
+            self._record(timeouts=1)
+            raise PoolTimeout(f"All {self.max_size} database connections are already held by this thread "
+                              "(nested checkout, e.g. a database call while consuming a stream)")
+
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._record(timeouts=1)
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+        waited_ms = (time.monotonic() - started) * 1000
+        self._record_wait(waited_ms)
+        self._local.slots = held_slots + 1
+
+        conn = None
+        broken = False
+        try:
+            conn = self._checkout()
+            if not exclusive:
+                self._local.conn, self._local.depth = conn, 0
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if not exclusive:
+                self._local.conn = None
+            if conn is not None:
+                self._release(conn, broken)
+            # getattr: an abandoned stream generator may be finalized on another thread
+            self._local.slots = getattr(self._local, "slots", 1) - 1
+            self._slots.release()
+
+    def holds_connection(self) -> bool:
+        """True while the current thread is inside a (non-exclusive) checkout of this pool."""
+        return getattr(self._local, "conn", None) is not None
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        if not self._is_healthy(conn):
+            # Stale or dropped connection: discard it and open a fresh one
+            self._pool.putconn(conn, close=True)
+            self._forget(conn)
+            self._record(reconnects=1)
+            conn = self._pool.getconn()
+        conn.autocommit = True  # Recommended to avoid manual commit
+        if id(conn) not in self._utc_sessions:
+            with conn.cursor() as cur:
+                cur.execute("SET TIME ZONE 'UTC'")
+            self._utc_sessions.add(id(conn))
+        return conn
+
+    def _forget(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._utc_sessions.discard(id(conn))
+
+    def _release(self, conn, broken: bool):
+        close = broken or bool(conn.closed)
+        if close:
+            self._forget(conn)
+            self._record(discarded=1)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=close)
+        except Exception as e:
+            log.warning("Failed to return connection to pool: %s", e)
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last = self._last_used.get(id(conn))
+        if last is not None and time.monotonic() - last < self.health_check_after:
+            return True
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    # --- metrics ---
+    def _record(self, **deltas):
+        with self._stats_lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    def _record_wait(self, waited_ms: float):
+        with self._stats_lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_total_ms"] += waited_ms
+            self._stats["wait_max_ms"] = max(self._stats["wait_max_ms"], waited_ms)
+
+    def stats(self) -> dict:
+        """Return a snapshot of pool usage and wait-time metrics."""
+        with self._stats_lock:
+            snap = dict(self._stats)
+        snap["wait_avg_ms"] = snap["wait_total_ms"] / snap["checkouts"] if snap["checkouts"] else 0.0
+        snap["max_size"] = self.max_size
+        return snap
+
+    def close(self):
+        self._pool.closeall()
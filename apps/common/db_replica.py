@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+import logging
+
+import psycopg2
+
+from apps.common.db_pool import ConnectionPool, PoolTimeout
+
+log = logging.getLogger("db-replica")
+
+# Replica routing settings (override via environment variables)
+REPLICA_MAX_LAG = float(os.getenv("POSTGRES_REPLICA_MAX_LAG", "5"))            # seconds of replay lag tolerated
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("POSTGRES_REPLICA_LAG_CHECK", "2"))  # re-measure lag at most this often
+REPLICA_RETRY_AFTER = float(os.getenv("POSTGRES_REPLICA_RETRY_AFTER", "30"))    # back-off after a replica failure
+
+# Errors that mean "the replica is unusable right now", as opposed to a bad query
+REPLICA_ERRORS = (PoolTimeout, psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it received
+_LAG_SQL = """
+    SELECT CASE
+             WHEN NOT pg_is_in_recovery() THEN 0
+             WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+             ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END
+"""
+
+# True once the replica has replayed the primary WAL up to the given position (always on a primary)
+_REPLAYED_SQL = "SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn OR NOT pg_is_in_recovery()"
+
+
+class ReplicaRouter:
+    """
+    Tracks whether a streaming read replica may serve reads: it must be reachable and
+    replaying within `max_lag` seconds. Lag is sampled at most every `lag_check_interval`
+    seconds; after a failure the replica is skipped for `retry_after` seconds.
+
+    Lag alone doesn't give read-your-writes: a user's next message may land on another
+    instance. Each read therefore also checks `replayed(cur, lsn)` against the primary's
+    WAL position taken just before, and goes to the primary if the replica isn't there yet.
+    """
+
+    def __init__(self, dsn: str, max_lag: float = REPLICA_MAX_LAG,
+                 lag_check_interval: float = REPLICA_LAG_CHECK_INTERVAL,
+                 retry_after: float = REPLICA_RETRY_AFTER, **pool_kwargs):
+        self.dsn = dsn
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.retry_after = retry_after
+        self._pool_kwargs = pool_kwargs
+        self._pool: ConnectionPool | None = None
+        self._pool_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self._down_until = 0.0
+        self._lag: float | None = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"replica_reads": 0, "primary_reads": 0, "lagging": 0, "behind": 0, "failures": 0}
+
+    @property
+    def pool(self) -> ConnectionPool:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(self.dsn, **self._pool_kwargs)
+        return self._pool
+
+    def available(self) -> bool:
+        """True if reads may go to the replica now (cached lag sample, refreshed when stale)."""
+        now = time.monotonic()
+        if now < self._down_until:
+            return False
+        if now - self._checked_at >= self.lag_check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.lag_check_interval:
+                    self._checked_at = now
+                    self._lag = self._measure_lag()
+        if self._lag is None:
+            return False
+        if self._lag > self.max_lag:
+            self._record(lagging=1)
+            return False
+        return True
+
+    def _measure_lag(self) -> float | None:
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute(_LAG_SQL)
+                return float(cur.fetchone()[0])
+        except REPLICA_ERRORS as e:
+            self._fail(e)
+            return None
+
+    def replayed(self, cur, lsn: str) -> bool:
+        """True if the replica behind `cur` has replayed the primary WAL up to `lsn`."""
+        cur.execute(_REPLAYED_SQL, (lsn,))
+        if cur.fetchone()[0]:
+            return True
+        self._record(behind=1)
+        return False
+
+    def mark_failed(self, error: Exception):
+        """Skip the replica for `retry_after` seconds after a connection-level error."""
+        self._fail(error)
+        with self._lock:
+            self._lag = None
+            self._checked_at = time.monotonic()
+
+    def _fail(self, error: Exception):
+        self._down_until = time.monotonic() + self.retry_after
+        self._record(failures=1)
+        log.warning("Read replica unavailable, using the primary for %.0fs: %s", self.retry_after, error)
+
+    def record_read(self, on_replica: bool):
+        self._record(**{"replica_reads" if on_replica else "primary_reads": 1})
+
+    def _record(self, **deltas):
+        with self._stats_lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    def stats(self) -> dict:
+        """Routing counters, last measured lag and the replica pool metrics."""
+        with self._stats_lock:
+            snap = dict(self._stats)
+        snap["lag_seconds"] = self._lag
+        snap["down"] = time.monotonic() < self._down_until
+        snap["pool"] = self._pool.stats() if self._pool is not None else {}
+        return snap
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
@@ -0,0 +1,308 @@
+"""
+Persistent embedding cache shared by the category classifier and the intent router.
+
+Vectors are keyed by (model, normalized text) and kept in EMBEDDING_CACHE_DIR, two files
+per model so a cold start can reuse everything embedded before:
+
+    <model>.<generation>.vec   raw float16 (or float32) rows, memory-mapped for reads
+    <model>.index.json         dim, dtype, generation and {text: [row, last_used]}
+
+New vectors are appended to the current generation file and the index is replaced
+atomically; writers take a file lock so several workers can share the directory. When
+the vector file would exceed EMBEDDING_CACHE_MAX_MB, the least recently used rows are
+dropped by rewriting them into a new generation. If the directory is not writable the
+cache still serves what is on disk and keeps new vectors in memory.
+
+The cache survives restarts and is shared only as far as its directory is. The default
+(under the system temp dir) is local to one instance: on serverless hosts such as Vercel
+it is wiped on every cold start and not shared between instances, so it only keeps an
+instance warm. Point EMBEDDING_CACHE_DIR at a persistent volume shared by the workers
+(e.g. on a VM or container host) to reuse vectors across restarts and instances.
+
+    python -m apps.common.embedding_cache stats
+    python -m apps.common.embedding_cache clear [--model text-embedding-3-small]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+import threading
+import unicodedata
+from pathlib import Path
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: only the in-process lock applies
+    fcntl = None
+
+log = logging.getLogger("embedding-cache")
+
+# Default under the system temp dir: writable on serverless hosts and never inside the checkout,
+# but per instance and lost on cold starts there (see the module docstring)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "linebot", "embedding_cache")
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "64"))
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")
+
+_COMPACT_TO = 0.8  # after eviction, keep the vector file at this share of the size limit
+
+
+def normalize_text(text: str) -> str:
+    """Cache key for a text: NFKC, lower case, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", text or "").lower().split())
+
+
+class EmbeddingCache:
+    """On-disk embedding cache for one model; thread-safe, shared across processes through the directory."""
+
+    def __init__(self, model: str, directory: str | Path = EMBEDDING_CACHE_DIR,
+                 max_bytes: int = int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024), dtype: str = EMBEDDING_CACHE_DTYPE):
+        self.model = model
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._name = re.sub(r"[^\w.\-]", "_", model)
+        self._index_path = self.directory / f"{self._name}.index.json"
+        self._lock = threading.Lock()
+
+        self._dtype = np.dtype(dtype)
+        self._dim: int | None = None
+        self._generation = 0
+        self._count = 0  # rows in the current vector file
+        self._rows: dict[str, list] = {}  # text -> [row, last_used]
+        self._vectors: np.ndarray | None = None
+        self._index_stamp: tuple | None = None  # (mtime_ns, size) of the index last loaded
+        self._memory: dict[str, np.ndarray] = {}  # vectors that could not be written to disk
+
+        self.writable = True
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------- files ----------
+    def _vector_path(self, generation: int) -> Path:
+        return self.directory / f"{self._name}.{generation}.vec"
+
+    def _row_bytes(self) -> int:
+        return (self._dim or 0) * self._dtype.itemsize
+
+    def _map_vectors(self):
+        self._vectors = None
+        if self._count and self._dim:
+            self._vectors = np.memmap(self._vector_path(self._generation), dtype=self._dtype,
+                                      mode="r", shape=(self._count, self._dim))
+
+    def _reload(self):
+        """Pick up index changes made by other workers (or by an earlier compaction)."""
+        try:
+            st = self._index_path.stat()
+        except FileNotFoundError:
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._index_stamp:
+            return
+        try:
+            index = json.loads(self._index_path.read_text(encoding="utf-8"))
+            seen = {text: entry[1] for text, entry in self._rows.items()}
+            self._dim, self._dtype = index["dim"], np.dtype(index["dtype"])
+            self._generation, self._count = index["generation"], index["count"]
+            self._rows = {text: [row, max(last_used, seen.get(text, 0))]
+                          for text, (row, last_used) in index["rows"].items()}
+            self._map_vectors()
+            self._index_stamp = stamp
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("Ignoring unreadable embedding cache %s: %s", self._index_path, e)
+            self._rows, self._count, self._vectors, self._index_stamp = {}, 0, None, stamp
+
+    def _write_index(self):
+        tmp = self._index_path.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_text(json.dumps({
+            "model": self.model, "dim": self._dim, "dtype": self._dtype.name,
+            "generation": self._generation, "count": self._count, "rows": self._rows,
+        }, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self._index_path)
+        st = self._index_path.stat()
+        self._index_stamp = (st.st_mtime_ns, st.st_size)
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.directory / f"{self._name}.lock", "a") as fh:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _compact(self, new: dict[str, np.ndarray]):
+        """Write the most recently used rows plus `new` into a fresh generation file."""
+        budget = int(self.max_bytes * _COMPACT_TO) // max(self._row_bytes(), 1) - len(new)
+        keep = sorted(self._rows.items(), key=lambda kv: kv[1][1], reverse=True)[:max(budget, 0)]
+        self.evictions += len(self._rows) - len(keep)
+
+        old_path, generation = self._vector_path(self._generation), self._generation + 1
+        blocks = [self._vectors[[row for _, (row, _) in keep]]] if keep else []
+        blocks += [np.stack(list(new.values()))] if new else []
+        data = np.concatenate(blocks).astype(self._dtype) if blocks else np.empty((0, self._dim), self._dtype)
+        self._vector_path(generation).write_bytes(data.tobytes())
+
+        now = time.time()
+        self._rows = {text: [i, last_used] for i, (text, (_, last_used)) in enumerate(keep)}
+        self._rows.update({text: [len(keep) + i, now] for i, text in enumerate(new)})
+        self._generation, self._count = generation, len(data)
+        self._write_index()
+        self._map_vectors()
+        old_path.unlink(missing_ok=True)
+
+    # ---------- API ----------
+    def get_many(self, texts: list[str]) -> dict[str, np.ndarray]:
+        """Cached float32 vectors for the given normalized texts (missing ones are left out)."""
+        found: dict[str, np.ndarray] = {}
+        now = time.time()
+        with self._lock:
+            self._reload()
+            for text in texts:
+                entry = self._rows.get(text)
+                if entry is not None and self._vectors is not None and entry[0] < len(self._vectors):
+                    found[text] = np.array(self._vectors[entry[0]], dtype=np.float32)
+                    entry[1] = now
+                elif text in self._memory:
+                    found[text] = self._memory[text]
+                else:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+        return found
+
+    def put_many(self, vectors: dict[str, np.ndarray]):
+        """Store vectors for normalized texts; disk errors only disable persistence."""
+        if not vectors:
+            return
+        vectors = {text: np.asarray(v, dtype=np.float32) for text, v in vectors.items()}
+        with self._lock:
+            if self.writable:
+                try:
+                    self.directory.mkdir(parents=True, exist_ok=True)
+                    with self._file_lock():
+                        self._reload()
+                        new = {t: v for t, v in vectors.items() if t not in self._rows}
+                        if not new:
+                            return
+                        if self._dim is None:
+                            self._dim = len(next(iter(new.values())))
+                        if (self._count + len(new)) * self._row_bytes() > self.max_bytes:
+                            self._compact(new)
+                            return
+                        with open(self._vector_path(self._generation), "ab") as fh:
+                            fh.write(np.stack(list(new.values())).astype(self._dtype).tobytes())
+                        now = time.time()
+                        for i, text in enumerate(new):
+                            self._rows[text] = [self._count + i, now]
+                        self._count += len(new)
+                        self._write_index()
+                        self._map_vectors()
+                        return
+                except OSError as e:
+                    self.writable = False
+                    log.warning("Embedding cache %s is read-only, keeping new vectors in memory: %s",
+                                self.directory, e)
+            self._memory.update(vectors)
+            limit = self.max_bytes // max(len(next(iter(vectors.values()))) * 4, 1)
+            for text in list(self._memory)[:max(len(self._memory) - limit, 0)]:
+                del self._memory[text]
+                self.evictions += 1
+
+    def embed(self, texts: list[str], embed_fn) -> np.ndarray:
+        """
+        Embeddings for `texts` as a float32 matrix (one row per text). Cache misses are
+        embedded with a single `embed_fn(list_of_texts)` call on their normalized form.
+        """
+        keys = [normalize_text(t) for t in texts]
+        found = self.get_many(list(dict.fromkeys(keys)))
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        if missing:
+            fresh = {k: np.asarray(v, dtype=np.float32) for k, v in zip(missing, embed_fn(missing))}
+            self.put_many(fresh)
+            found.update(fresh)
+        return np.stack([found[k] for k in keys]) if keys else np.empty((0, self._dim or 0), np.float32)
+
+    def clear(self):
+        with self._lock:
+            for path in self.directory.glob(f"{self._name}.*"):
+                path.unlink(missing_ok=True)
+            self._rows, self._memory, self._count, self._vectors = {}, {}, 0, None
+            self._generation, self._index_stamp = 0, None
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._reload()
+            total = self.hits + self.misses
+            return {
+                "model": self.model,
+                "entries": len(self._rows) + len(self._memory),
+                "bytes": self._count * self._row_bytes(),
+                "max_bytes": self.max_bytes,
+                "dtype": self._dtype.name,
+                "dim": self._dim,
+                "writable": self.writable,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_caches: dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(model: str) -> EmbeddingCache:
+    """Process-wide cache instance for `model`."""
+    with _caches_lock:
+        if model not in _caches:
+            _caches[model] = EmbeddingCache(model)
+        return _caches[model]
+
+
+def cache_stats() -> dict[str, dict]:
+    """Stats of every cache used in this process, keyed by model."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {c.model: c.stats() for c in caches}
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m apps.common.embedding_cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="show entries and size per model")
+    clear = sub.add_parser("clear", help="delete cached vectors")
+    clear.add_argument("--model", default=None, help="only this model")
+    args = parser.parse_args(argv)
+
+    directory = Path(EMBEDDING_CACHE_DIR)
+    models = sorted(json.loads(p.read_text(encoding="utf-8")).get("model", p.name[:-len(".index.json")])
+                    for p in directory.glob("*.index.json"))
+    if args.command == "clear":
+        for model in models if args.model is None else [args.model]:
+            get_cache(model).clear()
+            print(f"Cleared {model}")
+        return 0
+
+    if not models:
+        print(f"No cached embeddings in {directory}")
+    for model in models:
+        s = get_cache(model).stats()
+        print(f"{model:<28} {s['entries']:>8} entries  {s['bytes'] / 1024 / 1024:8.2f} / "
+              f"{s['max_bytes'] / 1024 / 1024:.0f} MB  {s['dtype']} x {s['dim']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -56,6 +56,18 @@ TEXTS = {
         "zh-TW": "刪除第{n}筆",
         "en": "Delete #{n}",
     },
+    "record_deleted": {
+        "zh-TW": "已刪除：{item} {amount} 元",
+        "en": "Deleted: {item} {amount} NTD",
+    },
+    "record_not_found": {
+        "zh-TW": "找不到這筆紀錄，可能已經刪除了",
+        "en": "Record not found. It may have been deleted already.",
+    },
+    "delete_failed": {
+        "zh-TW": "刪除失敗，請稍後再試",
+        "en": "Failed to delete. Please try again later.",
+    },
     "weekly_summary": {
         "zh-TW": "📊 本週總結\n收入：{income} 元\n支出：{expense} 元\n結餘：{balance} 元",
         "en": "📊 Weekly Summary\nIncome: {income} NTD\nExpense: {expense} NTD\nBalance: {balance} NTD",
@@ -64,6 +76,14 @@ TEXTS = {
         "zh-TW": "已記錄：{category} {amount} 元",
         "en": "Recorded: {category} {amount} NTD",
     },
+    "recorded_items": {
+        "zh-TW": "已記錄 {count} 筆：\n{lines}",
+        "en": "Recorded {count} items:\n{lines}",
+    },
+    "recorded_items_line": {
+        "zh-TW": "・{item}（{category}）{amount} 元",
+        "en": "・{item} ({category}) {amount} NTD",
+    },
     "add_category_prefixes": {
         "zh-TW": ["新增分類：", "定義分類："],
         "en": ["add category:", "define category:"]
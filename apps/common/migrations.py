@@ -0,0 +1,166 @@
+"""
+Versioned schema migrations.
+
+SQL files live in database/migrations and are named `<version>_<name>.sql`
+(e.g. `002_hot_path_indexes.sql`). They are applied in version order, each in
+its own transaction, and recorded in `schema_migrations`.
+
+    python -m apps.common.migrations status
+    python -m apps.common.migrations up [--target 2] [--dry-run]
+"""
+import re
+import sys
+import hashlib
+import argparse
+import logging
+from pathlib import Path
+
+import apps.common.backends.postgres as db
+
+log = logging.getLogger("migrations")
+
+DATABASE_DIR = Path(__file__).resolve().parents[2] / "database"
+MIGRATIONS_DIR = DATABASE_DIR / "migrations"
+INIT_SCHEMA = DATABASE_DIR / "init_schema.sql"
+
+_FILE_RE = re.compile(r"^(\d+)_([\w\-]+)\.sql$")
+_LOCK_KEY = 7_340_021  # advisory lock id so concurrent deploys don't migrate twice
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover_migrations(directory: Path = MIGRATIONS_DIR) -> list[dict]:
+    """Return migration files sorted by version."""
+    found: dict[int, dict] = {}
+    for path in sorted(directory.glob("*.sql")):
+        m = _FILE_RE.match(path.name)
+        if not m:
+            raise MigrationError(f"Invalid migration file name: {path.name}")
+        version = int(m.group(1))
+        if version in found:
+            raise MigrationError(f"Duplicate migration version {version}: {path.name}, {found[version]['path'].name}")
+        sql = path.read_text(encoding="utf-8")
+        found[version] = {
+            "version": version,
+            "name": m.group(2),
+            "path": path,
+            "sql": sql,
+            "checksum": hashlib.sha256(sql.encode("utf-8")).hexdigest(),
+        }
+    return [found[v] for v in sorted(found)]
+
+
+def _ensure_bookkeeping(cur):
+    # Fresh database: create the base tables first
+    cur.execute("SELECT to_regclass('public.users') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        log.info("Base schema missing, applying %s", INIT_SCHEMA.name)
+        cur.execute(INIT_SCHEMA.read_text(encoding="utf-8"))
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.schema_migrations (
+          version integer PRIMARY KEY,
+          name text NOT NULL,
+          checksum text NOT NULL,
+          applied_at timestamptz NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def applied_migrations(cur) -> dict[int, dict]:
+    cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {r[0]: {"name": r[1], "checksum": r[2], "applied_at": r[3]} for r in cur.fetchall()}
+
+
+def status() -> list[dict]:
+    """List every known migration with its applied state."""
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            _ensure_bookkeeping(cur)
+            applied = applied_migrations(cur)
+
+    rows = []
+    for mig in discover_migrations():
+        done = applied.get(mig["version"])
+        rows.append({
+            "version": mig["version"],
+            "name": mig["name"],
+            "applied_at": done["applied_at"] if done else None,
+            "modified": bool(done) and done["checksum"] != mig["checksum"],
+        })
+    return rows
+
+
+def migrate(target: int | None = None, dry_run: bool = False) -> list[int]:
+    """Apply pending migrations up to `target` (inclusive). Returns the versions applied."""
+    pending_applied: list[int] = []
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_KEY,))
+            try:
+                _ensure_bookkeeping(cur)
+                applied = applied_migrations(cur)
+
+                for mig in discover_migrations():
+                    version = mig["version"]
+                    if target is not None and version > target:
+                        break
+                    if version in applied:
+                        if applied[version]["checksum"] != mig["checksum"]:
+                            log.warning("Migration %03d_%s changed after it was applied", version, mig["name"])
+                        continue
+                    if dry_run:
+                        log.info("Would apply %03d_%s", version, mig["name"])
+                        pending_applied.append(version)
+                        continue
+
+                    log.info("Applying %03d_%s", version, mig["name"])
+                    conn.autocommit = False
+                    try:
+                        cur.execute(mig["sql"])
+                        cur.execute(
+                            "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                            (version, mig["name"], mig["checksum"])
+                        )
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        raise MigrationError(f"Migration {version:03d}_{mig['name']} failed: {e}") from e
+                    finally:
+                        conn.autocommit = True
+                    pending_applied.append(version)
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+    return pending_applied
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m apps.common.migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="show applied and pending migrations")
+    up = sub.add_parser("up", help="apply pending migrations")
+    up.add_argument("--target", type=int, default=None, help="stop after this version")
+    up.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        for row in status():
+            state = row["applied_at"].isoformat() if row["applied_at"] else "pending"
+            flag = "  (modified since applied)" if row["modified"] else ""
+            print(f"{row['version']:03d}_{row['name']:<32} {state}{flag}")
+        return 0
+
+    try:
+        done = migrate(target=args.target, dry_run=args.dry_run)
+    except MigrationError as e:
+        log.error("%s", e)
+        return 1
+    print(f"{'Pending' if args.dry_run else 'Applied'}: {', '.join(f'{v:03d}' for v in done) or 'nothing'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Maintenance for the monthly partitions of transactions (see database/migrations/007_partition_transactions.sql).
+
+    python -m apps.common.partitions list
+    python -m apps.common.partitions ensure [--ahead 3]
+    python -m apps.common.partitions archive --retention-months 24 [--out archive/] [--dry-run]
+
+Run `ensure` periodically (e.g. daily cron) so next months' partitions exist before rows
+arrive. `archive` writes each partition older than the retention window to a gzip CSV
+(`COPY`-compatible, header row included), records it in transaction_archives and drops it.
+Daily rollups are left untouched, so yearly summaries and charts still include archived months.
+"""
+import os
+import sys
+import gzip
+import argparse
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+import apps.common.backends.postgres as db
+
+log = logging.getLogger("partitions")
+
+ARCHIVE_DIR = os.getenv("TRANSACTIONS_ARCHIVE_DIR", "archive")
+PARTITION_PREFIX = "transactions_p"
+
+
+def _month_start(dt: datetime, months_back: int = 0) -> datetime:
+    index = dt.year * 12 + dt.month - 1 - months_back
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def list_partitions() -> list[dict]:
+    """Monthly partitions (oldest first) with their bounds and estimated row counts."""
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint,
+                   pg_total_relation_size(c.oid)
+            FROM pg_inherits AS i
+            JOIN pg_class AS c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'public.transactions'::regclass
+            ORDER BY c.relname
+        """)
+        rows = cur.fetchall()
+
+    partitions = []
+    for name, bound, estimate, size in rows:
+        entry = {"name": name, "bound": bound, "rows_estimate": max(estimate, 0), "bytes": size, "start": None}
+        if name.startswith(PARTITION_PREFIX):
+            month = name[len(PARTITION_PREFIX):]
+            entry["start"] = datetime(int(month[:4]), int(month[4:]), 1, tzinfo=timezone.utc)
+        partitions.append(entry)
+    return partitions
+
+
+def ensure(months_ahead: int = 3) -> int:
+    """Create partitions from the current month through `months_ahead` months ahead. Returns how many were created."""
+    now = datetime.now(timezone.utc)
+    return ensure_range(_month_start(now), _month_start(now, -months_ahead))
+
+
+def ensure_range(start: datetime, end: datetime) -> int:
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT ensure_transaction_partitions(%s, %s)", (start, end))
+        created = cur.fetchone()[0]
+    if created:
+        log.info("Created %d partition(s) for %s .. %s", created, start.date(), end.date())
+    return created
+
+
+def _export_partition(cur, name: str, path: Path) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wb") as f:
+        cur.copy_expert(
+            f'COPY (SELECT * FROM public."{name}" ORDER BY created_at, id) TO STDOUT WITH (FORMAT csv, HEADER)',
+            f,
+        )
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def archive(retention_months: int, out_dir: str = ARCHIVE_DIR, dry_run: bool = False) -> list[dict]:
+    """
+    Archive every monthly partition that ends before the first month of the retention window.
+    Each partition is exported, detached, recorded and dropped in one transaction.
+    """
+    if retention_months < 1:
+        raise ValueError("retention_months must be at least 1")
+    cutoff = _month_start(datetime.now(timezone.utc), retention_months - 1)
+    candidates = [p for p in list_partitions() if p["start"] and _month_start(p["start"], -1) <= cutoff]
+    if dry_run:
+        return candidates
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    archived = []
+    with db.get_pool().connection(exclusive=True) as conn:
+        for p in candidates:
+            name = p["name"]
+            path = out / f"{name}.csv.gz"
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cur:
+                    # Block writes to the month while it is exported and detached
+                    cur.execute(f'LOCK TABLE public."{name}" IN SHARE MODE')
+                    cur.execute(f'SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM public."{name}"')
+                    row_count, total = cur.fetchone()
+                    _export_partition(cur, name, path)
+                    cur.execute(f'ALTER TABLE public.transactions DETACH PARTITION public."{name}"')
+                    cur.execute("""
+                        INSERT INTO transaction_archives
+                          (partition_name, range_start, range_end, row_count, total_amount, file_path)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    """, (name, p["start"], _month_start(p["start"], -1), row_count, total, str(path)))
+                    cur.execute(f'DROP TABLE public."{name}"')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+            log.info("Archived %s: %d rows -> %s", name, row_count, path)
+            archived.append({**p, "rows": row_count, "total": total, "file": str(path)})
+    return archived
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m apps.common.partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show partitions")
+    en = sub.add_parser("ensure", help="create upcoming monthly partitions")
+    en.add_argument("--ahead", type=int, default=3, help="months to create ahead of the current one")
+    ar = sub.add_parser("archive", help="move partitions past the retention window to files")
+    ar.add_argument("--retention-months", type=int, required=True, help="months of raw rows to keep, current included")
+    ar.add_argument("--out", default=ARCHIVE_DIR, help="directory for the .csv.gz files")
+    ar.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for p in list_partitions():
+            print(f"{p['name']:<24} ~{p['rows_estimate']:>10} rows {p['bytes'] / 1048576:9.1f} MiB  {p['bound']}")
+        return 0
+    if args.command == "ensure":
+        print(f"Created {ensure(args.ahead)} partition(s)")
+        return 0
+
+    result = archive(args.retention_months, args.out, args.dry_run)
+    verb = "Would archive" if args.dry_run else "Archived"
+    for p in result:
+        print(f"{verb} {p['name']}" + (f" ({p['rows']} rows -> {p['file']})" if not args.dry_run else ""))
+    print(f"{verb} {len(result)} partition(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+EXPLAIN-based guard for the hot queries in apps/common/database.py.
+
+Seeds a synthetic dataset inside a transaction, runs the real database helpers
+with a cursor that EXPLAINs every statement first, and fails if any plan falls
+back to a sequential scan on one of the application tables. Everything is rolled
+back afterwards, so it is safe to point at a live database.
+
+    python -m apps.common.query_plan_check [--users 500] [--per-user 200]
+"""
+import re
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from psycopg2.extensions import cursor as _pg_cursor
+
+import apps.common.backends.postgres as db
+from config import DEFAULT_CATEGORIES
+
+CHECKED_TABLES = {"users", "categories", "transactions", "transaction_daily_rollups"}
+SEED_PREFIX = "plancheck-"
+# Monthly partitions of transactions (migration 007) are reported under the parent table
+_PARTITION_RE = re.compile(r"^(transactions)_(?:p\d{6}|default)$")
+
+
+class ExplainingCursor(_pg_cursor):
+    """Records the JSON plan of every DML/SELECT statement before running it."""
+    plans: list[tuple[str, dict]] = []
+
+    def execute(self, query, vars=None):
+        sql = query.decode() if isinstance(query, bytes) else str(query)
+        head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+        if head in ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT"):
+            super().execute("EXPLAIN (FORMAT JSON) " + sql, vars)
+            ExplainingCursor.plans.append((sql, self.fetchone()[0][0]["Plan"]))
+        return super().execute(query, vars)
+
+
+def _seq_scans(plan: dict, empty: frozenset = frozenset()) -> list[str]:
+    found = []
+    relation = plan.get("Relation Name") or ""
+    table = _PARTITION_RE.sub(r"\1", relation)
+    if plan.get("Node Type") == "Seq Scan" and table in CHECKED_TABLES and relation not in empty:
+        found.append(relation)
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child, empty))
+    return found
+
+
+def _seed(cur, users: int, per_user: int):
+    cur.execute("""
+        INSERT INTO users (line_user_id, display_name)
+        SELECT %s || g, 'plan check' FROM generate_series(1, %s) AS g
+    """, (SEED_PREFIX, users))
+    cur.execute("""
+        INSERT INTO categories (user_id, name, is_system_default)
+        SELECT u.id, d.name, TRUE
+        FROM users u CROSS JOIN unnest(%s::text[]) AS d(name)
+        WHERE u.line_user_id LIKE %s
+    """, ([c["name"] for c in DEFAULT_CATEGORIES], SEED_PREFIX + "%"))
+    cur.execute("""
+        UPDATE categories c SET parent_id = c.id
+        FROM users u
+        WHERE u.id = c.user_id AND u.line_user_id LIKE %s
+    """, (SEED_PREFIX + "%",))
+    cur.execute("""
+        INSERT INTO transactions (user_id, category_id, item, amount, message, type, created_at, search_tokens)
+        SELECT u.id,
+               (SELECT c.id FROM categories c WHERE c.user_id = u.id ORDER BY c.id OFFSET g %% 7 LIMIT 1),
+               'item ' || g,
+               (g %% 500) + 1,
+               'item ' || g || ' ' || ((g %% 500) + 1),
+               CASE WHEN g %% 10 = 0 THEN 'income' ELSE 'expense' END,
+               now() - make_interval(hours => g),
+               array_to_tsvector(ARRAY['item', g::text, ((g %% 500) + 1)::text])
+        FROM users u CROSS JOIN generate_series(1, %s) AS g
+        WHERE u.line_user_id LIKE %s
+    """, (per_user, SEED_PREFIX + "%"))
+    cur.execute("ANALYZE users")
+    cur.execute("ANALYZE categories")
+    cur.execute("ANALYZE transactions")
+    cur.execute("ANALYZE transaction_daily_rollups")
+
+
+# Hot paths exercised against one seeded user; extend when adding new queries
+def hot_paths(line_user_id: str):
+    now = datetime.now(timezone.utc)
+    return [
+        ("get_user_uuid", lambda: db.get_user_uuid(line_user_id)),
+        ("get_last_records", lambda: db.get_last_records(line_user_id, limit=10)),
+        ("get_last_records(keyset page)", lambda: db.get_last_records(
+            line_user_id, limit=6, before=(now - timedelta(days=3), 2**62))),
+        ("delete_record_by_id", lambda: db.delete_record_by_id(line_user_id, 1, now - timedelta(days=1))),
+        ("get_user_transactions(week)", lambda: db.get_user_transactions(
+            line_user_id, start_time=now - timedelta(days=7), end_time=now)),
+        ("get_user_category_id", lambda: db.get_user_category_id(line_user_id, DEFAULT_CATEGORIES[0]["name"])),
+        ("get_user_category_sums_for_chart(month)", lambda: db.get_user_category_sums_for_chart(
+            line_user_id, start_time=now - timedelta(days=30), end_time=now)),
+        ("get_user_period_summary(year)", lambda: db.get_user_period_summary(
+            line_user_id, start_time=now - timedelta(days=365), end_time=now)),
+        ("find_transactions_by_keyword", lambda: db.find_transactions_by_keyword(line_user_id, "item 42")),
+        ("recategorize_transactions(keyword)", lambda: db.recategorize_transactions(
+            line_user_id, DEFAULT_CATEGORIES[1]["name"], keyword="item 42")),
+        ("update_transaction_categories", lambda: db.update_transaction_categories(line_user_id, {1: 1, 2: 1})),
+        ("delete_record", lambda: db.delete_record(line_user_id, 3)),
+    ]
+
+
+def check(users: int = 500, per_user: int = 200) -> list[tuple[str, str, list[str]]]:
+    """Return (label, sql, seq-scanned tables) for every offending statement."""
+    failures = []
+    with db.connection() as conn:
+        conn.autocommit = False
+        old_factory = conn.cursor_factory
+        try:
+            with conn.cursor() as cur:
+                _seed(cur, users, per_user)
+                # Scanning an empty (future/default) partition sequentially costs nothing
+                cur.execute("""
+                    SELECT c.relname FROM pg_inherits AS i JOIN pg_class AS c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = 'public.transactions'::regclass AND c.relpages = 0
+                """)
+                empty = frozenset(r[0] for r in cur.fetchall())
+
+            target = f"{SEED_PREFIX}1"
+            db.invalidate_user_cache(target)
+            conn.cursor_factory = ExplainingCursor
+            for label, fn in hot_paths(target):
+                ExplainingCursor.plans = []
+                fn()
+                for sql, plan in ExplainingCursor.plans:
+                    tables = _seq_scans(plan, empty)
+                    if tables:
+                        failures.append((label, sql, tables))
+                    print(f"{'FAIL' if tables else 'ok  '} {label}: {plan['Node Type']}"
+                          + (f" (seq scan on {', '.join(tables)})" if tables else ""))
+        finally:
+            conn.cursor_factory = old_factory
+            conn.rollback()
+            conn.autocommit = True
+            db.invalidate_user_cache()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m apps.common.query_plan_check")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--per-user", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    failures = check(args.users, args.per_user)
+    if failures:
+        print(f"\n{len(failures)} hot statement(s) fell back to a sequential scan:")
+        for label, sql, tables in failures:
+            print(f"- {label} [{', '.join(tables)}]\n{json.dumps(' '.join(sql.split()), ensure_ascii=False)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
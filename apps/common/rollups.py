@@ -0,0 +1,154 @@
+"""
+Maintenance for transaction_daily_rollups (see database/migrations/004_daily_rollups.sql).
+
+    python -m apps.common.rollups backfill [--user LINE_USER_ID] [--batch 200]
+    python -m apps.common.rollups check [--user LINE_USER_ID] [--fix]
+"""
+import sys
+import argparse
+import logging
+
+import apps.common.backends.postgres as db
+
+log = logging.getLogger("rollups")
+
+# Raw aggregate in the rollup encoding, restricted to the given internal user ids
+_RAW_AGG_SQL = """
+    SELECT t.user_id,
+           (t.created_at AT TIME ZONE 'UTC')::date AS day,
+           COALESCE(t.category_id, 0) AS category_id,
+           COALESCE(t.type, '') AS type,
+           SUM(t.amount) AS total,
+           COUNT(*) AS tx_count
+    FROM transactions AS t
+    WHERE t.user_id = ANY(%s)
+    GROUP BY 1, 2, 3, 4
+"""
+
+# Days of archived partitions (apps/common/partitions.py) have no raw rows left; their rollups
+# are the only copy of the totals, so rebuilds and checks must leave them alone.
+# transaction_archives comes from migration 007, which must be applied before this runs
+_NOT_ARCHIVED_SQL = """
+    NOT EXISTS (
+        SELECT 1 FROM transaction_archives AS a
+        WHERE {day} >= (a.range_start AT TIME ZONE 'UTC')::date
+          AND {day} < (a.range_end AT TIME ZONE 'UTC')::date
+    )
+"""
+
+
+def _user_ids(cur, line_user_id=None) -> list[int]:
+    if line_user_id:
+        cur.execute("SELECT id FROM users WHERE line_user_id = %s", (line_user_id,))
+    else:
+        cur.execute("SELECT id FROM users ORDER BY id")
+    return [r[0] for r in cur.fetchall()]
+
+
+def backfill(line_user_id=None, batch_size: int = 200) -> int:
+    """Rebuild rollups from raw transactions. Returns the number of users processed."""
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            user_ids = _user_ids(cur, line_user_id)
+        return rebuild_users(conn, user_ids, batch_size)
+
+
+def rebuild_users(conn, user_ids: list[int], batch_size: int = 200) -> int:
+    done = 0
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cur:
+                # Block concurrent writes only while this batch is recomputed,
+                # so trigger updates can't interleave with the rebuild
+                cur.execute("LOCK TABLE transactions IN SHARE MODE")
+                cur.execute(f"""
+                    DELETE FROM transaction_daily_rollups AS r
+                    WHERE r.user_id = ANY(%s) AND {_NOT_ARCHIVED_SQL.format(day="r.day")}
+                """, (batch,))
+                cur.execute(f"""
+                    INSERT INTO transaction_daily_rollups (user_id, day, category_id, type, total, tx_count)
+                    SELECT * FROM ({_RAW_AGG_SQL}) AS w
+                    WHERE {_NOT_ARCHIVED_SQL.format(day="w.day")}
+                """, (batch,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+        done += len(batch)
+        log.info("Rebuilt rollups for %d/%d users", done, len(user_ids))
+    return done
+
+
+def check(line_user_id=None, fix: bool = False) -> list[tuple]:
+    """
+    Compare rollups with raw transactions in one snapshot.
+    Returns mismatching (user_id, day, category_id, type, rollup_total, raw_total, rollup_count, raw_count) rows.
+    """
+    with db.connection() as conn:
+        conn.autocommit = False
+        try:
+            conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+            with conn.cursor() as cur:
+                user_ids = _user_ids(cur, line_user_id)
+                cur.execute(f"""
+                    WITH raw AS ({_RAW_AGG_SQL}),
+                    rollup AS (
+                        SELECT user_id, day, category_id, type, total, tx_count
+                        FROM transaction_daily_rollups
+                        WHERE user_id = ANY(%s)
+                    )
+                    SELECT COALESCE(r.user_id, w.user_id), COALESCE(r.day, w.day),
+                           COALESCE(r.category_id, w.category_id), COALESCE(r.type, w.type),
+                           r.total, w.total, r.tx_count, w.tx_count
+                    FROM rollup AS r
+                    FULL OUTER JOIN raw AS w
+                      ON w.user_id = r.user_id AND w.day = r.day
+                     AND w.category_id = r.category_id AND w.type = r.type
+                    WHERE (r.total IS DISTINCT FROM w.total OR r.tx_count IS DISTINCT FROM w.tx_count)
+                      AND {_NOT_ARCHIVED_SQL.format(day="COALESCE(r.day, w.day)")}
+                    ORDER BY 1, 2
+                """, (user_ids, user_ids))
+                mismatches = cur.fetchall()
+            conn.commit()
+        finally:
+            conn.rollback()  # no-op after commit; required before changing session settings
+            conn.set_session(isolation_level="DEFAULT", readonly=False)
+            conn.autocommit = True
+
+        if fix and mismatches:
+            rebuild_users(conn, sorted({m[0] for m in mismatches}))
+    return mismatches
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m apps.common.rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bf = sub.add_parser("backfill", help="rebuild rollups from raw transactions")
+    bf.add_argument("--user", help="LINE user id (default: all users)")
+    bf.add_argument("--batch", type=int, default=200, help="users per locked batch")
+    ck = sub.add_parser("check", help="compare rollups with raw transactions")
+    ck.add_argument("--user", help="LINE user id (default: all users)")
+    ck.add_argument("--fix", action="store_true", help="rebuild users with mismatches")
+    args = parser.parse_args(argv)
+
+    if args.command == "backfill":
+        print(f"Backfilled {backfill(args.user, args.batch)} user(s)")
+        return 0
+
+    mismatches = check(args.user, fix=args.fix)
+    for m in mismatches[:50]:
+        print(f"user={m[0]} day={m[1]} category={m[2]} type={m[3] or '-'} "
+              f"rollup={m[4]}/{m[6]} raw={m[5]}/{m[7]}")
+    if len(mismatches) > 50:
+        print(f"... {len(mismatches) - 50} more")
+    print(f"{len(mismatches)} mismatching rollup row(s){' (fixed)' if args.fix and mismatches else ''}")
+    return 1 if mismatches and not args.fix else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
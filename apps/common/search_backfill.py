@@ -0,0 +1,60 @@
+"""
+Fill transactions.search_tokens for rows written before migration 006.
+
+    python -m apps.common.search_backfill [--batch 1000]
+"""
+import sys
+import argparse
+import logging
+
+import apps.common.backends.postgres as db
+from apps.common.search_tokens import document_tokens
+
+log = logging.getLogger("search-backfill")
+
+_SEP = "\x1f"  # unit separator; never produced by the tokenizer
+
+
+def backfill(batch_size: int = 1000) -> int:
+    """Tokenize rows with NULL search_tokens in id order; returns the number of rows updated."""
+    total, last_id = 0, 0
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            while True:
+                cur.execute("""
+                    SELECT id, item, message FROM transactions
+                    WHERE search_tokens IS NULL AND id > %s
+                    ORDER BY id
+                    LIMIT %s
+                """, (last_id, batch_size))
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                # Token lists are ragged, so ship them as SEP-joined strings and split server-side
+                cur.execute("""
+                    UPDATE transactions AS t
+                    SET search_tokens = array_to_tsvector(string_to_array(v.tokens, %s))
+                    FROM unnest(%s::bigint[], %s::text[]) AS v(id, tokens)
+                    WHERE t.id = v.id
+                """, (
+                    _SEP,
+                    [r[0] for r in rows],
+                    [_SEP.join(document_tokens(item, message)) for _, item, message in rows],
+                ))
+                total += len(rows)
+                log.info("Tokenized %d rows (last id %d)", total, last_id)
+    return total
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m apps.common.search_backfill")
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args(argv)
+    print(f"Backfilled search tokens for {backfill(args.batch)} row(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import re
+import threading
+
+# Segmentation for transaction search (database/migrations/006_transaction_search.sql).
+# Documents are indexed with jieba's search mode (words + their sub-words), queries use
+# precise mode with prefix matching, so "星巴克" finds "星巴克 150" and "早" finds "早餐".
+
+_WORD_RE = re.compile(r"\w", re.UNICODE)
+_jieba = None
+_jieba_lock = threading.Lock()
+
+
+def _get_jieba():
+    global _jieba
+    if _jieba is None:
+        with _jieba_lock:
+            if _jieba is None:
+                import jieba
+                jieba.setLogLevel(60)  # silence dictionary loading messages
+                _jieba = jieba
+    return _jieba
+
+
+def _clean(tokens) -> list[str]:
+    seen = dict.fromkeys(tok.strip().lower() for tok in tokens)
+    return [tok for tok in seen if tok and _WORD_RE.search(tok)]
+
+
+def document_tokens(*texts) -> list[str]:
+    """Lexemes stored in transactions.search_tokens for the given item/message texts."""
+    text = " ".join(t for t in texts if t)
+    return _clean(_get_jieba().cut_for_search(text)) if text.strip() else []
+
+
+def query_tokens(keyword: str) -> list[str]:
+    return _clean(_get_jieba().cut(keyword or ""))
+
+
+def word_spans(text: str) -> list[tuple[str, int, int, bool]]:
+    """Precise-mode words of `text` as (word, start, end, in_dictionary); used to check keyword boundaries."""
+    if not text:
+        return []
+    jieba = _get_jieba()
+    spans = list(jieba.tokenize(text))  # loads the dictionary on first use
+    return [(word, start, end, jieba.dt.FREQ.get(word, 0) > 0) for word, start, end in spans]
+
+
+def to_tsquery_text(tokens: list[str]) -> str:
+    """AND of prefix matches, in tsquery input syntax (each lexeme quoted)."""
+    quoted = ("'" + tok.replace("\\", "\\\\").replace("'", "''") + "':*" for tok in tokens)
+    return " & ".join(quoted)
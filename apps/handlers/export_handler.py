@@ -0,0 +1,38 @@
+import os
+import hmac
+from datetime import datetime
+from flask import Response, abort, stream_with_context
+from apps.services.transaction_exporter import FORMATS, export
+
+EXPORT_API_TOKEN = os.getenv("EXPORT_API_TOKEN")
+
+# Handler for GET /export?format=csv|parquet[&user_id=...][&after_id=N]
+# Requires "Authorization: Bearer <EXPORT_API_TOKEN>"; disabled when the token is not configured.
+# The X-Export-Watermark response header is the after_id for the next incremental export.
+def handle_export(request):
+    if not EXPORT_API_TOKEN:
+        abort(404)
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer ") or not hmac.compare_digest(auth[len("Bearer "):], EXPORT_API_TOKEN):
+        abort(401)
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        abort(400)
+    after_id = request.args.get("after_id")
+    try:
+        after_id = int(after_id) if after_id else None
+    except ValueError:
+        abort(400)
+    user_id = request.args.get("user_id") or None
+
+    stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    watermark, chunks = export(fmt, user_id=user_id, after_id=after_id)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=FORMATS[fmt],
+        headers={
+            "Content-Disposition": f"attachment; filename=transactions-{stamp}.{fmt}",
+            "X-Export-Watermark": str(watermark),
+        },
+    )
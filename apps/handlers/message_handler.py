@@ -1,7 +1,6 @@
 # === Standard Library ===
 import os, re
 from datetime import datetime, timezone, timedelta
-from collections import defaultdict
 
 # === LINE SDK ===
 from linebot.v3.webhooks import MessageEvent, TextMessageContent
@@ -15,12 +14,15 @@ from apps.common.i18n import t
 import apps.common.database as db
 
 # === handlers ===
-from apps.handlers.reply_service import generate_summary_flex,flex_recent_records, generate_summary_carousel   
+from apps.handlers.reply_service import (
+    generate_summary_flex, flex_recent_records_page, generate_summary_carousel, RECENT_RECORDS_PAGE_SIZE,
+)
 from apps.handlers.chart_handler import generate_expense_chart
 
 # === Services ===
-from apps.services.category_classifier import classify_category_by_embedding
+from apps.services.category_classifier import classify_category_by_embedding, classify_many, remember
 from apps.services.nlp_router import route
+from apps.services.openai_embed import request_scope
 from apps.services.ai_financial_advisor import handle_ai_question 
 from apps.services.reply_service import get_main_quick_reply
 
@@ -104,10 +106,10 @@ def period_from_label(label: str, now: datetime):
 
 # ---------- intent handlers ----------
 def do_check(user_id, event, lang, bot, **_):
-    records = db.get_last_records(user_id)
+    records = db.get_last_records(user_id, limit=RECENT_RECORDS_PAGE_SIZE + 1)
     if not records:
         return send_text(bot, event, t("no_records", lang))
-    return send_flex(bot, event, flex_recent_records(records, lang))
+    return send_flex(bot, event, flex_recent_records_page(records, lang))
 
 def do_change_language(user_id, event, lang, bot, **_):
     nl = canonical_lang(lang)
@@ -131,41 +133,42 @@ def do_chart(user_id, event, lang, bot, range=None, **_):
         print(f"❌ Chart error: {e}")
         return send_text(bot, event, t("chart_failed", lang), lang=lang)
 
+SUMMARY_PAGE_SIZE = 8
+SUMMARY_MAX_PAGES = 10  # carousel limit
+
 def do_summary(user_id, event, lang, bot, range=None, **_):
     now = datetime.now(timezone.utc)
     start, end, key = period_from_label(range or "week", now)
-    records = db.get_user_transactions(user_id, start_time=start, end_time=end)
-
-    sums = defaultdict(int)
-    for r in records:
-        cat = (r.get("type") or "").lower()
-        if cat == "income":
-            sums["income"] += r.get("amount", 0)
-        else:
-            sums["expense"] += r.get("amount", 0)
-
-    income, expense = sums["income"], sums["expense"]
+    summary = db.get_user_period_summary(
+        user_id, start_time=start, end_time=end,
+        detail_limit=SUMMARY_PAGE_SIZE * SUMMARY_MAX_PAGES,
+    )
+    records = summary["records"]
+    income, expense = summary["income"], summary["expense"]
     summary_label = t(key, lang)
 
-    if len(records) > 8:
+    if len(records) > SUMMARY_PAGE_SIZE:
         flex = generate_summary_carousel(
             income, expense, income - expense,
             records=records,
             summary_type=summary_label,
             lang=lang,
-            page_size=8
+            page_size=SUMMARY_PAGE_SIZE
         )
     else:
         flex = generate_summary_flex(
             income, expense, income - expense,
-            records=records, summary_type=summary_label, lang=lang, max_detail_rows=8
+            records=records, summary_type=summary_label, lang=lang, max_detail_rows=SUMMARY_PAGE_SIZE
         )
 
     return send_flex(bot, event, flex, lang=lang)
 
 _rec_pat = re.compile(r"^(.+?)\s*([+-]?\d+(?:,\d{3})*)(?:\s*(?:元|ntd))?$", re.IGNORECASE)
 
-def do_record(user_id, event, lang, bot, text=None, rec_desc=None, rec_amt=None, **_):
+def do_record(user_id, event, lang, bot, text=None, rec_desc=None, rec_amt=None, rec_items=None, **_):
+    if rec_items:
+        return do_record_many(user_id, event, lang, bot, rec_items)
+
     # Fallback to regex if router didn't parse amount slots
     if rec_desc is None or rec_amt is None:
         m = _rec_pat.match((text or "").strip())
@@ -174,7 +177,7 @@ def do_record(user_id, event, lang, bot, text=None, rec_desc=None, rec_amt=None,
         rec_desc, rec_amt = m.group(1), int(m.group(2).replace(",", ""))
 
     item = rec_desc.strip()
-    category_info = classify_category_by_embedding(item)
+    category_info = classify_category_by_embedding(item, user_id=user_id)
     category_name = category_info.get(lang, category_info["key"])
     category_id = db.get_user_category_id(user_id, category_name)
     db.insert_transactions(
@@ -184,9 +187,32 @@ def do_record(user_id, event, lang, bot, text=None, rec_desc=None, rec_amt=None,
         amount=rec_amt,
         message=text or f"{item} {rec_amt}"
     )
+    if category_id:
+        remember(user_id, item, category_name)
 
     return send_text(bot, event, t("recorded_item", lang).format(category = category_name, amount=rec_amt))
 
+# Several "item amount" entries in one message: one batch classification, one category lookup
+def do_record_many(user_id, event, lang, bot, rec_items):
+    items = [(desc.strip(), amt) for desc, amt in rec_items]
+    category_ids = db.get_user_category_map(user_id)
+    lines = []
+    for (item, amount), category_info in zip(items, classify_many([item for item, _ in items], user_id=user_id)):
+        category_name = category_info.get(lang, category_info["key"])
+        category_id = category_ids.get(category_name.lower())
+        db.insert_transactions(
+            user_id,
+            category_id=category_id,
+            item=item,
+            amount=amount,
+            message=f"{item} {amount}"
+        )
+        if category_id:
+            remember(user_id, item, category_name)
+        lines.append(t("recorded_items_line", lang).format(item=item, category=category_name, amount=amount))
+
+    return send_text(bot, event, t("recorded_items", lang).format(count=len(lines), lines="\n".join(lines)))
+
 def do_ai(user_id, event, lang, bot, text=None, **_):
     try:
         answer = handle_ai_question(user_id, text or "")
@@ -217,7 +243,8 @@ def handle_message(event: MessageEvent):
     text = event.message.text.strip()
     lang = db.get_user_language(user_id) or "zh-TW"
 
-    with ApiClient(configuration) as api_client:
+    # One embedding scope per message: the router's vectors are reused by the classifier
+    with ApiClient(configuration) as api_client, request_scope():
         bot = MessagingApi(api_client)
         r = route(text, lang) or {"intent": "unknown"}
         intent = r.get("intent", "unknown")
@@ -1,6 +1,10 @@
 from linebot.v3.webhooks import PostbackEvent
 from linebot.v3.messaging import MessagingApi, ApiClient, Configuration, ReplyMessageRequest, TextMessage
 import apps.common.database as db
+from apps.handlers.reply_service import (
+    DELETE_ID_PREFIX, RECORDS_BEFORE_PREFIX, RECENT_RECORDS_PAGE_SIZE,
+    parse_records_before, parse_delete_postback, flex_recent_records_page,
+)
 from apps.services.reply_service import get_main_quick_reply
 from apps.common.i18n import t
 import os
@@ -16,11 +20,33 @@ def handle_postback(event: PostbackEvent):
     with ApiClient(configuration) as api_client:
         bot = MessagingApi(api_client)
 
+        if data.startswith(RECORDS_BEFORE_PREFIX):
+            try:
+                start_index, before = parse_records_before(data)
+                records = db.get_last_records(user_id, limit=RECENT_RECORDS_PAGE_SIZE + 1, before=before)
+            except Exception:
+                records = []
+            if records:
+                flex = flex_recent_records_page(records, lang, start_index=start_index)
+                flex.quick_reply = get_main_quick_reply(lang)
+                message = flex
+            else:
+                message = TextMessage(text=t("no_records", lang), quick_reply=get_main_quick_reply(lang))
+            bot.reply_message(ReplyMessageRequest(reply_token=event.reply_token, messages=[message]))
+            return
+
         if data.startswith("delete_"):
             try:
-                index = int(data.split("_", 1)[1])
-                db.delete_record(user_id, index)
-                msg = t("delete_nth", lang).format(n=index)
+                if data.startswith(DELETE_ID_PREFIX):
+                    rid, created_at = parse_delete_postback(data)
+                    deleted = db.delete_record_by_id(user_id, rid, created_at)
+                    msg = (t("record_deleted", lang).format(item=deleted["item"], amount=deleted["amount"])
+                           if deleted else t("record_not_found", lang))
+                else:
+                    # Legacy positional button from messages rendered before records carried ids
+                    index = int(data.split("_", 1)[1])
+                    db.delete_record(user_id, index)
+                    msg = t("delete_nth", lang).format(n=index)
             except Exception:
                 msg = t("delete_failed", lang)
 
@@ -29,7 +55,7 @@ def handle_postback(event: PostbackEvent):
                 messages=[
                     TextMessage(
                         text=msg,
-                        quick_reply=get_main_quick_reply(lang) 
+                        quick_reply=get_main_quick_reply(lang)
                     )
                 ]
-            ))
\ No newline at end of file
+            ))
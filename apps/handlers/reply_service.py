@@ -1,3 +1,4 @@
+from datetime import datetime
 from linebot.v3.messaging.models import FlexMessage
 from apps.common.i18n import t
 
@@ -176,7 +177,40 @@ def generate_summary_flex(
         "contents": bubble_dict
     })
 
-def flex_recent_records(records, lang):
+# --- postback payloads for recent records ---
+RECENT_RECORDS_PAGE_SIZE = 5
+DELETE_ID_PREFIX = "delete_id_"
+RECORDS_BEFORE_PREFIX = "records_before_"
+
+def delete_postback_data(record, position):
+    # Stable id (+ created_at, so the delete hits one partition) when available; legacy positional payload otherwise
+    rid = record.get("id")
+    if rid is None:
+        return f"delete_{position}"
+    created_at = record.get("created_at")
+    return f"{DELETE_ID_PREFIX}{rid}_{created_at.isoformat()}" if created_at else f"{DELETE_ID_PREFIX}{rid}"
+
+def parse_delete_postback(data):
+    """Return (id, created_at or None) from a delete_id_ payload."""
+    rid, _, created_at = data[len(DELETE_ID_PREFIX):].partition("_")
+    return int(rid), (datetime.fromisoformat(created_at) if created_at else None)
+
+def records_before_postback_data(record, next_index):
+    """"View More" payload: display number of the next row + keyset cursor (created_at, id) of the last row shown."""
+    return f"{RECORDS_BEFORE_PREFIX}{next_index}_{record['created_at'].isoformat()}_{record['id']}"
+
+def parse_records_before(data):
+    """Return (next_index, (created_at, id)) from a records_before_ payload."""
+    next_index, created_at, rid = data[len(RECORDS_BEFORE_PREFIX):].split("_")
+    return int(next_index), (datetime.fromisoformat(created_at), int(rid))
+
+def flex_recent_records_page(records, lang, page_size=RECENT_RECORDS_PAGE_SIZE, start_index=1):
+    """Render one page of records fetched with limit=page_size + 1; the extra row only signals "View More"."""
+    page = records[:page_size]
+    more = records_before_postback_data(page[-1], start_index + len(page)) if len(records) > page_size else None
+    return flex_recent_records(page, lang, start_index=start_index, more_postback_data=more)
+
+def flex_recent_records(records, lang, start_index=1, more_postback_data=None):
     def s(x): return "" if x is None else str(x)
     def ellipsis(x, n):
         x = s(x)
@@ -184,7 +218,7 @@ def flex_recent_records(records, lang):
 
     MAX_ROWS = 10
     rows = []
-    for i, r in enumerate(records[:MAX_ROWS], start=1):
+    for i, r in enumerate(records[:MAX_ROWS], start=start_index):
         name = (s(r.get("category_name")).strip() or t("uncategorized", lang))
         item = s(r.get("item")).strip()
         display_name = f"{name} - {item}" if item else name
@@ -205,7 +239,7 @@ def flex_recent_records(records, lang):
                     "aspectRatio": "1:1",
                     "flex": 1,
                     "gravity": "center",
-                    "action": { "type": "postback", "data": f"delete_{i}" }
+                    "action": { "type": "postback", "data": delete_postback_data(r, i) }
                 }
             ]
         })
@@ -222,6 +256,23 @@ def flex_recent_records(records, lang):
             ]
         }
     }
+    if more_postback_data:
+        bubble["footer"] = {
+            "type": "box",
+            "layout": "vertical",
+            "contents": [
+                {
+                    "type": "button",
+                    "style": "link",
+                    "height": "sm",
+                    "action": {
+                        "type": "postback",
+                        "label": t("view_more", lang),
+                        "data": more_postback_data
+                    }
+                }
+            ]
+        }
     return FlexMessage.from_dict({
         "type": "flex",
         "altText": t("recent_records_alt", lang),
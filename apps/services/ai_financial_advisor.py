@@ -1,24 +1,41 @@
+import os
+from contextlib import closing
+from itertools import islice
 import apps.services.call_openai_chatgpt as ai
 import apps.common.database as db
 from apps.common.i18n import t
 
+# Opt-in cap on records sent to the model (0 = all); when it applies, the prompt says the data is partial
+AI_CONTEXT_MAX_RECORDS = int(os.getenv("AI_CONTEXT_MAX_RECORDS", "0"))
+
 # Generate financial insights from user transactions using AI
 def handle_ai_question(user_id, question):
-    transactions = db.get_user_transactions(user_id)  
     lang = db.get_user_language(user_id)  
 
-    # Format transactions into readable lines
+    # Format transactions into readable lines (streamed; the cursor is released before calling the AI)
     context_lines = []
-    for t_data in transactions:
-        line = t("record_line_format", lang).format(
-            date=t_data['date'].strftime('%Y-%m-%d'),
-            category=t_data['category'],
-            amount=t_data['amount'],
-            message=t_data['message']
-        )
-        context_lines.append(line)
+    truncated = False
+    with closing(db.iter_user_transactions(
+        user_id, columns=("date", "category", "amount", "message"), fetch_size=200
+    )) as transactions:
+        if AI_CONTEXT_MAX_RECORDS > 0:
+            transactions = islice(transactions, AI_CONTEXT_MAX_RECORDS + 1)
+        for t_data in transactions:
+            if AI_CONTEXT_MAX_RECORDS > 0 and len(context_lines) == AI_CONTEXT_MAX_RECORDS:
+                truncated = True
+                break
+            line = t("record_line_format", lang).format(
+                date=t_data['date'].strftime('%Y-%m-%d'),
+                category=t_data['category'],
+                amount=t_data['amount'],
+                message=t_data['message']
+            )
+            context_lines.append(line)
 
     context = "\n".join(context_lines)
+    if truncated:
+        context += (f"\n(Only the newest {AI_CONTEXT_MAX_RECORDS} records are listed; older records exist. "
+                    "Say that totals and averages cover only these records.)")
 
     # Create AI prompt for financial analysis
     prompt = (
@@ -1,75 +1,166 @@
 import os
+import time
 import threading
 import logging
 import numpy as np
 from functools import lru_cache
-from openai import OpenAI
+from apps.services.embedding_artifacts import load_artifact
+from apps.services.openai_embed import EMBED_BACKEND, MODEL, embed_cached, cached_vector
+from apps.services.keyword_matcher import match_category
+from apps.services import user_knn
 from config import CORE_CATEGORIES
 
 # --- Setup ---
 _API_KEY = os.getenv("OPENAI_API_KEY")
-if not _API_KEY:
+if not _API_KEY and EMBED_BACKEND == "openai":
     raise RuntimeError("OPENAI_API_KEY is missing")
-_client = OpenAI(api_key=_API_KEY)
 
 _LOCK = threading.Lock()
-_category_vectors: dict[str, np.ndarray] | None = None
-_EMBED_MODEL = "text-embedding-3-small"
+# Category embeddings as one L2-normalized matrix (row i = _category_keys[i]),
+# so scoring a batch of items is a single matmul
+_category_keys: tuple[str, ...] = ()
+_category_matrix: np.ndarray | None = None
+_EMBED_MODEL = MODEL
 _FALLBACK_CATEGORY = "others"
-_SIM_THRESHOLD = 0.30
+_SIM_THRESHOLD = 0.30 if EMBED_BACKEND == "openai" else 0.05  # hashed n-gram cosines run much lower
 _VEC_DIM = 1536  # will be corrected on first successful embed
+_RETRY_AFTER = 60.0  # seconds on the zero-vector fallback before trying to init again
+_retry_at: float | None = None  # set while the category vectors are the zero fallback
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("category-classifier")
 
+# Localized / key names -> category key, for categories learned from a user's history
+_KEY_BY_NAME = {name.lower(): key for key, meta in CORE_CATEGORIES.items()
+                for name in (key, meta.get("en"), meta.get("zh-TW")) if name}
 
-def _embed(texts: list[str]) -> list[list[float]]:
-    resp = _client.embeddings.create(input=texts, model=_EMBED_MODEL)
-    return [d.embedding for d in resp.data]
+
+def _normalize_rows(vectors) -> np.ndarray:
+    """float32 copy of `vectors` (one per row) scaled to unit length; zero rows stay zero."""
+    m = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
 
 
 def _ensure_category_vectors():
-    """Compute and cache category embedding vectors exactly once."""
-    global _category_vectors, _VEC_DIM
-    if _category_vectors is not None:
+    """Load the category embedding matrix once: prebuilt artifact first, else embed the keyword blobs."""
+    global _category_keys, _category_matrix, _VEC_DIM, _retry_at
+    if _category_matrix is not None and (_retry_at is None or time.monotonic() < _retry_at):
         return
 
     with _LOCK:
-        if _category_vectors is not None:
+        if _category_matrix is not None and (_retry_at is None or time.monotonic() < _retry_at):
             return
         try:
-            # Use items() to keep name <-> keywords aligned
-            names, blobs = zip(*[(name, meta["keywords"]) for name, meta in CORE_CATEGORIES.items()])
-            vecs = _embed(list(blobs))
-            if not vecs:
+            loaded = load_artifact("categories", _EMBED_MODEL)
+            if loaded:
+                names, vecs = loaded
+            else:
+                # Use items() to keep name <-> keywords aligned
+                names, blobs = zip(*[(name, meta["keywords"]) for name, meta in CORE_CATEGORIES.items()])
+                vecs = embed_cached(list(blobs))
+            if not len(vecs):
                 raise RuntimeError("Empty embedding result for categories")
 
-            _VEC_DIM = len(vecs[0])  # correct dimension from model
-            _category_vectors = {name: np.array(vecs[i], dtype=np.float32) for i, name in enumerate(names)}
+            _VEC_DIM = vecs.shape[1]  # correct dimension from model
+            _category_keys, _category_matrix = tuple(names), _normalize_rows(vecs)
+            _retry_at = None
             # log.info("Category vectors initialized (%d dims).", _VEC_DIM)
         except Exception as e:
-            log.exception("Failed to init category vectors: %s", e)
-            # Safe fallback: zeros so cosine = 0
-            _category_vectors = {name: np.zeros(_VEC_DIM, dtype=np.float32) for name in CORE_CATEGORIES.keys()}
+            log.exception("Failed to init category vectors, retrying in %.0fs: %s", _RETRY_AFTER, e)
+            # Until a retry succeeds: zeros so cosine = 0 and everything falls back to "others"
+            if _category_matrix is None:
+                _category_keys = tuple(CORE_CATEGORIES.keys())
+                _category_matrix = np.zeros((len(_category_keys), _VEC_DIM), dtype=np.float32)
+            _retry_at = time.monotonic() + _RETRY_AFTER
 
 
-def _cosine(a: np.ndarray, b: np.ndarray) -> float:
-    denom = (np.linalg.norm(a) * np.linalg.norm(b))
-    return float(np.dot(a, b) / denom) if denom else 0.0
+def _best_categories(unit_vectors: np.ndarray) -> list[str]:
+    """Best category key for each row of `unit_vectors` (normalized embeddings); fallback below the threshold."""
+    sims = unit_vectors @ _category_matrix.T  # cosine, (n_items, n_categories)
+    best = sims.argmax(axis=1)
+    top = sims[np.arange(len(best)), best]
+    return [_category_keys[i] if sim >= _SIM_THRESHOLD else _FALLBACK_CATEGORY for i, sim in zip(best, top)]
 
 
 @lru_cache(maxsize=512)
 def _embed_single(text: str) -> np.ndarray:
-    v = _embed([text])[0]
-    return np.array(v, dtype=np.float32)
+    # Usually already embedded by the router in the same request as the message
+    return _normalize_rows(embed_cached([text]))
+
+
+def _category_result(key: str) -> dict:
+    meta = CORE_CATEGORIES.get(key, {})
+    return {"key": key, "en": meta.get("en", key.capitalize()), "zh-TW": meta.get("zh-TW", key)}
+
 
+def _history_result(name: str) -> dict:
+    """Result for a category name taken from the user's history; custom categories keep their own name as key."""
+    key = _KEY_BY_NAME.get(name.lower())
+    return _category_result(key) if key else {"key": name, "en": name, "zh-TW": name}
 
-def classify_category_by_embedding(text: str) -> dict:
-    """Return best-matched category with key + localized names."""
+
+def _embed_unit(texts: list[str]) -> np.ndarray:
+    return _normalize_rows(embed_cached(texts))
+
+
+def _user_index(user_id: str | None):
+    if not user_id:
+        return None
+    try:
+        return user_knn.get_index(user_id)
+    except Exception as e:
+        log.exception("User history index unavailable for %s: %s", user_id, e)
+        return None
+
+
+def classify_many(texts: list[str], user_id: str | None = None) -> list[dict]:
+    """Classify a batch of items with a single embedding request; same result shape as classify_category_by_embedding."""
+    cleaned = [(t or "").strip() for t in texts]
+    unique = list(dict.fromkeys(c for c in cleaned if c))
+    index = _user_index(user_id) if unique else None
+
+    # Items the user recorded before, then the keyword fast path; only the rest is embedded
+    results: dict[str, dict] = {}
+    for text in unique:
+        label = user_knn.exact_label(index, text) if index else None
+        key = None if label else match_category(text)
+        if label or key:
+            results[text] = _history_result(label) if label else _category_result(key)
+    pending = [text for text in unique if text not in results]
+
+    if pending:
+        _ensure_category_vectors()
+        try:
+            vecs = _embed_unit(pending)
+            for text, vec, key in zip(pending, vecs, _best_categories(vecs)):
+                label = user_knn.predict(index, vec, _embed_unit) if index else None
+                results[text] = _history_result(label) if label else _category_result(key)
+        except Exception as e:
+            log.exception("Batch embed failed for %d inputs: %s", len(pending), e)
+
+    return [results.get(text) or _category_result(_FALLBACK_CATEGORY) for text in cleaned]
+
+
+def classify_category_by_embedding(text: str, user_id: str | None = None) -> dict:
+    """
+    Return best-matched category with key + localized names. With a user_id an item the user
+    recorded before keeps its category, then keywords; only then is the text embedded, and
+    confident nearest neighbours in the user's history win over the global category vectors.
+    """
     cleaned = (text or "").strip()
     if not cleaned:
-        meta = CORE_CATEGORIES.get(_FALLBACK_CATEGORY, {})
-        return {"key": _FALLBACK_CATEGORY, "en": meta.get("en", "Others"), "zh-TW": meta.get("zh-TW", "其他")}
+        return _category_result(_FALLBACK_CATEGORY)
+
+    index = _user_index(user_id)
+    label = user_knn.exact_label(index, cleaned) if index else None
+    if label:
+        return _history_result(label)
+
+    key = match_category(cleaned)
+    if key:
+        return _category_result(key)
 
     _ensure_category_vectors()
 
@@ -77,15 +168,19 @@ def classify_category_by_embedding(text: str) -> dict:
         v = _embed_single(cleaned)
     except Exception as e:
         log.exception("Embed failed for input '%s': %s", cleaned, e)
-        meta = CORE_CATEGORIES.get(_FALLBACK_CATEGORY, {})
-        return {"key": _FALLBACK_CATEGORY, "en": meta.get("en", "Others"), "zh-TW": meta.get("zh-TW", "其他")}
+        return _category_result(_FALLBACK_CATEGORY)
 
-    best_key, best_sim = _FALLBACK_CATEGORY, -1.0
-    for name, vec in _category_vectors.items():
-        sim = _cosine(v, vec)
-        if sim > best_sim:
-            best_key, best_sim = name, sim
+    label = user_knn.predict(index, v[0], _embed_unit) if index else None
+    if label:
+        return _history_result(label)
+    return _category_result(_best_categories(v)[0])
 
-    key = best_key if best_sim >= _SIM_THRESHOLD else _FALLBACK_CATEGORY
-    meta = CORE_CATEGORIES.get(key, {})
-    return {"key": key, "en": meta.get("en", key.capitalize()), "zh-TW": meta.get("zh-TW", key)}
+
+def remember(user_id: str, item: str, category_name: str):
+    """Tell the user's history index about a stored record (uses the cached embedding only, never the API)."""
+    try:
+        vec = cached_vector(item)
+        unit = _normalize_rows(vec)[0] if vec is not None else None
+        user_knn.observe(user_id, item, category_name, unit)
+    except Exception as e:
+        log.warning("Could not update history index for %s: %s", user_id, e)
@@ -0,0 +1,122 @@
+"""
+Micro-batching for embedding requests.
+
+Callers submit texts and wait on futures; a background collector groups everything
+submitted within EMBED_BATCH_WAIT_MS of the oldest queued text (or up to EMBED_BATCH_MAX
+texts) into one API request, sent on a small thread pool so collection continues while
+a batch is in flight. A text that is already queued or in flight gets the existing
+future, so concurrent webhooks asking for the same item cause one embedding. stats()
+reports batch fill and the queueing delay the window adds.
+"""
+import os
+import time
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+log = logging.getLogger("embed-dispatcher")
+
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "256"))  # texts per API request
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "10"))  # collection window
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))  # batches in flight
+
+
+class EmbeddingDispatcher:
+    """Coalesces concurrent `send_fn(texts) -> vectors` calls into batched requests."""
+
+    def __init__(self, send_fn, max_batch: int = EMBED_BATCH_MAX, max_wait_ms: float = EMBED_BATCH_WAIT_MS,
+                 max_concurrency: int = EMBED_MAX_CONCURRENCY):
+        self._send = send_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_concurrency = max(1, max_concurrency)
+        self._cond = threading.Condition()
+        self._queued: dict[str, tuple[Future, float]] = {}  # text -> (future, enqueued at), oldest first
+        self._inflight: dict[str, Future] = {}
+        self._collector: threading.Thread | None = None
+        self._pool: ThreadPoolExecutor | None = None
+
+        self._batches = 0
+        self._sent = 0
+        self._coalesced = 0
+        self._errors = 0
+        self._delay_total = 0.0
+        self._delay_max = 0.0
+
+    def submit(self, text: str) -> Future:
+        with self._cond:
+            existing = self._queued.get(text)
+            future = existing[0] if existing else self._inflight.get(text)
+            if future is not None:
+                self._coalesced += 1
+                return future
+            future = Future()
+            self._queued[text] = (future, time.monotonic())
+            if self._collector is None or not self._collector.is_alive():
+                self._pool = self._pool or ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="embed-batch")
+                self._collector = threading.Thread(target=self._collect, name="embed-collector", daemon=True)
+                self._collector.start()
+            self._cond.notify()
+            return future
+
+    def embed(self, texts: list[str]) -> list:
+        """Vectors for `texts` in order; raises the batch's error if its request failed."""
+        futures = [self.submit(t) for t in texts]
+        return [f.result() for f in futures]
+
+    def _collect(self):
+        while True:
+            with self._cond:
+                while not self._queued:
+                    self._cond.wait()
+                deadline = next(iter(self._queued.values()))[1] + self.max_wait
+                while len(self._queued) < self.max_batch and (remaining := deadline - time.monotonic()) > 0:
+                    self._cond.wait(remaining)
+                batch = list(self._queued)[:self.max_batch]
+                now = time.monotonic()
+                futures = []
+                for text in batch:
+                    future, enqueued = self._queued.pop(text)
+                    self._inflight[text] = future
+                    futures.append(future)
+                    self._delay_total += now - enqueued
+                    self._delay_max = max(self._delay_max, now - enqueued)
+                self._batches += 1
+                self._sent += len(batch)
+            self._pool.submit(self._run, batch, futures)
+
+    def _run(self, batch: list[str], futures: list[Future]):
+        try:
+            vectors = self._send(batch)
+            if len(vectors) != len(batch):
+                raise RuntimeError(f"embedding request returned {len(vectors)} vectors for {len(batch)} texts")
+        except Exception as e:
+            log.warning("Embedding batch of %d failed: %s", len(batch), e)
+            for future in futures:
+                future.set_exception(e)
+            with self._cond:
+                self._errors += 1
+        else:
+            for future, vector in zip(futures, vectors):
+                future.set_result(vector)
+        # Resolved first, so a text submitted meanwhile still joins the finished future
+        with self._cond:
+            for text in batch:
+                self._inflight.pop(text, None)
+
+    def stats(self) -> dict:
+        with self._cond:
+            requested = self._sent + self._coalesced
+            return {
+                "batches": self._batches,
+                "texts_sent": self._sent,
+                "coalesced": self._coalesced,
+                "errors": self._errors,
+                "avg_batch_size": self._sent / self._batches if self._batches else 0.0,
+                "avg_batch_fill": self._sent / (self._batches * self.max_batch) if self._batches else 0.0,
+                "coalesce_rate": self._coalesced / requested if requested else 0.0,
+                "avg_queue_delay_ms": self._delay_total / self._sent * 1000 if self._sent else 0.0,
+                "max_queue_delay_ms": self._delay_max * 1000,
+                "queued": len(self._queued),
+                "in_flight": len(self._inflight),
+            }
@@ -0,0 +1,143 @@
+"""
+Precomputed anchor vectors for the category classifier and the intent router.
+
+`build` embeds the CORE_CATEGORIES keyword blobs and every INTENTS exemplar phrase
+(the description and each comma-separated example, one row each) once and writes them
+to EMBEDDING_ARTIFACT_DIR as `<kind>-<hash>.npy`, plus manifest.json. By default that is
+`vectors/` at the repository root, which vercel.json bundles into the deployed function,
+so run `build` before `vercel deploy`. The hash covers
+the model and the exact names/texts embedded, so editing them in config.py makes the
+artifact stale: loaders then log a warning and embed at runtime instead, and `check`
+fails until the artifact is rebuilt. Artifacts are memory-mapped on first use, so a
+cold start needs no embedding request for the anchors. Without them the anchors are
+embedded at runtime through the embedding cache (apps/common/embedding_cache.py), which
+keeps them for the life of the instance.
+
+    python -m apps.services.embedding_artifacts build     # needs OPENAI_API_KEY
+    python -m apps.services.embedding_artifacts check     # exit 1 if missing or stale
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import logging
+from pathlib import Path
+from datetime import datetime, timezone
+
+import numpy as np
+
+from config import CORE_CATEGORIES, INTENTS
+
+log = logging.getLogger("embedding-artifacts")
+
+# Shipped with the deployment (vercel.json includeFiles); EMBEDDING_ARTIFACT_DIR overrides it
+BUNDLED_ARTIFACT_DIR = Path(__file__).resolve().parents[2] / "vectors"
+ARTIFACT_DIR = Path(os.getenv("EMBEDDING_ARTIFACT_DIR") or BUNDLED_ARTIFACT_DIR)
+MANIFEST = ARTIFACT_DIR / "manifest.json"
+
+
+def intent_exemplars() -> tuple[list[str], list[str]]:
+    """(intent of each row, phrase) for every INTENTS entry: "description; example, example, ..."."""
+    labels, phrases = [], []
+    for name, spec in INTENTS.items():
+        description, _, examples = spec.partition(";")
+        for phrase in dict.fromkeys(p.strip() for p in [description, *examples.split(",")]):
+            if phrase:
+                labels.append(name)
+                phrases.append(phrase)
+    return labels, phrases
+
+
+# kind -> (names, texts to embed), read from config.py; names may repeat (one row per intent exemplar)
+ARTIFACT_INPUTS = {
+    "categories": lambda: (list(CORE_CATEGORIES), [meta["keywords"] for meta in CORE_CATEGORIES.values()]),
+    "intents": intent_exemplars,
+}
+
+_warned: set[str] = set()
+
+
+def content_hash(model: str, names: list[str], texts: list[str]) -> str:
+    payload = json.dumps({"model": model, "names": names, "texts": texts}, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _read_manifest() -> dict:
+    try:
+        return json.loads(MANIFEST.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+def artifact_status(kind: str, model: str) -> tuple[str, dict | None]:
+    """('ok' | 'missing' | 'stale', manifest entry) for one artifact kind."""
+    entry = _read_manifest().get(kind)
+    if not entry or not (ARTIFACT_DIR / entry["file"]).exists():
+        return "missing", entry
+    names, texts = ARTIFACT_INPUTS[kind]()
+    if entry["hash"] != content_hash(model, names, texts):
+        return "stale", entry
+    return "ok", entry
+
+
+def load_artifact(kind: str, model: str) -> tuple[list[str], np.ndarray] | None:
+    """(names, raw vectors) precomputed for `kind`, or None if missing or stale."""
+    try:
+        status, entry = artifact_status(kind, model)
+        if status == "ok":
+            return entry["names"], np.load(ARTIFACT_DIR / entry["file"], mmap_mode="r")
+    except (OSError, ValueError, KeyError) as e:
+        status = f"unreadable ({e})"
+    if kind not in _warned:
+        _warned.add(kind)
+        log.warning("%s vector artifact is %s, embedding at runtime; run "
+                    "`python -m apps.services.embedding_artifacts build`", kind, status)
+    return None
+
+
+def build(model: str, embed_fn) -> dict:
+    """Embed every artifact kind with `embed_fn(texts)` and write the files + manifest."""
+    ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = _read_manifest()
+    for kind, inputs in ARTIFACT_INPUTS.items():
+        names, texts = inputs()
+        digest = content_hash(model, names, texts)
+        vecs = np.asarray(embed_fn(texts), dtype=np.float32)
+        if vecs.shape[0] != len(names):
+            raise RuntimeError(f"{kind}: got {vecs.shape[0]} vectors for {len(names)} inputs")
+        path = ARTIFACT_DIR / f"{kind}-{digest}.npy"
+        np.save(path, vecs)
+        for old in ARTIFACT_DIR.glob(f"{kind}-*.npy"):
+            if old != path:
+                old.unlink()
+        manifest[kind] = {"file": path.name, "hash": digest, "model": model, "names": names,
+                          "dim": vecs.shape[1], "built_at": datetime.now(timezone.utc).isoformat()}
+        log.info("Built %s (%d x %d)", path.name, *vecs.shape)
+    MANIFEST.write_text(json.dumps(manifest, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return manifest
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m apps.services.embedding_artifacts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="embed categories and intents into EMBEDDING_ARTIFACT_DIR")
+    sub.add_parser("check", help="fail if an artifact is missing or out of date with config.py")
+    args = parser.parse_args(argv)
+
+    from apps.services.openai_embed import MODEL, embed
+    if args.command == "build":
+        build(MODEL, embed)
+        return 0
+
+    failed = False
+    for kind in ARTIFACT_INPUTS:
+        status, _ = artifact_status(kind, MODEL)
+        failed |= status != "ok"
+        print(f"{kind:<12} {status}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Local CPU-only embedding backend (EMBED_BACKEND=local).
+
+A text is turned into a bag of features (character 1-3-grams of the normalized text
+plus jieba words), each hashed with crc32 into one of LOCAL_EMBED_DIM signed buckets,
+then weighted with 1 + log(count) and L2-normalized. No network, no model files, about
+0.1 ms per short item, so vectors are recomputed instead of going through the persistent
+cache; they are deterministic across processes, so prebuilt artifacts work the same as
+for OpenAI (the model name includes the dimension).
+
+It only sees surface overlap: "拿鐵" is close to "咖啡拿鐵" but not to "咖啡". Compare it
+with OpenAI on the labelled fixtures with benchmarks/bench_embed_backends.py.
+
+    python -m apps.services.local_embed 星巴克拿鐵 搭捷運 本月總結
+"""
+import os
+import sys
+import math
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from apps.common.embedding_cache import normalize_text
+from apps.common.search_tokens import query_tokens
+
+LOCAL_EMBED_DIM = int(os.getenv("LOCAL_EMBED_DIM", "1024"))
+MODEL = f"local-ngram-{LOCAL_EMBED_DIM}"
+
+_NGRAMS = (1, 2, 3)
+_WORD_WEIGHT = 2.0  # a whole jieba word counts as much as two n-grams
+
+
+def _features(text: str) -> Counter:
+    norm = normalize_text(text)
+    feats = Counter()
+    for chunk in norm.replace(",", " ").replace(";", " ").split():
+        for n in _NGRAMS:
+            feats.update(chunk[i:i + n] for i in range(len(chunk) - n + 1))
+    for word in query_tokens(norm):
+        feats["w:" + word] += _WORD_WEIGHT
+    return feats
+
+
+def _vector(text: str, dim: int) -> np.ndarray:
+    vec = np.zeros(dim, dtype=np.float32)
+    for feat, count in _features(text).items():
+        h = zlib.crc32(feat.encode("utf-8"))
+        vec[h % dim] += (1.0 + math.log(count)) * (1.0 if h >> 31 else -1.0)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def embed(texts, dim: int = LOCAL_EMBED_DIM) -> list[np.ndarray]:
+    """One normalized float32 vector per text; same call shape as openai_embed.embed."""
+    return [_vector(t, dim) for t in texts]
+
+
+def main(argv=None):
+    items = argv if argv is not None else sys.argv[1:]
+    for item in items:
+        feats = _features(item)
+        print(f"{item}: {len(feats)} features, {np.count_nonzero(_vector(item, LOCAL_EMBED_DIM))} buckets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
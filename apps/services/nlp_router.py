@@ -1,11 +1,55 @@
 import re
+import logging
+import threading
 import numpy as np
-from apps.services.openai_embed import embed 
-from apps.common.i18n import t
-from config import INTENTS
-
-_THRESHOLD = 0.20  # intent similarity threshold
-_intent_vecs = None
+from apps.services.openai_embed import EMBED_BACKEND, MODEL, embed_cached
+from apps.services.embedding_artifacts import intent_exemplars, load_artifact
+from apps.common.embedding_cache import normalize_text
+from apps.common.i18n import TEXTS, t
+
+log = logging.getLogger("nlp-router")
+
+# Best exemplar similarity needed to trust the intent; OpenAI keeps its previous cut-off,
+# the n-gram backend scores short phrases higher and needs a stricter one
+_THRESHOLD = 0.20 if EMBED_BACKEND == "openai" else 0.30
+_TOP_K = 1  # an intent scores the mean of its k most similar exemplars (1 = max)
+
+# Every INTENTS exemplar phrase as one L2-normalized row; _intent_slots[i] lists the rows
+# of _intent_names[i] (-1 padded), so scoring a message is one matmul plus a gather
+_intent_names: tuple[str, ...] = ()
+_intent_matrix: np.ndarray | None = None
+_intent_slots: np.ndarray | None = None
+
+# An ASCII comma separates items too, except inside a number ("1,200")
+_ITEM_SEP = re.compile(r"(?:[\n；;，、]|(?<!\d),|,(?!\d))+")
+
+# "item amount" is only taken as a record without embeddings when it looks like one: a short
+# description, no question/aggregation wording, no second amount left in it, and an amount that isn't a year
+_RECORD_DESC_MAX = 20
+_QUESTION = re.compile(
+    r"[?？]|多少|幾筆|花了|總共|共花|合計|總計|平均|最多|最少|排行|前\s*\d+\s*[名筆大]"
+    r"|本月|這個月|上個月|本週|這週|上週|今年|去年"
+    r"|\b(?:how|what|which|when|top|total|average|spent|spend|sum)\b",
+    re.IGNORECASE,
+)
+_YEAR = re.compile(r"(?:19|20)\d\d")
+_LOOSE_NUMBER = re.compile(r"(?<![\w.-])\d+(?![\w.-])")
+
+# Fixed texts sent by quick replies and menus, in every language -> (intent, range)
+_EXACT_KEYS = {
+    "check": ("check", None),
+    "recent_records_alt": ("check", None),
+    "week_summary": ("summary", "week"),
+    "weekly_details": ("summary", "week"),
+    "monthly_details": ("summary", "month"),
+    "yearly_details": ("summary", "year"),
+    "week_summary_bar": ("chart", "week"),
+}
+_EXACT = {normalize_text(text): target for key, target in _EXACT_KEYS.items() for text in TEXTS[key].values()}
+_LANG_PREFIXES = tuple(normalize_text(p) for prefixes in TEXTS["change_language_prefixes"].values() for p in prefixes)
+
+_stats_lock = threading.Lock()
+_stats = {"exact": 0, "slots": 0, "embedding": 0, "fallback": 0}
 
 ROOT_KEYS = ["food", "investment", "transport", "entertainment", "shopping", "medical", "others"]
 
@@ -24,17 +68,38 @@ def canonical_root_from_token(token: str, lang: str) -> str | None:
             pass
     return None
 
-def _cos(a, b):
-    den = (np.linalg.norm(a) * np.linalg.norm(b))
-    return float(np.dot(a, b)/den) if den else 0.0
+def build_intent_index(labels: list[str], vecs) -> tuple[tuple[str, ...], np.ndarray, np.ndarray]:
+    """(intent names, normalized exemplar matrix, per-intent row slots) from one vector per exemplar."""
+    names = tuple(dict.fromkeys(labels))
+    matrix = np.atleast_2d(np.asarray(vecs, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    rows = [[i for i, label in enumerate(labels) if label == name] for name in names]
+    slots = np.full((len(names), max(map(len, rows))), -1, dtype=np.intp)
+    for i, r in enumerate(rows):
+        slots[i, :len(r)] = r
+    return names, matrix / norms, slots
 
 def _ensure_intents():
-    global _intent_vecs
-    if _intent_vecs is not None:
+    global _intent_names, _intent_matrix, _intent_slots
+    if _intent_matrix is not None:
         return
-    texts = list(INTENTS.values())
-    vecs = embed(texts)
-    _intent_vecs = {name: np.array(vecs[i], dtype=np.float32) for i, name in enumerate(INTENTS.keys())}
+    loaded = load_artifact("intents", MODEL)
+    if loaded:
+        labels, vecs = loaded
+    else:
+        labels, phrases = intent_exemplars()
+        vecs = embed_cached(phrases)
+    _intent_names, _intent_matrix, _intent_slots = build_intent_index(labels, vecs)
+
+def intent_scores(v, top_k: int = _TOP_K) -> np.ndarray:
+    """Cosine score of `v` for each of _intent_names: mean of that intent's top_k exemplar similarities."""
+    v = np.asarray(v, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(v)
+    sims = _intent_matrix @ (v / norm if norm else v)
+    padded = np.where(_intent_slots >= 0, sims[_intent_slots], -np.inf)
+    k = min(top_k, int((_intent_slots >= 0).sum(axis=1).min()))
+    return -np.partition(-padded, k - 1, axis=1)[:, :k].mean(axis=1)
 
 def parse_slots(text: str, lang: str):
     low = text.lower()
@@ -56,6 +121,11 @@ def parse_slots(text: str, lang: str):
     rec_desc = m_rec.group(1) if m_rec else None
     rec_amt = int(m_rec.group(2)) if m_rec else None
 
+    # Several records in one message ("早餐 60\n午餐 120", "早餐 60；午餐 120")
+    parts = [p.strip() for p in _ITEM_SEP.split(text) if p.strip()]
+    m_items = [re.match(r"^(.+?)\s*(\d+)$", p) for p in parts]
+    rec_items = [(m.group(1), int(m.group(2))) for m in m_items] if len(parts) > 1 and all(m_items) else None
+
     m_quick_default = re.match(r"^\s*新增\s+(\S+)\s*$", text)
     add_child_name = None
     add_parent_key = None
@@ -74,15 +144,48 @@ def parse_slots(text: str, lang: str):
         "add_kw": add_kw, "add_cat": add_cat,
         "del_kw": del_kw,
         "rec_desc": rec_desc, "rec_amt": rec_amt,
+        "rec_items": rec_items,
         "add_parent_key": add_parent_key,
         "add_child_name": add_child_name,
     }
 
+def _count(stage: str):
+    with _stats_lock:
+        _stats[stage] += 1
+
+def _is_question(desc: str) -> bool:
+    return bool(_QUESTION.search(desc))
+
+def _plain_item(desc: str | None, amount: int | None) -> bool:
+    desc = (desc or "").strip()
+    if not desc or amount is None:
+        return False
+    return (len(desc) <= _RECORD_DESC_MAX and not _is_question(desc) and not _LOOSE_NUMBER.search(desc)
+            and not _YEAR.fullmatch(str(amount)) and normalize_text(desc) not in _EXACT)
+
+def _plain_record(slots: dict) -> bool:
+    """Parsed "item amount" parts that can only be records: short item-like text, no question words, no year as the amount."""
+    if slots["rec_items"]:
+        return all(_plain_item(desc, amount) for desc, amount in slots["rec_items"])
+    return _plain_item(slots["rec_desc"], slots["rec_amt"])
+
+def _rule_intent(text: str, slots: dict) -> tuple[str, str, str | None] | None:
+    """(intent, stage, range) decided without embeddings: exact command texts, then unambiguous slot patterns."""
+    norm = normalize_text(text)
+    if norm in _EXACT:
+        intent, rng = _EXACT[norm]
+        return intent, "exact", rng or slots["range"]
+    if slots["new_lang"] and norm.startswith(_LANG_PREFIXES):
+        return "change_language", "slots", slots["range"]
+    if _plain_record(slots):
+        return "record", "slots", slots["range"]
+    return None
+
 def route(text: str, lang: str):
-    _ensure_intents()
     slots = parse_slots(text, lang)
 
     if slots.get("add_parent_key") and slots.get("add_child_name"):
+        _count("slots")
         return {
             "intent": "add_category_quick",
             "parent_key": slots["add_parent_key"],
@@ -91,16 +194,50 @@ def route(text: str, lang: str):
             "score": 1.0
         }
 
-    v = np.array(embed([text])[0], dtype=np.float32)
+    if slots.get("rec_items"):
+        if _plain_record(slots):
+            _count("slots")
+            return {"intent": "record", **slots, "score": 1.0}
+        # One part reads like a question: the whole message goes to the intent index as one text
+        slots["rec_items"] = None
+
+    # Commands and plain "item amount" records never need an embedding
+    rule = _rule_intent(text, slots)
+    if rule:
+        intent, stage, rng = rule
+        _count(stage)
+        return {"intent": intent, **slots, "range": rng, "score": 1.0}
+
+    # A record's description goes in the same request, so the classifier finds it in the request scope
+    texts = [text]
+    if slots["rec_desc"] and slots["rec_amt"] is not None:
+        texts.append(slots["rec_desc"].strip())
+
     best, sim = "unknown", -1.0
-    for name, vec in _intent_vecs.items():
-        s = _cos(v, vec)
-        if s > sim:
-            best, sim = name, s
+    try:
+        _ensure_intents()
+        v = embed_cached(texts)[0]
+    except Exception as e:
+        # Embeddings unavailable: route on the parsed slots below; the next message retries
+        log.warning("Intent embedding failed, routing by slots: %s", e)
+        _count("fallback")
+    else:
+        _count("embedding")
+        scores = intent_scores(v)
+        i = int(scores.argmax())
+        best, sim = _intent_names[i], float(scores[i])
 
     if sim < _THRESHOLD:
-        if slots["rec_desc"] and slots["rec_amt"] is not None:
+        if slots["rec_desc"] and slots["rec_amt"] is not None and not _is_question(slots["rec_desc"]):
             return {"intent": "record", **slots, "score": sim}
         return {"intent": "ai", **slots, "score": sim}
 
     return {"intent": best, **slots, "score": sim}
+
+def stats() -> dict:
+    """How often each stage decided the intent: exact command table, slot patterns, embeddings, or the slot fallback after an embedding error."""
+    with _stats_lock:
+        out = dict(_stats)
+    total = sum(out.values())
+    out["no_embedding_rate"] = (out["exact"] + out["slots"]) / total if total else 0.0
+    return out
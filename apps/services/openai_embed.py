@@ -1,8 +1,72 @@
-from openai import OpenAI
 import os
-_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-_MODEL = "text-embedding-3-small"
+from contextlib import contextmanager
+from contextvars import ContextVar
+import numpy as np
+from apps.common.embedding_cache import get_cache, normalize_text
+from apps.services.embed_dispatcher import EmbeddingDispatcher
+
+# "openai" (default) or "local" (hashed n-grams on CPU, see local_embed); chosen per deployment
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai").strip().lower()
+
+if EMBED_BACKEND == "local":
+    from apps.services import local_embed
+    MODEL = local_embed.MODEL
+    _dispatcher = None
+else:
+    from openai import OpenAI
+    _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    MODEL = "text-embedding-3-small"
+
+    def _request(texts):
+        resp = _client.embeddings.create(input=texts, model=MODEL)
+        return [d.embedding for d in resp.data]
+
+    # One dispatcher per process: concurrent embed() calls share batched API requests
+    _dispatcher = EmbeddingDispatcher(_request)
+
+# Vectors embedded while handling the current message (normalized text -> float32 vector)
+_request_vectors: ContextVar[dict | None] = ContextVar("request_vectors", default=None)
 
 def embed(texts):
-    resp = _client.embeddings.create(input=texts, model=_MODEL)
-    return [d.embedding for d in resp.data]
+    if _dispatcher is None:
+        return local_embed.embed(texts)
+    return _dispatcher.embed(list(texts))
+
+@contextmanager
+def request_scope():
+    """Within the block, embed_cached() reuses vectors already embedded for the same message."""
+    token = _request_vectors.set({})
+    try:
+        yield
+    finally:
+        _request_vectors.reset(token)
+
+def _embed_persistent(texts):
+    if _dispatcher is None:  # computing locally is cheaper than a cache lookup
+        return np.array(local_embed.embed(texts), dtype=np.float32).reshape(len(texts), local_embed.LOCAL_EMBED_DIM)
+    return get_cache(MODEL).embed(texts, embed)
+
+def embed_cached(texts):
+    """embed() through the persistent embedding cache; returns a float32 matrix, one row per text."""
+    scope = _request_vectors.get()
+    if scope is None or not texts:
+        return _embed_persistent(texts)
+    keys = [normalize_text(t) for t in texts]
+    missing = list(dict.fromkeys(k for k in keys if k not in scope))
+    if missing:
+        scope.update(zip(missing, _embed_persistent(missing)))
+    return np.stack([scope[k] for k in keys])
+
+def cached_vector(text):
+    """Vector for `text` if it can be had without an API call (this message's scope or the persistent cache), else None."""
+    key = normalize_text(text)
+    scope = _request_vectors.get()
+    if scope is not None and key in scope:
+        return scope[key]
+    if _dispatcher is None:
+        return _embed_persistent([key])[0]
+    return get_cache(MODEL).get_many([key]).get(key)
+
+def dispatcher_stats():
+    """Batch fill, coalescing and queueing delay of the embedding dispatcher (empty for the local backend)."""
+    return _dispatcher.stats() if _dispatcher is not None else {}
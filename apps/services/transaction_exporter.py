@@ -0,0 +1,157 @@
+"""
+Streaming export of transactions (joined with category names) to CSV or Parquet.
+
+Rows come from a server-side cursor and are written chunk by chunk, so memory stays
+flat regardless of history size. Parquet output needs the optional `pyarrow` package.
+
+Incremental exports resume from a transaction id, not a timestamp: imported rows can be
+backdated, but ids only grow. Each run exports up to the current highest id and reports
+it as the watermark to pass as --after-id next time.
+
+    python -m apps.services.transaction_exporter --format csv --out export.csv [--user LINE_USER_ID] [--after-id 12345]
+    python -m apps.services.transaction_exporter --format parquet --out export.parquet
+"""
+import io
+import csv
+import sys
+import argparse
+from datetime import datetime
+from itertools import islice
+
+import apps.common.database as db
+
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+CHUNK_ROWS = 5000
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+def iter_csv(rows, chunk_rows: int = CHUNK_ROWS):
+    """Yield CSV text (header first) one chunk of rows at a time."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(db.EXPORT_COLUMNS)
+    for chunk in _chunks(rows, chunk_rows):
+        for r in chunk:
+            writer.writerow([_csv_value(r[col]) for col in db.EXPORT_COLUMNS])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _parquet_schema(pa):
+    return pa.schema([
+        ("id", pa.int64()),
+        ("line_user_id", pa.string()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("type", pa.string()),
+        ("category", pa.string()),
+        ("item", pa.string()),
+        ("amount", pa.decimal128(12, 2)),
+        ("message", pa.string()),
+    ])
+
+
+class _ByteSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def iter_parquet(rows, chunk_rows: int = CHUNK_ROWS, compression: str = "zstd"):
+    """Yield Parquet bytes; every chunk of rows becomes one row group."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)") from e
+
+    schema = _parquet_schema(pa)
+    sink = _ByteSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+    try:
+        for chunk in _chunks(rows, chunk_rows):
+            columns = {col: [r[col] for r in chunk] for col in db.EXPORT_COLUMNS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export(fmt: str, user_id=None, after_id=None, chunk_rows: int = CHUNK_ROWS):
+    """
+    Return (watermark, generator of str (csv) or bytes (parquet) chunks) for the requested export.
+    Rows with after_id < id <= watermark are exported; pass the watermark as after_id next time.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'")
+    watermark = db.get_export_watermark()
+    rows = db.iter_transactions_for_export(user_id=user_id, after_id=after_id, through_id=watermark,
+                                           fetch_size=chunk_rows)
+    return watermark, iter_csv(rows, chunk_rows) if fmt == "csv" else iter_parquet(rows, chunk_rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m apps.services.transaction_exporter")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--out", default="-", help="output file ('-' = stdout, csv only)")
+    parser.add_argument("--user", help="LINE user id (default: all users)")
+    parser.add_argument("--after-id", type=int, help="only rows after this watermark (printed by the previous run)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    watermark, chunks = export(args.format, args.user, args.after_id, args.chunk_rows)
+    if args.format == "csv":
+        out = sys.stdout if args.out == "-" else open(args.out, "w", newline="", encoding="utf-8")
+    else:
+        if args.out == "-":
+            parser.error("--out is required for parquet")
+        out = open(args.out, "wb")
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"watermark: {watermark} (next incremental run: --after-id {watermark})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
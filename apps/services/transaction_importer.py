@@ -0,0 +1,226 @@
+"""
+Bulk import of historical records from CSV exports / bank statements.
+
+The file is parsed as a stream, items without an explicit category are classified
+in batches (one embedding request per chunk), and each chunk is loaded with COPY
+while skipping rows the user already has.
+
+    python -m apps.services.transaction_importer FILE --user LINE_USER_ID
+        [--chunk-size 1000] [--tz Asia/Taipei] [--sign bank] [--encoding utf-8-sig]
+
+Recognized header names (case-insensitive, zh-TW or en):
+    date / 日期 / 時間, item / description / 項目 / 品項 / 摘要, amount / 金額,
+    type / 類型 / 收支, category / 分類 / 類別, message / note / memo / 備註
+"""
+import re
+import csv
+import sys
+import time
+import argparse
+import logging
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from zoneinfo import ZoneInfo
+
+import apps.common.database as db
+from apps.services.category_classifier import classify_many
+from apps.services.keyword_matcher import stats as keyword_stats
+from config import DEFAULT_CATEGORIES
+
+log = logging.getLogger("transaction-importer")
+
+HEADER_ALIASES = {
+    "date": {"date", "datetime", "time", "日期", "時間", "交易日期"},
+    "item": {"item", "description", "name", "項目", "品項", "摘要", "說明"},
+    "amount": {"amount", "金額", "價格"},
+    "type": {"type", "類型", "收支"},
+    "category": {"category", "分類", "類別"},
+    "message": {"message", "note", "memo", "備註"},
+}
+_INCOME_WORDS = {"income", "收入", "deposit", "存入"}
+_DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d",
+                 "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y/%m/%d")
+_AMOUNT_NOISE = re.compile(r"[,\s$元]|NT\$?|NTD", re.IGNORECASE)
+
+# Default category names as stored per user (DEFAULT_CATEGORIES), keyed by classifier key
+_CATEGORY_NAME_BY_KEY = {c["key"]: c["name"] for c in DEFAULT_CATEGORIES}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def _map_header(header: list[str]) -> dict[str, int]:
+    mapping = {}
+    for idx, raw in enumerate(header):
+        name = (raw or "").strip().lower()
+        for field, aliases in HEADER_ALIASES.items():
+            if name in aliases and field not in mapping:
+                mapping[field] = idx
+    missing = {"date", "item", "amount"} - mapping.keys()
+    if missing:
+        raise ImportFormatError(f"Missing required column(s): {', '.join(sorted(missing))}")
+    return mapping
+
+
+def _parse_date(value: str, tz: ZoneInfo) -> datetime:
+    value = value.strip()
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        for fmt in _DATE_FORMATS:
+            try:
+                dt = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"Unrecognized date '{value}'")
+    return dt if dt.tzinfo else dt.replace(tzinfo=tz)
+
+
+def _parse_amount(value: str) -> Decimal:
+    try:
+        return Decimal(_AMOUNT_NOISE.sub("", value or ""))
+    except InvalidOperation:
+        raise ValueError(f"Unrecognized amount '{value}'")
+
+
+def parse_rows(lines, tz: ZoneInfo, sign: str = "expense-positive"):
+    """
+    Yield (line_no, row_dict | None, error | None) from an iterable of CSV lines.
+    `sign`: 'expense-positive' (budget apps: every amount is an expense unless typed) or
+    'bank' (statements: negative = expense, positive = income).
+    """
+    reader = csv.reader(lines)
+    try:
+        mapping = _map_header(next(reader))
+    except StopIteration:
+        return
+
+    def col(values, field):
+        idx = mapping.get(field)
+        return values[idx].strip() if idx is not None and idx < len(values) else ""
+
+    for line_no, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        try:
+            item = col(values, "item")
+            if not item:
+                raise ValueError("Empty item")
+            amount = _parse_amount(col(values, "amount"))
+            type_text = col(values, "type").lower()
+            if type_text:
+                record_type = "income" if type_text in _INCOME_WORDS else "expense"
+            elif sign == "bank":
+                record_type = "expense" if amount < 0 else "income"
+            else:
+                record_type = "expense"
+            yield line_no, {
+                "created_at": _parse_date(col(values, "date"), tz),
+                "item": item,
+                "amount": abs(amount),
+                "type": record_type,
+                "category": col(values, "category"),
+                "message": col(values, "message") or f"{item} {abs(amount)}",
+            }, None
+        except ValueError as e:
+            yield line_no, None, str(e)
+
+
+def _resolve_categories(rows, category_ids: dict[str, int], user_id: str | None = None):
+    """Fill category_id: explicit category column first, then batch classification of the rest (using the user's history)."""
+    to_classify = []
+    for r in rows:
+        explicit = r.pop("category", "")
+        r["category_id"] = category_ids.get(explicit.lower()) if explicit else None
+        if r["category_id"] is None and r["type"] == "expense":
+            to_classify.append(r)
+
+    if to_classify:
+        for r, result in zip(to_classify, classify_many([r["item"] for r in to_classify], user_id=user_id)):
+            name = _CATEGORY_NAME_BY_KEY.get(result["key"], result.get("zh-TW"))
+            r["category_id"] = category_ids.get((name or "").lower())
+
+
+def import_transactions(lines, user_id: str, chunk_size: int = 1000, tz: str = "UTC",
+                        sign: str = "expense-positive", on_progress=None) -> dict:
+    """
+    Import CSV lines for a LINE user. Returns counters:
+    read, inserted, duplicates, invalid, errors (first 20 as (line, message)), elapsed, rows_per_sec.
+    """
+    db.ensure_user_exists(user_id)
+    db.ensure_default_categories(user_id)
+    category_ids = db.get_user_category_map(user_id)
+    zone = ZoneInfo(tz)
+
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    started = time.perf_counter()
+
+    def flush(chunk):
+        _resolve_categories(chunk, category_ids, user_id)
+        inserted, duplicates = db.bulk_insert_transactions(user_id, chunk)
+        stats["inserted"] += inserted
+        stats["duplicates"] += duplicates
+        if on_progress:
+            on_progress(dict(stats, elapsed=time.perf_counter() - started))
+
+    chunk = []
+    for line_no, row, error in parse_rows(lines, zone, sign):
+        if error:
+            stats["invalid"] += 1
+            if len(stats["errors"]) < 20:
+                stats["errors"].append((line_no, error))
+            continue
+        stats["read"] += 1
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed"] = elapsed
+    stats["rows_per_sec"] = stats["read"] / elapsed if elapsed else 0.0
+    return stats
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m apps.services.transaction_importer")
+    parser.add_argument("file")
+    parser.add_argument("--user", required=True, help="LINE user id to import into")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--tz", default="UTC", help="time zone for dates without an offset")
+    parser.add_argument("--sign", choices=("expense-positive", "bank"), default="expense-positive")
+    parser.add_argument("--encoding", default="utf-8-sig")
+    args = parser.parse_args(argv)
+
+    def progress(s):
+        print(f"\rread={s['read']} inserted={s['inserted']} duplicates={s['duplicates']} "
+              f"invalid={s['invalid']} ({s['read'] / s['elapsed'] if s['elapsed'] else 0:.0f} rows/s)",
+              end="", flush=True)
+
+    try:
+        with open(args.file, newline="", encoding=args.encoding) as f:
+            stats = import_transactions(f, args.user, args.chunk_size, args.tz, args.sign, on_progress=progress)
+    except ImportFormatError as e:
+        log.error("%s", e)
+        return 1
+
+    print()
+    for line_no, error in stats["errors"]:
+        print(f"line {line_no}: {error}")
+    print(f"Done: {stats['inserted']} inserted, {stats['duplicates']} duplicates skipped, "
+          f"{stats['invalid']} invalid, {stats['rows_per_sec']:.0f} rows/s")
+    fast = keyword_stats()
+    if fast["lookups"]:
+        print(f"Categories: {fast['hits']}/{fast['lookups']} items matched by keyword "
+              f"({fast['hit_rate']:.0%}), the rest by embeddings")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Per-user nearest-neighbour index over a user's own past items.
+
+Each user's recent distinct items (up to USER_KNN_MAX_ITEMS) are kept with the category
+name the user ended up with, so "全聯" can mean food for one user and shopping for another.
+Indexes live in an LRU + TTL cache (USER_KNN_CACHE_USERS users) and are built from
+get_last_records with labels only. New records update a cached index in place; any
+recategorization in the database (db.on_categories_changed) drops the user's index so it
+is rebuilt from the stored labels, and the TTL picks up writes made by other processes.
+
+The category classifier asks the index first for an item the user has recorded before,
+which needs no embedding. Only when the keyword fast path also misses are the items
+embedded (a float16 matrix of normalized vectors, filled in lazily) so the k nearest
+neighbours can vote; the vote is used only when it is confident (a close neighbour and a
+clear majority).
+"""
+import os
+import threading
+
+import numpy as np
+
+import apps.common.database as db
+from apps.common.ttl_cache import LRUTTLCache
+from apps.common.embedding_cache import normalize_text
+
+USER_KNN_MAX_ITEMS = int(os.getenv("USER_KNN_MAX_ITEMS", "256"))  # rows per user index
+USER_KNN_CACHE_USERS = int(os.getenv("USER_KNN_CACHE_USERS", "64"))
+USER_KNN_TTL = float(os.getenv("USER_KNN_TTL", "1800"))  # seconds before an index is rebuilt from history
+
+_K = 7
+_NEIGHBOR_SIM = 0.50  # neighbours below this similarity don't vote
+_MIN_TOP_SIM = 0.75  # the closest neighbour must be at least this similar...
+_MIN_SHARE = 0.60  # ...and the winning category must hold this share of the vote weight
+
+_indexes = LRUTTLCache(maxsize=USER_KNN_CACHE_USERS, ttl=USER_KNN_TTL)
+_stats_lock = threading.Lock()
+_stats = {"exact": 0, "knn": 0, "abstain": 0}
+
+
+class UserIndex:
+    """Distinct items of one user -> (category name, normalized embedding once computed); least recently seen row is replaced when full."""
+
+    def __init__(self, max_items: int = USER_KNN_MAX_ITEMS):
+        self.max_items = max_items
+        self.items: list[str] = []
+        self.labels: list[str] = []
+        self._seen: list[int] = []
+        self._rows: dict[str, int] = {}
+        self._vecs: np.ndarray | None = None  # row i is valid unless i is in _missing
+        self._missing: set[int] = set()
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def _store(self, row: int, unit_vector):
+        vec = np.asarray(unit_vector, dtype=np.float16).reshape(-1)
+        if self._vecs is None:
+            self._vecs = np.zeros((0, len(vec)), dtype=np.float16)
+        if len(self._vecs) <= row:
+            self._vecs = np.vstack([self._vecs, np.zeros((len(self.items) - len(self._vecs), len(vec)), np.float16)])
+        self._vecs[row] = vec
+        self._missing.discard(row)
+
+    def add(self, item: str, unit_vector: np.ndarray | None, label: str):
+        """Insert or update an item; without a vector it is embedded by the next ensure_vectors()."""
+        with self._lock:
+            self._clock += 1
+            row = self._rows.get(item)
+            if row is None:
+                if len(self.items) < self.max_items:
+                    row = len(self.items)
+                    self.items.append(item)
+                    self.labels.append(label)
+                    self._seen.append(0)
+                else:
+                    row = int(np.argmin(self._seen))
+                    del self._rows[self.items[row]]
+                    self.items[row] = item
+                self._rows[item] = row
+                self._missing.add(row)
+            self.labels[row] = label
+            self._seen[row] = self._clock
+            if unit_vector is not None:
+                self._store(row, unit_vector)
+
+    def ensure_vectors(self, embed_unit):
+        """Embed the items that have no vector yet with one `embed_unit(texts)` call."""
+        with self._lock:
+            rows = sorted(self._missing)
+            texts = [self.items[row] for row in rows]
+        if not texts:
+            return
+        vectors = embed_unit(texts)
+        with self._lock:
+            for row, text, vec in zip(rows, texts, vectors):
+                if row < len(self.items) and self.items[row] == text:  # not replaced meanwhile
+                    self._store(row, vec)
+
+    def label_of(self, item: str) -> str | None:
+        with self._lock:
+            row = self._rows.get(item)
+            return self.labels[row] if row is not None else None
+
+    def vote(self, unit_vector: np.ndarray) -> tuple[str, float, float] | None:
+        """(category, share of vote weight, closest similarity) among the k nearest items."""
+        with self._lock:
+            if self._vecs is None:
+                return None
+            sims = self._vecs[:len(self.items)].astype(np.float32) @ np.asarray(unit_vector, dtype=np.float32).reshape(-1)
+            sims[[row for row in self._missing if row < len(sims)]] = -np.inf
+            labels = list(self.labels)
+        k = min(_K, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        weights: dict[str, float] = {}
+        for i in top:
+            if sims[i] >= _NEIGHBOR_SIM:
+                weights[labels[i]] = weights.get(labels[i], 0.0) + float(sims[i])
+        if not weights:
+            return None
+        label, weight = max(weights.items(), key=lambda kv: kv[1])
+        return label, weight / sum(weights.values()), float(sims[top].max())
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self._vecs is None else self._vecs.nbytes
+
+
+def get_index(user_id: str) -> UserIndex:
+    """Cached index for a LINE user, built from their latest records on a miss (labels only, no embedding)."""
+    index = _indexes.get(user_id)
+    if index is None:
+        records = db.get_last_records(user_id, limit=USER_KNN_MAX_ITEMS)
+        index = UserIndex()
+        # Oldest first, so the newest category of a repeated item wins
+        for r in reversed(records):
+            item = normalize_text(r["item"])
+            if item and r["category_name"]:
+                index.add(item, None, r["category_name"])
+        _indexes.set(user_id, index)
+    return index
+
+
+def _count(outcome: str):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def exact_label(index: UserIndex, item: str) -> str | None:
+    """Category the user gave this exact item before."""
+    label = index.label_of(normalize_text(item))
+    if label:
+        _count("exact")
+    return label
+
+
+def predict(index: UserIndex, unit_vector: np.ndarray, embed_unit) -> str | None:
+    """
+    Category voted by the nearest past items, or None when the vote isn't confident.
+    Items not embedded yet are embedded first with `embed_unit(texts)` (normalized rows).
+    """
+    index.ensure_vectors(embed_unit)
+    vote = index.vote(unit_vector)
+    if vote and vote[1] >= _MIN_SHARE and vote[2] >= _MIN_TOP_SIM:
+        _count("knn")
+        return vote[0]
+    _count("abstain")
+    return None
+
+
+def observe(user_id: str, item: str, label: str, unit_vector: np.ndarray | None = None):
+    """Fold a newly stored record into the user's cached index (no-op if none is cached)."""
+    index = _indexes.get(user_id)
+    if index is None or not label:
+        return
+    index.add(normalize_text(item), unit_vector, label)
+
+
+def _categories_changed(user_id: str | None):
+    # Rebuilt from the database on next use, so the index matches whatever rows the update hit
+    if user_id is None:
+        _indexes.clear()
+    else:
+        _indexes.invalidate(user_id)
+
+
+db.on_categories_changed(_categories_changed)
+
+
+def stats() -> dict:
+    """Cache counters plus how often the history decided the category (exact / knn) or deferred (abstain)."""
+    with _stats_lock:
+        out = dict(_stats)
+    return {**_indexes.stats(), **out}
@@ -0,0 +1,173 @@
+"""
+Shared check + benchmark suite for the storage backends (apps/common/backends).
+
+Runs the same workload through the public storage API of each backend: user bootstrap,
+single and bulk inserts (with duplicate skipping), recent-record pages, listings,
+streaming, period summary, chart sums, keyword search, recategorization and deletes.
+Every step's result is checked against what the workload wrote, and its latency is
+reported, so the backends can be compared like for like. The benchmark user is deleted
+afterwards. SQLite runs in a temporary file; Postgres is skipped unless POSTGRES_URL is set.
+
+    python -m benchmarks.bench_backends [--backend all|sqlite|postgres] [--records 300] [--bulk 5000]
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import statistics
+from decimal import Decimal
+from datetime import datetime, timedelta, timezone
+from importlib import import_module
+
+from apps.common.backends.base import missing_api
+from config import DEFAULT_CATEGORIES
+
+ITEMS = ["早餐", "午餐", "星巴克咖啡", "咖啡豆", "捷運", "公車", "電影票", "衛生紙", "牙醫", "股票"]
+
+
+class CheckFailed(AssertionError):
+    pass
+
+
+def check(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+
+def load_backend(name: str):
+    if name == "sqlite" and "SQLITE_PATH" not in os.environ:
+        os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-backends-"), "bench.sqlite3")
+    return import_module(f"apps.common.backends.{name}")
+
+
+def timed(results: dict, label: str, fn, *args, repeat: int = 1, **kwargs):
+    samples, value = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn(*args, **kwargs)
+        samples.append((time.perf_counter() - started) * 1000)
+    results[label] = (statistics.median(samples), repeat)
+    return value
+
+
+def run_suite(db, records: int, bulk: int, seed: int = 11) -> dict:
+    """Run the workload against one backend module; returns {label: (median_ms, calls)}."""
+    check(not missing_api(db), f"missing API: {missing_api(db)}")
+    rnd = random.Random(seed)
+    user_id = f"bench-backends-{uuid.uuid4().hex[:8]}"
+    results: dict = {}
+    try:
+        timed(results, "ensure_user_exists", db.ensure_user_exists, user_id, "bench")
+        timed(results, "ensure_default_categories", db.ensure_default_categories, user_id)
+        timed(results, "ensure_default_categories (again)", db.ensure_default_categories, user_id, repeat=5)
+        categories = db.get_user_category_map(user_id)
+        check(len(categories) == len(DEFAULT_CATEGORIES), f"expected {len(DEFAULT_CATEGORIES)} categories, got {categories}")
+        food = categories[DEFAULT_CATEGORIES[0]["name"].lower()]
+        others = categories[DEFAULT_CATEGORIES[-1]["name"].lower()]
+
+        # Single inserts (the per-message path)
+        written = []
+        started = time.perf_counter()
+        for i in range(records):
+            item = ITEMS[i % len(ITEMS)]
+            amount = Decimal(rnd.randint(10, 999)) + Decimal("0.50")
+            db.insert_transactions(user_id, food, item, amount, f"{item} {amount}")
+            written.append((item, amount))
+        results["insert_transactions"] = ((time.perf_counter() - started) * 1000 / max(records, 1), records)
+
+        # Bulk import of older history, then the same rows again (all duplicates)
+        base = datetime.now(timezone.utc) - timedelta(days=200)
+        rows = [{
+            "created_at": base + timedelta(minutes=7 * i), "item": ITEMS[i % len(ITEMS)],
+            "amount": Decimal(i % 300 + 1), "type": "income" if i % 10 == 0 else "expense",
+            "category_id": others, "message": None,
+        } for i in range(bulk)]
+        inserted, duplicates = timed(results, "bulk_insert_transactions", db.bulk_insert_transactions, user_id, rows)
+        check((inserted, duplicates) == (bulk, 0), f"bulk insert returned {(inserted, duplicates)}")
+        inserted, duplicates = timed(results, "bulk_insert_transactions (dupes)", db.bulk_insert_transactions, user_id, rows)
+        check((inserted, duplicates) == (0, bulk), f"re-import returned {(inserted, duplicates)}")
+
+        # Recent records + keyset page
+        page = timed(results, "get_last_records", db.get_last_records, user_id, limit=6, repeat=20)
+        check([r["item"] for r in page] == [w[0] for w in reversed(written[-6:])], "recent records out of order")
+        check(page[0]["amount"] == written[-1][1], f"amount round trip {page[0]['amount']} != {written[-1][1]}")
+        older = timed(results, "get_last_records (keyset)", db.get_last_records, user_id, limit=6,
+                      before=(page[-1]["created_at"], page[-1]["id"]), repeat=20)
+        check(not {r["id"] for r in older} & {r["id"] for r in page}, "keyset page overlaps the first page")
+
+        # Listings and streaming
+        month = timed(results, "get_user_transactions(30d)", db.get_user_transactions, user_id, days=30, repeat=5)
+        check(len(month) == records, f"30-day listing has {len(month)} rows, expected {records}")
+        streamed = timed(results, "iter_user_transactions(all)", lambda: sum(1 for _ in db.iter_user_transactions(
+            user_id, columns=("date", "amount"), fetch_size=500)))
+        check(streamed == records + bulk, f"streamed {streamed} rows, expected {records + bulk}")
+        exported = timed(results, "iter_transactions_for_export", lambda: sum(1 for _ in db.iter_transactions_for_export(user_id)))
+        check(exported == records + bulk, f"exported {exported} rows")
+
+        # Aggregates
+        summary = timed(results, "get_user_period_summary(365d)", db.get_user_period_summary, user_id, days=365, repeat=5)
+        expected_income = sum(r["amount"] for r in rows if r["type"] == "income")
+        expected_expense = sum(r["amount"] for r in rows if r["type"] == "expense") + sum(w[1] for w in written)
+        check(summary["count"] == records + bulk, f"summary count {summary['count']}")
+        check(summary["income"] == expected_income, f"income {summary['income']} != {expected_income}")
+        check(summary["expense"] == expected_expense, f"expense {summary['expense']} != {expected_expense}")
+        chart = timed(results, "get_user_category_sums_for_chart(30d)", db.get_user_category_sums_for_chart,
+                      user_id, days=30, repeat=5)
+        check([c["category_id"] for c in chart] == sorted(categories.values()), "chart categories not in id order")
+        check(Decimal(str(sum(c["total"] for c in chart))).quantize(Decimal("0.01")) == sum(w[1] for w in written),
+              "chart total differs from the 30-day expenses")
+
+        # Search and recategorization
+        coffee = sum(1 for r in rows if "咖啡" in r["item"]) + sum(1 for w in written if "咖啡" in w[0])
+        hits = timed(results, "find_transactions_by_keyword", db.find_transactions_by_keyword, user_id, "咖啡",
+                     limit=10_000, repeat=5)
+        check(len(hits) == coffee and all("咖啡" in h["item"] for h in hits), f"search found {len(hits)}, expected {coffee}")
+        moved = timed(results, "recategorize_transactions", db.recategorize_transactions,
+                      user_id, DEFAULT_CATEGORIES[3]["name"], keyword="咖啡")
+        check(moved["matched"] == coffee and moved["updated"] == coffee, f"recategorize returned {moved}")
+
+        # Deletes
+        deleted = timed(results, "delete_record_by_id", db.delete_record_by_id, user_id, page[0]["id"], page[0]["created_at"])
+        check(deleted and deleted["id"] == page[0]["id"], "delete_record_by_id did not delete the newest record")
+        check(timed(results, "delete_record", db.delete_record, user_id, 1), "delete_record did not delete")
+        after = db.get_user_period_summary(user_id, days=365)
+        check(after["count"] == records + bulk - 2, f"count after deletes {after['count']}")
+    finally:
+        db.delete_user(user_id)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_backends")
+    parser.add_argument("--backend", choices=("all", "sqlite", "postgres"), default="all")
+    parser.add_argument("--records", type=int, default=300, help="single inserts")
+    parser.add_argument("--bulk", type=int, default=5000, help="bulk-imported rows")
+    args = parser.parse_args(argv)
+
+    names = ["sqlite", "postgres"] if args.backend == "all" else [args.backend]
+    if "postgres" in names and not os.getenv("POSTGRES_URL"):
+        print("POSTGRES_URL not set, skipping postgres")
+        names.remove("postgres")
+
+    results, failed = {}, False
+    for name in names:
+        try:
+            results[name] = run_suite(load_backend(name), args.records, args.bulk)
+            print(f"{name}: all checks passed")
+        except CheckFailed as e:
+            failed = True
+            print(f"{name}: CHECK FAILED: {e}")
+
+    if results:
+        labels = list(next(iter(results.values())))
+        print(f"\n{'operation':<40}" + "".join(f"{name + ' ms':>14}" for name in results))
+        for label in labels:
+            print(f"{label:<40}" + "".join(f"{r[label][0]:14.3f}" if label in r else f"{'-':>14}" for r in results.values()))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
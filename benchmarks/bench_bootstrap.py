@@ -0,0 +1,96 @@
+"""
+Round-trip benchmark for the follow-event bootstrap (user + 7 default categories).
+
+Compares the previous per-category loop (SELECT / INSERT RETURNING / UPDATE) with the
+set-based upsert in apps.common.database. Runs against POSTGRES_URL and removes the
+benchmark users afterwards.
+
+    POSTGRES_URL=postgres://... python -m benchmarks.bench_bootstrap --users 50
+"""
+import argparse
+import time
+import uuid
+
+from psycopg2.extensions import cursor as _pg_cursor
+
+import apps.common.backends.postgres as db
+from apps.common.db_pool import ConnectionPool
+from config import DEFAULT_CATEGORIES
+
+
+class CountingCursor(_pg_cursor):
+    executed = 0
+
+    def execute(self, query, vars=None):
+        CountingCursor.executed += 1
+        return super().execute(query, vars)
+
+
+# Previous implementation, kept here only as the baseline
+def legacy_bootstrap(cur, line_user_id, display_name=None):
+    cur.execute("SELECT id FROM users WHERE line_user_id = %s", (line_user_id,))
+    if cur.fetchone() is None:
+        cur.execute(
+            "INSERT INTO users (line_user_id, display_name, preferred_lang) VALUES (%s, %s, %s)",
+            (line_user_id, display_name, "zh-TW")
+        )
+    cur.execute("SELECT id FROM users WHERE line_user_id = %s", (line_user_id,))
+    user_uuid = cur.fetchone()[0]
+    for cat in DEFAULT_CATEGORIES:
+        cur.execute("SELECT id, parent_id FROM categories WHERE user_id = %s AND name = %s LIMIT 1",
+                    (user_uuid, cat["name"]))
+        row = cur.fetchone()
+        if row:
+            if row[1] is None:
+                cur.execute("UPDATE categories SET parent_id = %s WHERE id = %s", (row[0], row[0]))
+            continue
+        cur.execute("INSERT INTO categories (user_id, name, is_system_default) VALUES (%s, %s, TRUE) RETURNING id",
+                    (user_uuid, cat["name"]))
+        new_id = cur.fetchone()[0]
+        cur.execute("UPDATE categories SET parent_id = %s WHERE id = %s", (new_id, new_id))
+
+
+def run(label, fn, user_ids):
+    CountingCursor.executed = 0
+    started = time.perf_counter()
+    for uid in user_ids:
+        fn(uid)
+    elapsed = time.perf_counter() - started
+    n = len(user_ids)
+    print(f"{label:<10} users={n:<5} round_trips/user={CountingCursor.executed / n:6.1f} "
+          f"ms/user={elapsed * 1000 / n:7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    db._pool = ConnectionPool(db.POSTGRES_URL, min_size=1, max_size=1, cursor_factory=CountingCursor)
+    prefix = f"bench-bootstrap-{uuid.uuid4().hex[:8]}"
+    legacy_ids = [f"{prefix}-legacy-{i}" for i in range(args.users)]
+    upsert_ids = [f"{prefix}-upsert-{i}" for i in range(args.users)]
+
+    def legacy(uid):
+        with db._cursor() as cur:
+            legacy_bootstrap(cur, uid)
+
+    def upsert(uid):
+        db.invalidate_user_cache(uid)  # measure the cold path, as on a real follow event
+        db.ensure_user_exists(uid)
+        db.ensure_default_categories(uid)
+
+    try:
+        run("legacy", legacy, legacy_ids)
+        run("upsert", upsert, upsert_ids)
+        # Second pass: re-follow of an existing user (everything already present)
+        run("legacy-2", legacy, legacy_ids)
+        run("upsert-2", upsert, upsert_ids)
+    finally:
+        with db._cursor() as cur:
+            cur.execute("DELETE FROM users WHERE line_user_id LIKE %s", (prefix + "-%",))
+        db.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
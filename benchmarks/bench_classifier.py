@@ -0,0 +1,66 @@
+"""
+Microbenchmark for category scoring: the old per-item loop (dict of category vectors,
+cosine with both norms recomputed per pair) versus the normalized category matrix used
+by category_classifier (one matmul per batch).
+
+Uses random vectors in place of embeddings, so no API calls are made; only the scoring
+step is timed and both paths must pick the same categories.
+
+    OPENAI_API_KEY=dummy python -m benchmarks.bench_classifier [--batch 1 32 1000] [--dim 1536]
+"""
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+import apps.services.category_classifier as cc
+from config import CORE_CATEGORIES
+
+
+def _legacy_pick(v: np.ndarray, category_vectors: dict[str, np.ndarray]) -> str:
+    best_key, best_sim = cc._FALLBACK_CATEGORY, -1.0
+    for name, vec in category_vectors.items():
+        denom = np.linalg.norm(v) * np.linalg.norm(vec)
+        sim = float(np.dot(v, vec) / denom) if denom else 0.0
+        if sim > best_sim:
+            best_key, best_sim = name, sim
+    return best_key if best_sim >= cc._SIM_THRESHOLD else cc._FALLBACK_CATEGORY
+
+
+def _time(fn, repeat: int) -> tuple[float, object]:
+    samples, out = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_classifier")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 32, 1000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(7)
+    keys = tuple(CORE_CATEGORIES)
+    category_vecs = rng.standard_normal((len(keys), args.dim)).astype(np.float32)
+    category_vectors = dict(zip(keys, category_vecs))
+    cc._category_keys, cc._category_matrix = keys, cc._normalize_rows(category_vecs)
+
+    print(f"{'batch':>6} {'loop ms':>10} {'per-item ms':>12} {'matmul ms':>10} {'speedup':>8}")
+    for n in args.batch:
+        # Items near a random category so some clear the similarity threshold
+        items = category_vecs[rng.integers(0, len(keys), n)] + 1.5 * rng.standard_normal((n, args.dim)).astype(np.float32)
+        loop_ms, legacy = _time(lambda: [_legacy_pick(v, category_vectors) for v in items], args.repeat)
+        single_ms, single = _time(lambda: [cc._best_categories(cc._normalize_rows(v))[0] for v in items], args.repeat)
+        batch_ms, batched = _time(lambda: cc._best_categories(cc._normalize_rows(items)), args.repeat)
+        if not legacy == single == batched:
+            raise SystemExit("scoring paths disagree")
+        print(f"{n:>6} {loop_ms:10.3f} {single_ms:12.3f} {batch_ms:10.3f} {loop_ms / batch_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Accuracy versus latency of the embedding backends on the labelled fixtures
+(benchmarks/fixtures/labelled_messages.csv: category items and intent messages).
+
+For each backend the category anchors (CORE_CATEGORIES keywords) and intent anchors
+(INTENTS descriptions) are embedded, then every fixture is assigned its most similar
+anchor. "category+kw" runs the keyword fast path first, as the classifier does. Latency
+is the median time to embed one fixture text, uncached. The OpenAI backend is only run
+when OPENAI_API_KEY is set (one request per text, so it costs a few cents at most).
+
+    python -m benchmarks.bench_embed_backends [--backends local openai] [--repeat 5]
+"""
+import os
+import csv
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+from apps.services import local_embed
+from apps.services.keyword_matcher import match_category
+from config import CORE_CATEGORIES, INTENTS
+
+FIXTURES = Path(__file__).parent / "fixtures" / "labelled_messages.csv"
+
+
+def _openai_embed():
+    from openai import OpenAI
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    def embed(texts):
+        resp = client.embeddings.create(input=list(texts), model="text-embedding-3-small")
+        return [d.embedding for d in resp.data]
+    return embed
+
+
+def _unit(vectors) -> np.ndarray:
+    m = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def _accuracy(embed_fn, anchors: dict[str, str], rows: list[tuple[str, str]], first=None) -> tuple[float, float]:
+    """(accuracy, median similarity of the winning anchor) over rows of (text, label)."""
+    keys = list(anchors)
+    matrix = _unit(embed_fn(list(anchors.values())))
+    sims = _unit(embed_fn([text for text, _ in rows])) @ matrix.T
+    best = sims.argmax(axis=1)
+    picked = [(first and first(text)) or keys[i] for (text, _), i in zip(rows, best)]
+    correct = sum(p == label for p, (_, label) in zip(picked, rows))
+    return correct / len(rows), float(np.median(sims.max(axis=1)))
+
+
+def _latency_ms(embed_fn, texts: list[str], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            embed_fn([text])
+            samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_embed_backends")
+    parser.add_argument("--backends", nargs="+", default=["local", "openai"], choices=["local", "openai"])
+    parser.add_argument("--repeat", type=int, default=5, help="latency passes (local only; openai is timed once)")
+    args = parser.parse_args(argv)
+
+    with open(FIXTURES, encoding="utf-8") as fh:
+        fixtures = list(csv.DictReader(fh))
+    categories = [(r["text"], r["label"]) for r in fixtures if r["task"] == "category"]
+    intents = [(r["text"], r["label"]) for r in fixtures if r["task"] == "intent"]
+    category_anchors = {key: meta["keywords"] for key, meta in CORE_CATEGORIES.items()}
+
+    backends = {"local": local_embed.embed}
+    if "openai" in args.backends:
+        if os.getenv("OPENAI_API_KEY"):
+            backends["openai"] = _openai_embed()
+        else:
+            print("OPENAI_API_KEY not set, skipping the openai backend\n")
+    local_embed.embed(["預熱"])  # load the jieba dictionary outside the timing
+
+    print(f"{len(categories)} category items, {len(intents)} intent messages\n")
+    print(f"{'backend':<8} {'category':>9} {'category+kw':>12} {'intent':>7} {'median sim':>11} {'ms/text':>8}")
+    for name, embed_fn in backends.items():
+        if name not in args.backends:
+            continue
+        cat_acc, cat_sim = _accuracy(embed_fn, category_anchors, categories)
+        kw_acc, _ = _accuracy(embed_fn, category_anchors, categories, first=match_category)
+        intent_acc, _ = _accuracy(embed_fn, INTENTS, intents)
+        repeat = args.repeat if name == "local" else 1
+        ms = _latency_ms(embed_fn, [text for text, _ in categories + intents], repeat)
+        print(f"{name:<8} {cat_acc:>9.0%} {kw_acc:>12.0%} {intent_acc:>7.0%} {cat_sim:>11.2f} {ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Burst benchmark for the embedding dispatcher: N concurrent "webhooks" each embed one
+item (drawn from a small vocabulary, so some are identical), once with a request per
+call and once through EmbeddingDispatcher.
+
+The API is simulated with a fixed round-trip latency plus a per-text cost, so no key is
+needed; the numbers show request count, texts sent and caller latency.
+
+    python -m benchmarks.bench_embed_dispatch [--callers 60] [--vocab 25] [--rtt-ms 120] [--wait-ms 10]
+"""
+import time
+import random
+import argparse
+import threading
+import statistics
+
+from apps.services.embed_dispatcher import EmbeddingDispatcher
+
+
+class FakeAPI:
+    def __init__(self, rtt_ms: float, per_text_ms: float):
+        self.rtt, self.per_text = rtt_ms / 1000, per_text_ms / 1000
+        self.requests = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.requests += 1
+            self.texts += len(texts)
+        time.sleep(self.rtt + self.per_text * len(texts))
+        return [[float(len(t))] for t in texts]
+
+
+def _burst(items: list[str], embed_fn) -> list[float]:
+    latencies = [0.0] * len(items)
+    start = threading.Barrier(len(items))
+
+    def caller(i):
+        start.wait()
+        t0 = time.perf_counter()
+        embed_fn([items[i]])
+        latencies[i] = (time.perf_counter() - t0) * 1000
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(len(items))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_embed_dispatch")
+    parser.add_argument("--callers", type=int, default=60)
+    parser.add_argument("--vocab", type=int, default=25, help="distinct items the callers draw from")
+    parser.add_argument("--rtt-ms", type=float, default=120.0)
+    parser.add_argument("--per-text-ms", type=float, default=0.2)
+    parser.add_argument("--wait-ms", type=float, default=10.0)
+    parser.add_argument("--max-batch", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    rnd = random.Random(3)
+    items = [f"item-{rnd.randrange(args.vocab)}" for _ in range(args.callers)]
+
+    direct = FakeAPI(args.rtt_ms, args.per_text_ms)
+    direct_lat = _burst(items, direct)
+
+    batched = FakeAPI(args.rtt_ms, args.per_text_ms)
+    dispatcher = EmbeddingDispatcher(batched, max_batch=args.max_batch, max_wait_ms=args.wait_ms)
+    batched_lat = _burst(items, dispatcher.embed)
+
+    p95 = lambda xs: statistics.quantiles(xs, n=20)[-1]
+    print(f"{'mode':<12} {'requests':>9} {'texts':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, api, lat in (("direct", direct, direct_lat), ("dispatcher", batched, batched_lat)):
+        print(f"{name:<12} {api.requests:>9} {api.texts:>6} {statistics.median(lat):8.1f} {p95(lat):8.1f}")
+    s = dispatcher.stats()
+    print(f"\nbatches={s['batches']} avg size={s['avg_batch_size']:.1f} fill={s['avg_batch_fill']:.1%} "
+          f"coalesced={s['coalesced']} ({s['coalesce_rate']:.0%}) "
+          f"queue delay avg={s['avg_queue_delay_ms']:.1f} ms max={s['max_queue_delay_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
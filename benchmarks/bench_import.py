@@ -0,0 +1,69 @@
+"""
+Throughput benchmark for the bulk CSV import pipeline.
+
+Generates a synthetic CSV (with an explicit category column, so no embedding calls are
+made), imports it for a throwaway user and compares rows/sec with the per-message path
+(insert_transactions, one record per call). A second import of the same file measures
+the duplicate-skip path. The benchmark user is deleted afterwards.
+
+    POSTGRES_URL=postgres://... OPENAI_API_KEY=dummy \
+        python -m benchmarks.bench_import --rows 20000 --legacy-rows 1000
+"""
+import io
+import csv
+import time
+import uuid
+import random
+import argparse
+from datetime import datetime, timedelta
+
+import apps.common.database as db
+from apps.services.transaction_importer import import_transactions
+from config import DEFAULT_CATEGORIES
+
+ITEMS = ["早餐", "午餐", "晚餐", "咖啡", "捷運", "公車", "電影票", "衛生紙", "牙醫", "股票"]
+
+
+def make_csv(rows: int, seed: int = 7) -> str:
+    rnd = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["date", "item", "amount", "category"])
+    for i in range(rows):
+        w.writerow([
+            (start + timedelta(minutes=17 * i)).strftime("%Y-%m-%d %H:%M"),
+            rnd.choice(ITEMS),
+            rnd.randint(10, 2000),
+            rnd.choice(DEFAULT_CATEGORIES)["name"],
+        ])
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--legacy-rows", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    user_id = f"bench-import-{uuid.uuid4().hex[:8]}"
+    data = make_csv(args.rows)
+    try:
+        for label in ("import", "re-import"):
+            stats = import_transactions(io.StringIO(data), user_id, chunk_size=args.chunk_size)
+            print(f"{label:<10} rows={stats['read']:<7} inserted={stats['inserted']:<7} "
+                  f"duplicates={stats['duplicates']:<7} {stats['rows_per_sec']:9.0f} rows/s")
+
+        category_id = db.get_user_category_id(user_id, DEFAULT_CATEGORIES[0]["name"])
+        started = time.perf_counter()
+        for i in range(args.legacy_rows):
+            db.insert_transactions(user_id, category_id, "legacy", i + 1, f"legacy {i + 1}")
+        elapsed = time.perf_counter() - started
+        print(f"{'per-row':<10} rows={args.legacy_rows:<7} {args.legacy_rows / elapsed:36.0f} rows/s")
+    finally:
+        db.delete_user(user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Intent routing: one centroid per intent (each INTENTS string embedded whole, scored with
+a per-intent Python loop) versus the exemplar index used by nlp_router (every phrase
+embedded separately, one matmul plus a top-k aggregation per intent).
+
+Accuracy is measured on the intent fixtures in benchmarks/fixtures/labelled_messages.csv;
+latency is the median scoring time per message, embeddings excluded. Embeddings come
+from the configured backend, so EMBED_BACKEND=local runs offline.
+
+    EMBED_BACKEND=local python -m benchmarks.bench_intent_index [--top-k 1 2 3] [--repeat 200]
+"""
+import csv
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+import apps.services.nlp_router as nr
+from apps.services.embedding_artifacts import intent_exemplars
+from apps.services.openai_embed import EMBED_BACKEND, embed
+from config import INTENTS
+from benchmarks.bench_embed_backends import FIXTURES
+
+
+def _centroid_pick(v: np.ndarray, intent_vecs: dict[str, np.ndarray]) -> str:
+    best, best_sim = "unknown", -1.0
+    for name, vec in intent_vecs.items():
+        den = np.linalg.norm(v) * np.linalg.norm(vec)
+        sim = float(np.dot(v, vec) / den) if den else 0.0
+        if sim > best_sim:
+            best, best_sim = name, sim
+    return best
+
+
+def _median_us(fn, vectors, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for v in vectors:
+            fn(v)
+        samples.append((time.perf_counter() - started) / len(vectors) * 1e6)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_intent_index")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with open(FIXTURES, encoding="utf-8") as fh:
+        rows = [(r["text"], r["label"]) for r in csv.DictReader(fh) if r["task"] == "intent"]
+    messages = np.asarray(embed([text for text, _ in rows]), dtype=np.float32)
+
+    centroids = dict(zip(INTENTS, np.asarray(embed(list(INTENTS.values())), dtype=np.float32)))
+    labels, phrases = intent_exemplars()
+    nr._intent_names, nr._intent_matrix, nr._intent_slots = nr.build_intent_index(labels, embed(phrases))
+
+    print(f"backend={EMBED_BACKEND}, {len(rows)} messages, {len(INTENTS)} intents, {len(phrases)} exemplars\n")
+    print(f"{'scoring':<16} {'accuracy':>9} {'µs/message':>11}")
+    picks = [_centroid_pick(v, centroids) for v in messages]
+    acc = sum(p == label for p, (_, label) in zip(picks, rows)) / len(rows)
+    us = _median_us(lambda v: _centroid_pick(v, centroids), messages, args.repeat)
+    print(f"{'centroid loop':<16} {acc:>9.0%} {us:>11.1f}")
+    for k in args.top_k:
+        pick = lambda v: nr._intent_names[int(nr.intent_scores(v, top_k=k).argmax())]
+        acc = sum(pick(v) == label for v, (_, label) in zip(messages, rows)) / len(rows)
+        us = _median_us(pick, messages, args.repeat)
+        print(f"{f'exemplar top-{k}':<16} {acc:>9.0%} {us:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Latency benchmark for keyword search: the old `message ILIKE '%kw%'` scan versus the
+search_tokens GIN index used by find_transactions_by_keyword.
+
+Seeds one throwaway user with --rows transactions inside a transaction that is rolled
+back at the end, so nothing is left behind.
+
+    POSTGRES_URL=postgres://... OPENAI_API_KEY=dummy \
+        python -m benchmarks.bench_search --rows 1000000 --repeat 20
+"""
+import time
+import argparse
+import statistics
+
+import apps.common.backends.postgres as db
+from apps.common.search_tokens import document_tokens, query_tokens, to_tsquery_text
+
+ITEMS = ["早餐", "午餐", "晚餐", "星巴克咖啡", "捷運", "公車", "電影票", "衛生紙", "牙醫", "股票",
+         "全聯買菜", "加油", "房租", "手機月租", "健身房"]
+KEYWORDS = ["咖啡", "星巴克", "捷運", "房租", "早"]
+SEP = "\x1f"
+
+
+def _seed(cur, line_user_id: str, rows: int) -> int:
+    cur.execute("INSERT INTO users (line_user_id, display_name) VALUES (%s, 'bench') RETURNING id",
+                (line_user_id,))
+    uid = cur.fetchone()[0]
+    messages = [f"{item} 100" for item in ITEMS]
+    cur.execute("""
+        INSERT INTO transactions (user_id, item, amount, message, type, created_at, search_tokens)
+        SELECT %s, v.item,
+               (g %% 500) + 1,
+               v.item || ' ' || ((g %% 500) + 1),
+               'expense',
+               now() - make_interval(mins => g),
+               array_to_tsvector(string_to_array(v.tokens, %s))
+        FROM generate_series(1, %s) AS g
+        JOIN (
+            SELECT ord - 1 AS slot, item, tokens
+            FROM unnest(%s::text[], %s::text[]) WITH ORDINALITY AS x(item, tokens, ord)
+        ) AS v ON v.slot = g %% %s
+    """, (uid, SEP, rows, ITEMS,
+          [SEP.join(document_tokens(item, msg)) for item, msg in zip(ITEMS, messages)],
+          len(ITEMS)))
+    cur.execute("ANALYZE transactions")
+    return uid
+
+
+def _time(cur, sql, params, repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with db.get_pool().connection(exclusive=True) as conn:
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cur:
+                print(f"Seeding {args.rows} rows...")
+                uid = _seed(cur, "bench-search", args.rows)
+                print(f"{'keyword':<8} {'ILIKE p50':>10} {'p95':>9} {'index p50':>10} {'p95':>9}  (ms)")
+                for kw in KEYWORDS:
+                    legacy = _time(cur, """
+                        SELECT id, message FROM transactions
+                        WHERE user_id = %s AND message ILIKE %s
+                    """, (uid, f"%{kw}%"), args.repeat)
+                    indexed = _time(cur, """
+                        WITH q AS (SELECT %(query)s::tsquery AS query)
+                        SELECT t.id, t.item, t.amount, t.message, t.created_at,
+                               ts_rank(t.search_tokens, q.query) AS rank
+                        FROM transactions AS t, q
+                        WHERE t.user_id = %(uid)s AND t.search_tokens @@ q.query
+                        ORDER BY rank DESC, t.created_at DESC, t.id DESC
+                        LIMIT %(limit)s
+                    """, {"query": to_tsquery_text(query_tokens(kw)), "uid": uid, "limit": args.limit},
+                        args.repeat)
+                    p95 = lambda xs: statistics.quantiles(xs, n=20)[-1] if len(xs) > 1 else xs[0]
+                    print(f"{kw:<8} {statistics.median(legacy):10.1f} {p95(legacy):9.1f} "
+                          f"{statistics.median(indexed):10.1f} {p95(indexed):9.1f}")
+        finally:
+            conn.rollback()
+            conn.autocommit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,8 @@ CREATE TABLE public.categories (
   name text NOT NULL,
   created_at timestamptz NOT NULL DEFAULT now(),
   parent_id bigint REFERENCES public.categories(id) ON DELETE SET NULL,
-  is_system_default boolean DEFAULT false
+  is_system_default boolean DEFAULT false,
+  CONSTRAINT categories_user_id_name_key UNIQUE (user_id, name)
 );
 
 CREATE TABLE public.transactions (
@@ -0,0 +1,14 @@
+-- Unique (user_id, name) on categories; required by the ON CONFLICT bootstrap in database.py.
+-- Already part of init_schema.sql for new installs, so only add it when missing.
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_constraint
+    WHERE conname = 'categories_user_id_name_key'
+      AND conrelid = 'public.categories'::regclass
+  ) THEN
+    ALTER TABLE public.categories
+      ADD CONSTRAINT categories_user_id_name_key UNIQUE (user_id, name);
+  END IF;
+END
+$$;
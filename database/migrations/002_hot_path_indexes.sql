@@ -0,0 +1,14 @@
+-- Indexes matching the hot queries in apps/common/database.py
+
+-- get_last_records / get_user_transactions / delete_record / chart sums:
+--   WHERE t.user_id = ? [AND created_at range] ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS transactions_user_created_at_idx
+  ON public.transactions (user_id, created_at DESC);
+
+-- get_user_category_id / add_user_category: WHERE user_id = ? AND LOWER(name) = LOWER(?)
+CREATE INDEX IF NOT EXISTS categories_user_lower_name_idx
+  ON public.categories (user_id, LOWER(name));
+
+-- ON DELETE SET NULL from categories and per-category joins
+CREATE INDEX IF NOT EXISTS transactions_category_id_idx
+  ON public.transactions (category_id);
@@ -0,0 +1,6 @@
+-- Keyset pagination for recent records: ORDER BY created_at DESC, id DESC with
+-- (created_at, id) < (?, ?) cursors. Supersedes transactions_user_created_at_idx.
+CREATE INDEX IF NOT EXISTS transactions_user_created_at_id_idx
+  ON public.transactions (user_id, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS public.transactions_user_created_at_idx;
@@ -0,0 +1,94 @@
+-- Per-user daily rollups of transactions, maintained by triggers on every write path
+-- (inserts, deletes, recategorization, ON DELETE SET NULL from categories).
+-- Days are UTC calendar days. NULL category/type are stored as 0 / '' so they can be part of the key.
+-- Existing transactions are aggregated at the end, in the same transaction as the triggers,
+-- so the table is complete as soon as the migration commits.
+CREATE TABLE IF NOT EXISTS public.transaction_daily_rollups (
+  user_id bigint NOT NULL,
+  day date NOT NULL,
+  category_id bigint NOT NULL DEFAULT 0,
+  type text NOT NULL DEFAULT '',
+  total numeric(14,2) NOT NULL DEFAULT 0,
+  tx_count integer NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, day, category_id, type)
+);
+
+-- No writes between the backfill below and the triggers going live
+LOCK TABLE public.transactions IN SHARE MODE;
+
+CREATE OR REPLACE FUNCTION public.transaction_rollup_apply(
+  p_user bigint, p_ts timestamptz, p_category bigint, p_type text, p_amount numeric, p_count integer
+) RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_day date := (p_ts AT TIME ZONE 'UTC')::date;
+BEGIN
+  IF p_user IS NULL THEN
+    RETURN;
+  END IF;
+
+  IF p_count > 0 THEN
+    INSERT INTO public.transaction_daily_rollups (user_id, day, category_id, type, total, tx_count)
+    VALUES (p_user, v_day, COALESCE(p_category, 0), COALESCE(p_type, ''), p_amount, p_count)
+    ON CONFLICT (user_id, day, category_id, type) DO UPDATE
+      SET total = transaction_daily_rollups.total + EXCLUDED.total,
+          tx_count = transaction_daily_rollups.tx_count + EXCLUDED.tx_count;
+  ELSE
+    -- Never insert on removal: the user row may already be gone (ON DELETE CASCADE)
+    UPDATE public.transaction_daily_rollups
+    SET total = total + p_amount,
+        tx_count = tx_count + p_count
+    WHERE user_id = p_user AND day = v_day
+      AND category_id = COALESCE(p_category, 0) AND type = COALESCE(p_type, '');
+
+    DELETE FROM public.transaction_daily_rollups
+    WHERE user_id = p_user AND day = v_day
+      AND category_id = COALESCE(p_category, 0) AND type = COALESCE(p_type, '')
+      AND tx_count <= 0;
+  END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.transaction_rollup_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP IN ('DELETE', 'UPDATE') THEN
+    PERFORM public.transaction_rollup_apply(OLD.user_id, OLD.created_at, OLD.category_id, OLD.type, -OLD.amount, -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM public.transaction_rollup_apply(NEW.user_id, NEW.created_at, NEW.category_id, NEW.type, NEW.amount, 1);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS transactions_rollup_insert_delete ON public.transactions;
+CREATE TRIGGER transactions_rollup_insert_delete
+  AFTER INSERT OR DELETE ON public.transactions
+  FOR EACH ROW EXECUTE FUNCTION public.transaction_rollup_sync();
+
+DROP TRIGGER IF EXISTS transactions_rollup_update ON public.transactions;
+CREATE TRIGGER transactions_rollup_update
+  AFTER UPDATE OF user_id, created_at, category_id, type, amount ON public.transactions
+  FOR EACH ROW
+  WHEN (
+    OLD.user_id IS DISTINCT FROM NEW.user_id
+    OR OLD.created_at IS DISTINCT FROM NEW.created_at
+    OR OLD.category_id IS DISTINCT FROM NEW.category_id
+    OR OLD.type IS DISTINCT FROM NEW.type
+    OR OLD.amount IS DISTINCT FROM NEW.amount
+  )
+  EXECUTE FUNCTION public.transaction_rollup_sync();
+
+-- Backfill from the rows already stored
+DELETE FROM public.transaction_daily_rollups;
+INSERT INTO public.transaction_daily_rollups (user_id, day, category_id, type, total, tx_count)
+SELECT t.user_id,
+       (t.created_at AT TIME ZONE 'UTC')::date,
+       COALESCE(t.category_id, 0),
+       COALESCE(t.type, ''),
+       SUM(t.amount),
+       COUNT(*)
+FROM public.transactions AS t
+WHERE t.user_id IS NOT NULL
+GROUP BY 1, 2, 3, 4;
@@ -0,0 +1,3 @@
+-- Incremental exports across all users: WHERE created_at > ? ORDER BY created_at, id
+CREATE INDEX IF NOT EXISTS transactions_created_at_id_idx
+  ON public.transactions (created_at, id);
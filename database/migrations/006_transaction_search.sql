@@ -0,0 +1,7 @@
+-- Keyword search: jieba-segmented lexemes of item + message, filled by the application
+-- (apps/common/search_tokens.py) on insert. Existing rows:
+--   python -m apps.common.search_backfill
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS search_tokens tsvector;
+
+CREATE INDEX IF NOT EXISTS transactions_search_tokens_idx
+  ON public.transactions USING gin (search_tokens);
@@ -0,0 +1,138 @@
+-- Monthly range partitioning of transactions on created_at (UTC month boundaries).
+-- Partitions are named transactions_pYYYYMM; rows outside every partition land in
+-- transactions_default. Future months are created ahead of time by
+--   python -m apps.common.partitions ensure
+-- and months past the retention window are moved to compressed files by
+--   python -m apps.common.partitions archive
+-- Archived months keep their totals in transaction_daily_rollups (dropping a partition
+-- fires no row triggers) and are listed in transaction_archives.
+
+-- Creates the missing monthly partitions overlapping [p_from, p_to]. A month whose rows
+-- already sit in the default partition is skipped (with a notice) instead of failing.
+CREATE OR REPLACE FUNCTION public.ensure_transaction_partitions(p_from timestamptz, p_to timestamptz)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_month timestamp := date_trunc('month', p_from AT TIME ZONE 'UTC');
+  v_last timestamp := date_trunc('month', p_to AT TIME ZONE 'UTC');
+  v_lo timestamptz;
+  v_hi timestamptz;
+  v_name text;
+  v_created integer := 0;
+BEGIN
+  WHILE v_month <= v_last LOOP
+    v_name := 'transactions_p' || to_char(v_month, 'YYYYMM');
+    v_lo := v_month AT TIME ZONE 'UTC';
+    v_hi := (v_month + interval '1 month') AT TIME ZONE 'UTC';
+
+    IF to_regclass('public.' || v_name) IS NULL THEN
+      IF to_regclass('public.transactions_default') IS NOT NULL AND EXISTS (
+        SELECT 1 FROM public.transactions_default WHERE created_at >= v_lo AND created_at < v_hi
+      ) THEN
+        RAISE NOTICE 'rows for % are in transactions_default; not creating %', to_char(v_month, 'YYYY-MM'), v_name;
+      ELSE
+        EXECUTE format(
+          'CREATE TABLE public.%I PARTITION OF public.transactions FOR VALUES FROM (%L) TO (%L)',
+          v_name, v_lo, v_hi
+        );
+        v_created := v_created + 1;
+      END IF;
+    END IF;
+
+    v_month := v_month + interval '1 month';
+  END LOOP;
+  RETURN v_created;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS public.transaction_archives (
+  id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  partition_name text NOT NULL,
+  range_start timestamptz NOT NULL,
+  range_end timestamptz NOT NULL,
+  row_count bigint NOT NULL,
+  total_amount numeric(16,2) NOT NULL,
+  file_path text NOT NULL,
+  archived_at timestamptz NOT NULL DEFAULT now()
+);
+
+DO $$
+DECLARE
+  v_from timestamptz;
+  v_next_id bigint;
+BEGIN
+  IF EXISTS (
+    SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'public.transactions'::regclass
+  ) THEN
+    RETURN;
+  END IF;
+
+  ALTER TABLE public.transactions RENAME TO transactions_unpartitioned;
+  -- Free the names transactions_pkey / transactions_id_seq for the new table
+  ALTER TABLE public.transactions_unpartitioned RENAME CONSTRAINT transactions_pkey TO transactions_unpartitioned_pkey;
+  ALTER TABLE public.transactions_unpartitioned ALTER COLUMN id DROP IDENTITY;
+
+  -- The primary key of a partitioned table has to include the partition key
+  CREATE TABLE public.transactions (
+    id bigint NOT NULL,
+    user_id bigint REFERENCES public.users(id) ON DELETE CASCADE,
+    item text NOT NULL,
+    amount numeric(12,2) NOT NULL,
+    message text,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    type text CHECK (type IN ('expense', 'income')),
+    category_id bigint REFERENCES public.categories(id) ON DELETE SET NULL,
+    search_tokens tsvector,
+    PRIMARY KEY (id, created_at)
+  ) PARTITION BY RANGE (created_at);
+
+  CREATE SEQUENCE public.transactions_id_seq OWNED BY public.transactions.id;
+  ALTER TABLE public.transactions ALTER COLUMN id SET DEFAULT nextval('public.transactions_id_seq');
+
+  CREATE TABLE public.transactions_default PARTITION OF public.transactions DEFAULT;
+
+  SELECT COALESCE(min(created_at), now()) INTO v_from FROM public.transactions_unpartitioned;
+  PERFORM public.ensure_transaction_partitions(v_from, now() + interval '3 months');
+
+  -- Rollups already include these rows: copy before the rollup triggers exist
+  INSERT INTO public.transactions (id, user_id, item, amount, message, created_at, type, category_id, search_tokens)
+  SELECT id, user_id, item, amount, message, created_at, type, category_id, search_tokens
+  FROM public.transactions_unpartitioned;
+
+  SELECT COALESCE(max(id), 0) + 1 INTO v_next_id FROM public.transactions;
+  PERFORM setval('public.transactions_id_seq', v_next_id, false);
+
+  DROP TABLE public.transactions_unpartitioned;
+END;
+$$;
+
+-- Same indexes as before (002, 003, 005, 006), now partitioned
+CREATE INDEX IF NOT EXISTS transactions_user_created_at_id_idx
+  ON public.transactions (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS transactions_category_id_idx
+  ON public.transactions (category_id);
+CREATE INDEX IF NOT EXISTS transactions_created_at_id_idx
+  ON public.transactions (created_at, id);
+CREATE INDEX IF NOT EXISTS transactions_search_tokens_idx
+  ON public.transactions USING gin (search_tokens);
+
+-- Row triggers on the parent are cloned onto every partition (see 004)
+DROP TRIGGER IF EXISTS transactions_rollup_insert_delete ON public.transactions;
+CREATE TRIGGER transactions_rollup_insert_delete
+  AFTER INSERT OR DELETE ON public.transactions
+  FOR EACH ROW EXECUTE FUNCTION public.transaction_rollup_sync();
+
+DROP TRIGGER IF EXISTS transactions_rollup_update ON public.transactions;
+CREATE TRIGGER transactions_rollup_update
+  AFTER UPDATE OF user_id, created_at, category_id, type, amount ON public.transactions
+  FOR EACH ROW
+  WHEN (
+    OLD.user_id IS DISTINCT FROM NEW.user_id
+    OR OLD.created_at IS DISTINCT FROM NEW.created_at
+    OR OLD.category_id IS DISTINCT FROM NEW.category_id
+    OR OLD.type IS DISTINCT FROM NEW.type
+    OR OLD.amount IS DISTINCT FROM NEW.amount
+  )
+  EXECUTE FUNCTION public.transaction_rollup_sync();
+
+ANALYZE public.transactions;
@@ -0,0 +1,49 @@
+-- Schema of the embedded SQLite backend (apps/common/backends/sqlite.py), applied on first use.
+-- Mirrors init_schema.sql plus migrations; timestamps are UTC text 'YYYY-MM-DD HH:MM:SS.ffffff'
+-- (sorts chronologically) and amounts are integer cents so sums stay exact.
+CREATE TABLE IF NOT EXISTS users (
+  id INTEGER PRIMARY KEY,
+  line_user_id TEXT NOT NULL UNIQUE,
+  display_name TEXT,
+  preferred_lang TEXT DEFAULT 'zh-TW',
+  created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS categories (
+  id INTEGER PRIMARY KEY,
+  user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+  name TEXT NOT NULL,
+  created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+  parent_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,
+  is_system_default INTEGER NOT NULL DEFAULT 0,
+  UNIQUE (user_id, name)
+);
+
+CREATE INDEX IF NOT EXISTS categories_user_lower_name_idx ON categories (user_id, lower(name));
+
+CREATE TABLE IF NOT EXISTS transactions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,  -- never reused: ids are the incremental export watermark
+  user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+  item TEXT NOT NULL,
+  amount_cents INTEGER NOT NULL,
+  message TEXT,
+  created_at TEXT NOT NULL,
+  type TEXT CHECK (type IN ('expense', 'income')),
+  category_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,
+  search_tokens TEXT NOT NULL DEFAULT ''
+);
+
+CREATE INDEX IF NOT EXISTS transactions_user_created_at_id_idx ON transactions (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS transactions_category_id_idx ON transactions (category_id);
+CREATE INDEX IF NOT EXISTS transactions_created_at_id_idx ON transactions (created_at, id);
+
+-- Keyword search: jieba tokens (space separated) indexed by FTS5, rowid = transactions.id
+CREATE VIRTUAL TABLE IF NOT EXISTS transaction_search USING fts5(tokens);
+
+CREATE TRIGGER IF NOT EXISTS transactions_search_insert AFTER INSERT ON transactions BEGIN
+  INSERT INTO transaction_search (rowid, tokens) VALUES (new.id, new.search_tokens);
+END;
+
+CREATE TRIGGER IF NOT EXISTS transactions_search_delete AFTER DELETE ON transactions BEGIN
+  DELETE FROM transaction_search WHERE rowid = old.id;
+END;
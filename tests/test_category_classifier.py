@@ -0,0 +1,76 @@
+import os
+import threading
+from decimal import Decimal
+
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("EMBED_BACKEND", "local")
+
+import numpy as np
+import pytest
+
+import apps.common.backends.sqlite as backend
+import apps.services.category_classifier as classifier
+from apps.services import local_embed, user_knn
+
+USER = "U-history"
+RECORDS = [
+    {"item": "咖啡豆", "category_name": "shopping"},
+    {"item": "全聯", "category_name": "food"},
+]
+
+
+@pytest.fixture
+def embed_calls(monkeypatch):
+    """Texts sent to the embedder, with a fresh history index built from RECORDS."""
+    calls = []
+
+    def embed_cached(texts):
+        calls.append(list(texts))
+        return local_embed.embed(texts)
+
+    monkeypatch.setattr(classifier, "embed_cached", embed_cached)
+    monkeypatch.setattr(classifier, "_ensure_category_vectors", lambda: None)
+    monkeypatch.setattr(user_knn.db, "get_last_records", lambda user_id, limit: list(RECORDS))
+    user_knn._indexes.clear()
+    yield calls
+    user_knn._indexes.clear()
+
+
+def test_exact_history_hit_needs_no_embedding(embed_calls):
+    assert classifier.classify_category_by_embedding("全聯", user_id=USER)["key"] == "food"
+    assert embed_calls == []
+
+
+def test_keyword_hit_needs_no_embedding(embed_calls):
+    assert classifier.classify_category_by_embedding("捷運", user_id=USER)["key"] == "transport"
+    results = classifier.classify_many(["午餐", "捷運", "全聯"], user_id=USER)
+    assert [r["key"] for r in results] == ["food", "transport", "food"]
+    assert embed_calls == []
+
+
+def test_history_vectors_are_embedded_only_for_a_knn_lookup(embed_calls, monkeypatch):
+    monkeypatch.setattr(classifier, "_best_categories", lambda vecs: ["others"] * len(vecs))
+    classifier.classify_category_by_embedding("哥倫比亞咖啡豆", user_id=USER)
+    embedded = [text for call in embed_calls for text in call]
+    assert "哥倫比亞咖啡豆" in embedded
+    assert {"咖啡豆", "全聯"} <= set(embedded)
+
+    index = user_knn.get_index(USER)
+    assert not index._missing and index._vecs is not None
+    assert np.allclose(np.linalg.norm(index._vecs.astype(np.float32), axis=1), 1.0, atol=1e-2)
+
+
+def test_recategorization_refreshes_history_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(backend, "SQLITE_PATH", str(tmp_path / "knn.sqlite3"))
+    monkeypatch.setattr(backend, "_local", threading.local())
+    user_knn._indexes.clear()
+    backend.ensure_user_exists(USER, "test")
+    backend.ensure_default_categories(USER)
+    categories = backend.get_user_category_map(USER)
+    backend.insert_transactions(USER, categories["餐飲"], "全聯採買", Decimal("300"), "全聯採買 300")
+    assert user_knn.exact_label(user_knn.get_index(USER), "全聯採買") == "餐飲"
+
+    # Same token matching as the database: the index follows whatever rows the update hit
+    assert backend.recategorize_transactions(USER, "購物", keyword="全聯")["updated"] == 1
+    assert user_knn.exact_label(user_knn.get_index(USER), "全聯採買") == "購物"
+    user_knn._indexes.clear()
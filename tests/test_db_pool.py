@@ -0,0 +1,76 @@
+import pytest
+
+from apps.common import db_pool
+from apps.common.db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        pass
+
+
+class FakeConnection:
+    closed = 0
+    autocommit = False
+
+    def cursor(self):
+        return FakeCursor()
+
+
+class FakeThreadedPool:
+    """Stands in for psycopg2's ThreadedConnectionPool; the checkout logic under test is ours."""
+
+    def __init__(self, minconn, maxconn, dsn, **kwargs):
+        self.maxconn = maxconn
+        self.out = 0
+
+    def getconn(self):
+        assert self.out < self.maxconn, "pool exhausted"
+        self.out += 1
+        return FakeConnection()
+
+    def putconn(self, conn, close=False):
+        self.out -= 1
+
+    def closeall(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(db_pool.pg_pool, "ThreadedConnectionPool", FakeThreadedPool)
+    return ConnectionPool("postgresql://test", min_size=0, max_size=1, timeout=5)
+
+
+def test_nested_exclusive_checkout_fails_fast_when_thread_holds_every_connection(pool):
+    with pool.connection():
+        with pytest.raises(PoolTimeout, match="already held by this thread"):
+            with pool.connection(exclusive=True):
+                pass
+    assert pool.stats()["wait_max_ms"] < 1000
+
+
+def test_call_while_holding_an_exclusive_connection_fails_fast(pool):
+    with pool.connection(exclusive=True):
+        with pytest.raises(PoolTimeout, match="already held by this thread"):
+            with pool.connection():
+                pass
+    # The slot is released again afterwards
+    with pool.connection(exclusive=True):
+        pass
+
+
+def test_nested_exclusive_checkout_works_when_a_connection_is_free(monkeypatch):
+    monkeypatch.setattr(db_pool.pg_pool, "ThreadedConnectionPool", FakeThreadedPool)
+    pool = ConnectionPool("postgresql://test", min_size=0, max_size=2, timeout=5)
+    with pool.connection() as outer:
+        with pool.connection() as nested:
+            assert nested is outer
+        with pool.connection(exclusive=True) as exclusive:
+            assert exclusive is not outer
@@ -0,0 +1,49 @@
+import os
+
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("EMBED_BACKEND", "local")
+
+import pytest
+
+from apps.services import nlp_router
+
+
+def _route(text: str, lang: str = "en") -> tuple[dict, dict]:
+    """Routing result plus how many messages each stage decided during the call."""
+    before = nlp_router.stats()
+    result = nlp_router.route(text, lang)
+    after = nlp_router.stats()
+    return result, {stage: after[stage] - before[stage] for stage in ("exact", "slots", "embedding", "fallback")}
+
+
+@pytest.mark.parametrize("text", ["午餐 120", "星巴克拿鐵 150", "Lunch 120"])
+def test_item_amount_is_recorded_without_embedding(text):
+    result, stages = _route(text)
+    assert result["intent"] == "record"
+    assert stages["slots"] == 1 and stages["embedding"] == 0
+
+
+@pytest.mark.parametrize("text", ["how much did I spend in 2024", "這個月花多少 2024", "top 3"])
+def test_questions_ending_in_a_number_are_not_records(text):
+    result, stages = _route(text)
+    assert stages["slots"] == 0
+    assert result["intent"] != "record"
+
+
+def test_year_like_amount_goes_through_the_embedding_index():
+    result, stages = _route("房租 2024")
+    assert stages["slots"] == 0 and stages["embedding"] + stages["fallback"] == 1
+    assert result["rec_amt"] == 2024
+
+
+def test_ascii_comma_separates_items():
+    result, stages = _route("看電影 300, 爆米花 150")
+    assert result["intent"] == "record" and stages["slots"] == 1
+    assert result["rec_items"] == [("看電影", 300), ("爆米花", 150)]
+
+
+def test_multi_item_question_is_not_recorded():
+    result, stages = _route("上個月花了 300，這個月花了 500")
+    assert stages["slots"] == 0
+    assert result["rec_items"] is None
+    assert result["intent"] != "record"
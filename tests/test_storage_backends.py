@@ -0,0 +1,119 @@
+import os
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+import apps.common.backends.base as base
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def taipei_db(request, tmp_path, monkeypatch):
+    """Each backend with the process running in a non-UTC local time zone.
+
+    SQLite gets a fresh file; Postgres runs against POSTGRES_URL (migrated to head)
+    and is skipped when that is not set.
+    """
+    monkeypatch.setenv("TZ", "Asia/Taipei")
+    time.tzset()
+    if request.param == "sqlite":
+        import apps.common.backends.sqlite as backend
+        monkeypatch.setattr(backend, "SQLITE_PATH", str(tmp_path / "test.sqlite3"))
+        monkeypatch.setattr(backend, "_local", threading.local())
+    else:
+        if not os.getenv("POSTGRES_URL"):
+            pytest.skip("POSTGRES_URL is not set")
+        import apps.common.backends.postgres as backend
+        from apps.common import migrations
+        migrations.migrate()
+    users = []
+    yield backend, users
+    for user_id in users:
+        backend.delete_user(user_id)
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _user(db) -> tuple:
+    backend, users = db
+    user_id = f"test-{uuid.uuid4().hex[:8]}"
+    backend.ensure_user_exists(user_id, "test")
+    backend.ensure_default_categories(user_id)
+    users.append(user_id)
+    return backend, user_id, backend.get_user_category_map(user_id)
+
+
+def test_backend_provides_storage_api(taipei_db):
+    assert base.missing_api(taipei_db[0]) == []
+
+
+def test_insert_stores_utc_under_local_timezone(taipei_db):
+    db, user_id, categories = _user(taipei_db)
+    assert time.localtime().tm_gmtoff == 8 * 3600
+
+    before = datetime.now(timezone.utc)
+    db.insert_transactions(user_id, categories["餐飲"], "午餐", Decimal("120.50"), "午餐 120.50")
+    after = datetime.now(timezone.utc)
+
+    record = db.get_last_records(user_id, limit=1)[0]
+    assert before - timedelta(seconds=1) <= record["created_at"] <= after + timedelta(seconds=1)
+    assert (record["item"], record["amount"], record["category_name"]) == ("午餐", Decimal("120.50"), "餐飲")
+
+
+def test_just_inserted_record_is_in_recent_period(taipei_db):
+    db, user_id, categories = _user(taipei_db)
+    db.insert_transactions(user_id, categories["餐飲"], "午餐", Decimal("120"), "午餐 120")
+
+    now = datetime.now(timezone.utc)
+    summary = db.get_user_period_summary(user_id, start_time=now - timedelta(days=1), end_time=now + timedelta(seconds=1))
+    assert summary["count"] == 1 and summary["expense"] == Decimal("120")
+    assert len(db.get_user_transactions(user_id, days=1)) == 1
+
+
+def test_incremental_export_includes_backdated_imports(taipei_db):
+    db, user_id, categories = _user(taipei_db)
+    db.insert_transactions(user_id, categories["餐飲"], "午餐", Decimal("120"), "午餐 120")
+    watermark = db.get_export_watermark()
+    assert [r["item"] for r in db.iter_transactions_for_export(user_id, through_id=watermark)] == ["午餐"]
+
+    # Imported after the first export but dated long before it
+    db.bulk_insert_transactions(user_id, [{"item": "房租", "amount": Decimal("8000"), "category_id": categories["餐飲"],
+                                           "created_at": datetime(2020, 1, 1, tzinfo=timezone.utc)}])
+    rows = list(db.iter_transactions_for_export(user_id, after_id=watermark, through_id=db.get_export_watermark()))
+    assert [r["item"] for r in rows] == ["房租"]
+
+
+def test_bulk_import_skips_duplicates(taipei_db):
+    db, user_id, categories = _user(taipei_db)
+    rows = [{"item": "房租", "amount": Decimal("8000"), "category_id": categories["餐飲"],
+             "created_at": datetime(2020, 1, 1, tzinfo=timezone.utc)}]
+    assert db.bulk_insert_transactions(user_id, rows) == (1, 0)
+    assert db.bulk_insert_transactions(user_id, rows) == (0, 1)
+
+
+def test_delete_record_by_id(taipei_db):
+    db, user_id, categories = _user(taipei_db)
+    db.insert_transactions(user_id, categories["餐飲"], "午餐", Decimal("120"), "午餐 120")
+    record = db.get_last_records(user_id, limit=1)[0]
+
+    deleted = db.delete_record_by_id(user_id, record["id"], record["created_at"])
+    assert (deleted["id"], deleted["item"], deleted["amount"]) == (record["id"], "午餐", Decimal("120"))
+    assert db.get_last_records(user_id) == []
+    assert db.delete_record_by_id(user_id, record["id"]) is None
+
+
+def test_keyword_search_and_recategorization(taipei_db, monkeypatch):
+    db, user_id, categories = _user(taipei_db)
+    db.insert_transactions(user_id, categories["餐飲"], "全聯採買", Decimal("300"), "全聯採買 300")
+    db.insert_transactions(user_id, categories["餐飲"], "午餐", Decimal("120"), "午餐 120")
+    assert [r["item"] for r in db.find_transactions_by_keyword(user_id, "全聯")] == ["全聯採買"]
+
+    notified = []
+    monkeypatch.setattr(base, "_category_listeners", [notified.append])
+    result = db.recategorize_transactions(user_id, "購物", keyword="全聯")
+    assert (result["category_id"], result["matched"], result["updated"]) == (categories["購物"], 1, 1)
+    assert notified == [user_id]
+    assert {r["item"]: r["category_name"] for r in db.get_last_records(user_id)} == {"全聯採買": "購物", "午餐": "餐飲"}